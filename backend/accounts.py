@@ -0,0 +1,173 @@
+"""Account deletion shared by /auth/delete-account and the admin delete routes.
+
+Everything a user owns is removed with set-based DELETE statements in
+dependency order (children before parents), so no ORM entities or cascade
+loads are involved and the counts come straight from `rowcount`.
+
+By default the whole deletion is one transaction. With a `chunk_size`, each
+table is drained `chunk_size` rows at a time with a commit in between, which
+keeps lock hold times short for very large accounts. A slice carries its own
+side effects: the waitlist promotions for the spots it frees and the
+`event.deleted` outbox messages for the events it removes are written in the
+slice's transaction, and its signals are sent after that commit. A slice
+of the user's hosted events locks them and deletes their participants and
+waitlist along with them, so no one can join an event whose roster is
+already gone. The user row is deleted last, so an interrupted run can be
+repeated and only handles what is left.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select, update
+
+import outbox
+import signals
+import tiles
+import tokens
+import waitlist
+from models import (
+    db,
+    ArchivedEvent,
+    ArchivedEventParticipant,
+    Event,
+    EventParticipant,
+    Follow,
+    RefreshSession,
+    User,
+    UserSport,
+    WaitlistEntry,
+)
+
+
+def delete_user_data(user_id: int, chunk_size: Optional[int] = None, app=None) -> Dict[str, int]:
+    """Delete a user and everything that references them. Commits.
+
+    Returns per-table row counts. Spots the user held in other events go to
+    those events' waitlists, and every token issued to the user is revoked.
+    When `app` is given, `event_deleted`, `participant_joined` (for
+    promotions) and `user_deleted` signals are sent after the commit that
+    made each change.
+    """
+    deletion = _Deletion(user_id, chunk_size, app)
+    archived_hosted = select(ArchivedEvent.id).where(ArchivedEvent.host_user_id == user_id)
+
+    steps = [
+        ('participations', EventParticipant.__table__, EventParticipant.user_id == user_id, deletion.free_spots),
+        ('waitlist_entries', WaitlistEntry.__table__, WaitlistEntry.user_id == user_id, None),
+        # Also deletes each slice's participants and waitlist (see drop_events).
+        ('events', Event.__table__, Event.host_user_id == user_id, deletion.drop_events),
+        ('follows', Follow.__table__, or_(Follow.follower_id == user_id, Follow.followee_id == user_id), None),
+        ('sports', UserSport.__table__, UserSport.user_id == user_id, None),
+        ('refresh_sessions', RefreshSession.__table__, RefreshSession.user_id == user_id, None),
+        ('archived_hosted_event_participants', ArchivedEventParticipant.__table__,
+         ArchivedEventParticipant.event_id.in_(archived_hosted), None),
+        ('archived_participations', ArchivedEventParticipant.__table__,
+         ArchivedEventParticipant.user_id == user_id, None),
+        ('archived_events', ArchivedEvent.__table__, ArchivedEvent.host_user_id == user_id, None),
+        ('user', User.__table__, User.id == user_id, None),
+    ]
+
+    counts: Dict[str, int] = {}
+    try:
+        # Tokens already handed out must not outlive the account (user ids
+        # can be reused after a delete). Revoked first, so the account cannot
+        # act while a chunked deletion is under way.
+        tokens.revoke_user_tokens(user_id)
+        for name, table, condition, hook in steps:
+            counts[name] = deletion.delete(table, condition, hook)
+        counts.update(deletion.hosted_counts)
+        deletion.pending.append((signals.user_deleted, {'user_id': user_id}))
+        deletion.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
+
+
+class _Deletion:
+    """Runs the DELETE steps, whole or in committed slices, with their side effects."""
+
+    def __init__(self, user_id: int, chunk_size: Optional[int], app):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.app = app
+        self.hosted = select(Event.id).where(Event.host_user_id == user_id)
+        self.pending: List[Tuple] = []  # (signal, kwargs) to send after the next commit
+        self.hosted_counts = {'hosted_event_participants': 0, 'hosted_event_waitlist': 0}
+
+    def commit(self) -> None:
+        db.session.commit()
+        pending, self.pending = self.pending, []
+        if self.app is not None:
+            for signal, kwargs in pending:
+                signal.send(self.app, **kwargs)
+
+    def delete(self, table, condition, hook: Optional[Callable] = None) -> int:
+        if not self.chunk_size:
+            return self._delete_slice(table, condition, hook)
+        # Delete by primary key in bounded slices, committing between slices.
+        pk = list(table.primary_key.columns)
+        total = 0
+        while True:
+            keys: List[tuple] = db.session.execute(select(*pk).where(condition).limit(self.chunk_size)).all()
+            if not keys:
+                return total
+            if len(pk) == 1:
+                slice_condition = pk[0].in_([key[0] for key in keys])
+            else:
+                slice_condition = or_(*[
+                    and_(*[column == value for column, value in zip(pk, key)]) for key in keys
+                ])
+            total += self._delete_slice(table, slice_condition, hook)
+            self.commit()
+
+    def _delete_slice(self, table, condition, hook: Optional[Callable]) -> int:
+        after = hook(condition) if hook else None
+        if table is Event.__table__:
+            tiles.remove_matching(condition)
+        count = db.session.execute(delete(table).where(condition)).rowcount
+        if after:
+            after()
+        return count
+
+    def free_spots(self, condition) -> Callable[[], None]:
+        """Promote from the waitlists of the events whose spots `condition` frees."""
+        event_ids = list(db.session.execute(
+            select(EventParticipant.event_id).where(condition, EventParticipant.event_id.not_in(self.hosted))
+        ).scalars())
+
+        def promote():
+            for event_id, user_ids in waitlist.promote_many(event_ids).items():
+                self.pending.extend(
+                    (signals.participant_joined, {'event_id': event_id, 'user_id': promoted_id})
+                    for promoted_id in user_ids
+                )
+        return promote
+
+    def drop_events(self, condition) -> Callable[[], None]:
+        """Empty the events `condition` removes, and record `event.deleted` for them.
+
+        Other players can still join the user's events until they are gone,
+        so their participants and waitlist are deleted in the same slice as
+        the events, after locking the event rows: a join waits for the
+        slice to commit and then finds the event deleted.
+        """
+        event_ids = list(db.session.execute(select(Event.id).where(condition)).scalars())
+        if event_ids:
+            db.session.execute(
+                update(Event)
+                .where(Event.id.in_(event_ids))
+                .values(max_players=Event.max_players)
+                .execution_options(synchronize_session=False)
+            )
+            self.hosted_counts['hosted_event_participants'] += db.session.execute(
+                delete(EventParticipant).where(EventParticipant.event_id.in_(event_ids))
+            ).rowcount
+            self.hosted_counts['hosted_event_waitlist'] += db.session.execute(
+                delete(WaitlistEntry).where(WaitlistEntry.event_id.in_(event_ids))
+            ).rowcount
+
+        def record():
+            for event_id in event_ids:
+                outbox.record('event.deleted', {'event_id': event_id})
+                self.pending.append((signals.event_deleted, {'event_id': event_id}))
+        return record
@@ -0,0 +1,144 @@
+"""Archival of past events out of the hot tables.
+
+Events that ended more than ``ARCHIVE_HORIZON_DAYS`` ago (undated events
+use their creation time) are copied with their participants into
+``events_archive`` / ``event_participants_archive`` and then deleted from
+``events`` / ``event_participants``. Work is done in batches of
+``ARCHIVE_BATCH_SIZE`` events, one transaction per batch, so a run never
+holds locks on more than one batch at a time and can be interrupted safely.
+
+The job runs periodically under the background worker (see jobs.py) and
+can be triggered by hand with ``flask --app app jobs enqueue archive_past_events``.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import and_, delete, func, literal, or_, select
+
+import jobs
+import tiles
+from models import db, ArchivedEvent, ArchivedEventParticipant, Event, EventParticipant, WaitlistEntry
+from serializers import ARCHIVED_EVENTS
+
+EVENT_COLUMNS = [
+    'id', 'name', 'sport', 'location', 'notes', 'max_players', 'created_at',
+    'event_date', 'latitude', 'longitude', 'skill_level', 'host_user_id',
+]
+PARTICIPANT_COLUMNS = [
+    'id', 'event_id', 'user_id', 'player_name', 'team', 'joined_at',
+    'guest_name', 'guest_token',
+]
+
+
+def archive_cutoff(horizon_days: Optional[float] = None) -> datetime:
+    if horizon_days is None:
+        horizon_days = current_app.config['ARCHIVE_HORIZON_DAYS']
+    return datetime.utcnow() - timedelta(days=horizon_days)
+
+
+def archivable(cutoff: datetime):
+    """Filter matching events whose date (or creation time if undated) is before `cutoff`."""
+    return or_(
+        Event.event_date < cutoff,
+        and_(Event.event_date.is_(None), Event.created_at < cutoff),
+    )
+
+
+def live_events_filter(cutoff: Optional[datetime] = None):
+    """Filter for hot read paths: hides events past the horizon that are awaiting archival.
+
+    Spelled out rather than negating `archivable`, since NOT over a NULL
+    comparison would also hide undated events.
+    """
+    cutoff = cutoff or archive_cutoff()
+    return or_(
+        Event.event_date >= cutoff,
+        and_(
+            Event.event_date.is_(None),
+            or_(Event.created_at.is_(None), Event.created_at >= cutoff),
+        ),
+    )
+
+
+def archive_batch(event_ids: List[int]) -> Dict[str, int]:
+    """Move `event_ids` and their participants to the archive tables (no commit).
+
+    Their waitlist entries are deleted.
+    """
+    now = datetime.utcnow()
+    counts = (
+        select(func.count(EventParticipant.id))
+        .where(EventParticipant.event_id == Event.id)
+        .scalar_subquery()
+    )
+    event_source = select(
+        *[getattr(Event, column) for column in EVENT_COLUMNS],
+        counts,
+        literal(now),
+    ).where(Event.id.in_(event_ids))
+    db.session.execute(
+        ArchivedEvent.__table__.insert().from_select(
+            EVENT_COLUMNS + ['participant_count', 'archived_at'], event_source
+        )
+    )
+    participant_source = select(
+        *[getattr(EventParticipant, column) for column in PARTICIPANT_COLUMNS]
+    ).where(EventParticipant.event_id.in_(event_ids))
+    moved = db.session.execute(
+        ArchivedEventParticipant.__table__.insert().from_select(PARTICIPANT_COLUMNS, participant_source)
+    ).rowcount
+    db.session.execute(delete(EventParticipant).where(EventParticipant.event_id.in_(event_ids)))
+    # Waitlists are only meaningful before the event, so they are dropped, not archived.
+    db.session.execute(delete(WaitlistEntry).where(WaitlistEntry.event_id.in_(event_ids)))
+    tiles.remove_matching(Event.id.in_(event_ids))
+    archived = db.session.execute(delete(Event).where(Event.id.in_(event_ids))).rowcount
+    return {'events': archived, 'participants': moved}
+
+
+def archive_past_events(horizon_days: Optional[float] = None, batch_size: Optional[int] = None,
+                        max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Archive everything past the horizon, committing after each batch."""
+    cutoff = archive_cutoff(horizon_days)
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    totals = {'events': 0, 'participants': 0, 'batches': 0}
+    while max_batches is None or totals['batches'] < max_batches:
+        event_ids = db.session.execute(
+            select(Event.id).where(archivable(cutoff)).order_by(Event.id).limit(batch_size)
+        ).scalars().all()
+        if not event_ids:
+            break
+        moved = archive_batch(event_ids)
+        db.session.commit()
+        totals['events'] += moved['events']
+        totals['participants'] += moved['participants']
+        totals['batches'] += 1
+    if totals['events']:
+        print(f"[ARCHIVE] Archived {totals['events']} events and {totals['participants']} participants "
+              f"in {totals['batches']} batches (cutoff {cutoff.isoformat()})", flush=True)
+    return totals
+
+
+@jobs.job('archive_past_events', max_attempts=3)
+def archive_past_events_job(payload):
+    archive_past_events(
+        horizon_days=payload.get('horizon_days'),
+        batch_size=payload.get('batch_size'),
+    )
+
+
+def event_history(user_id: Optional[int] = None, limit: int = 50, offset: int = 0) -> List[Dict]:
+    """Serialized archived events, newest first; restricted to those a user hosted or joined when given."""
+    query = ARCHIVED_EVENTS.select()
+    if user_id is not None:
+        joined = select(ArchivedEventParticipant.event_id).where(ArchivedEventParticipant.user_id == user_id)
+        query = query.where(or_(ArchivedEvent.host_user_id == user_id, ArchivedEvent.id.in_(joined)))
+    return ARCHIVED_EVENTS.all(
+        query.order_by(ArchivedEvent.event_date.desc(), ArchivedEvent.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def init_app(app) -> None:
+    jobs.schedule(app, 'archive_past_events', every=app.config['ARCHIVE_INTERVAL_SECONDS'])
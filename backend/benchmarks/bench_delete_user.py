@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark account deletion for a user with a large history.
+
+Creates a user with N participations (default 10k) plus hosted events with
+other players and follows, then times accounts.delete_user_data in a single
+transaction and in chunks. For comparison it also times the previous
+ORM approach (load each hosted event and db.session.delete it, letting the
+participants cascade load).
+
+Usage:
+    python benchmarks/bench_delete_user.py
+    python benchmarks/bench_delete_user.py --participations 50000 --chunk-size 2000
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from common import make_app
+
+
+def populate(app, participations: int, hosted: int, players_per_hosted: int) -> int:
+    from models import db, Event, EventParticipant, Follow, User
+
+    now = datetime.utcnow()
+    with app.app_context():
+        victim = User(username=f'bench_victim_{time.time_ns()}', email=f'victim{time.time_ns()}@example.com',
+                      sports='Basketball,Tennis')
+        other = User(username=f'bench_other_{time.time_ns()}', email=f'other{time.time_ns()}@example.com')
+        db.session.add_all([victim, other])
+        db.session.commit()
+
+        db.session.execute(Event.__table__.insert(), [
+            {'name': f'Other {i}', 'sport': 'Running', 'location': 'Bench', 'max_players': 10,
+             'host_user_id': other.id, 'created_at': now}
+            for i in range(participations)
+        ])
+        db.session.execute(Event.__table__.insert(), [
+            {'name': f'Hosted {i}', 'sport': 'Tennis', 'location': 'Bench', 'max_players': 10,
+             'host_user_id': victim.id, 'created_at': now}
+            for i in range(hosted)
+        ])
+        other_events = [row[0] for row in db.session.query(Event.id).filter_by(host_user_id=other.id)]
+        hosted_events = [row[0] for row in db.session.query(Event.id).filter_by(host_user_id=victim.id)]
+        rows = [{'event_id': eid, 'user_id': victim.id, 'player_name': 'victim', 'joined_at': now}
+                for eid in other_events]
+        rows += [{'event_id': eid, 'user_id': None, 'player_name': f'guest{i}', 'joined_at': now}
+                 for eid in hosted_events for i in range(players_per_hosted)]
+        db.session.execute(EventParticipant.__table__.insert(), rows)
+        db.session.execute(Follow.__table__.insert(), [
+            {'follower_id': victim.id, 'followee_id': other.id, 'created_at': now},
+            {'follower_id': other.id, 'followee_id': victim.id, 'created_at': now},
+        ])
+        db.session.commit()
+        return victim.id
+
+
+def legacy_delete(user_id: int) -> None:
+    """The per-entity ORM deletion that delete_account used to do."""
+    from models import db, Event, Follow, User
+
+    for event in Event.query.filter_by(host_user_id=user_id).all():
+        db.session.delete(event)
+    Follow.query.filter_by(follower_id=user_id).delete()
+    Follow.query.filter_by(followee_id=user_id).delete()
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+
+
+def timed(app, label, args, func):
+    user_id = populate(app, args.participations, args.hosted, args.players)
+    with app.app_context():
+        start = time.perf_counter()
+        counts = func(user_id)
+        elapsed = time.perf_counter() - start
+    return {'mode': label, 'seconds': round(elapsed, 4), 'counts': counts}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participations', type=int, default=10_000)
+    parser.add_argument('--hosted', type=int, default=200)
+    parser.add_argument('--players', type=int, default=5, help='other players per hosted event')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    import accounts
+
+    app = make_app()
+    results = [
+        timed(app, 'set-based', args, lambda uid: accounts.delete_user_data(uid)),
+        timed(app, f'set-based chunk={args.chunk_size}', args,
+              lambda uid: accounts.delete_user_data(uid, chunk_size=args.chunk_size)),
+    ]
+    if not args.skip_legacy:
+        results.append(timed(app, 'legacy ORM', args, legacy_delete))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /feed latency for both feed strategies.
+
+Builds a synthetic follow graph, then replays a mix of feed reads and
+joins (which invalidate or fan out into cached feeds) and reports
+p50/p95/p99 feed latency per strategy.
+
+Usage:
+    python benchmarks/bench_feed.py
+    python benchmarks/bench_feed.py --users 2000 --events 5000 --requests 5000
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import access_token, make_app, quiet, summarize
+
+
+def populate(app, users: int, events: int, follows_per_user: int, joins_per_event: int, seed: int) -> None:
+    from models import db, Event, EventParticipant, Follow, User
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'bench_user_{i}', 'email': f'bench_user_{i}@example.com',
+             'latitude': 43.6 + rng.uniform(-0.3, 0.3), 'longitude': -79.4 + rng.uniform(-0.3, 0.3),
+             'created_at': now}
+            for i in range(users)
+        ])
+        user_ids = [row[0] for row in db.session.query(User.id).all()]
+        db.session.execute(Event.__table__.insert(), [
+            {'name': f'Bench event {i}', 'sport': rng.choice(['Basketball', 'Tennis', 'Running']),
+             'location': 'Bench', 'max_players': 50, 'host_user_id': rng.choice(user_ids),
+             'latitude': 43.6 + rng.uniform(-0.3, 0.3), 'longitude': -79.4 + rng.uniform(-0.3, 0.3),
+             'created_at': now - timedelta(hours=rng.uniform(0, 72)),
+             'event_date': now + timedelta(hours=rng.uniform(1, 240))}
+            for i in range(events)
+        ])
+        event_ids = [row[0] for row in db.session.query(Event.id).all()]
+        follows = set()
+        for follower in user_ids:
+            for followee in rng.sample(user_ids, follows_per_user):
+                if followee != follower:
+                    follows.add((follower, followee))
+        db.session.execute(Follow.__table__.insert(), [
+            {'follower_id': a, 'followee_id': b, 'created_at': now} for a, b in follows
+        ])
+        participants = []
+        for event_id in event_ids:
+            for user_id in rng.sample(user_ids, joins_per_event):
+                participants.append({'event_id': event_id, 'user_id': user_id, 'player_name': f'p{user_id}',
+                                     'team': 'team_a', 'joined_at': now - timedelta(hours=rng.uniform(0, 48))})
+        db.session.execute(EventParticipant.__table__.insert(), participants)
+        db.session.commit()
+
+
+def run(strategy: str, args) -> dict:
+    app = make_app(FEED_STRATEGY=strategy, FEED_CACHE_USERS=args.cache_users)
+    populate(app, args.users, args.events, args.follows, args.joins, args.seed)
+    client = app.test_client()
+    rng = random.Random(args.seed)
+    with app.app_context():
+        from models import Event, User
+        user_ids = [u.id for u in User.query.filter(User.username.like('bench_user_%')).all()]
+        event_ids = [e.id for e in Event.query.all()]
+    tokens = {uid: access_token(app, uid) for uid in user_ids}
+    # Reads follow a skewed distribution so the bounded cache gets hits.
+    hot_users = user_ids[: max(1, len(user_ids) // 10)]
+
+    samples = []
+    with quiet():
+        for i in range(args.requests):
+            if i % args.write_every == 0:
+                uid = rng.choice(user_ids)
+                client.post(f'/events/{rng.choice(event_ids)}/join', json={},
+                            headers={'Authorization': f'Bearer {tokens[uid]}'})
+            uid = rng.choice(hot_users) if rng.random() < 0.8 else rng.choice(user_ids)
+            start = time.perf_counter()
+            response = client.get('/feed', headers={'Authorization': f'Bearer {tokens[uid]}'})
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.data
+    return summarize(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--follows', type=int, default=30, help='followees per user')
+    parser.add_argument('--joins', type=int, default=8, help='participants per event')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--write-every', type=int, default=10, help='one join per N feed reads')
+    parser.add_argument('--cache-users', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    results = {strategy: run(strategy, args) for strategy in ('read', 'write')}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Compare nearby-search strategies at 10k and 1M points.
+
+For each size, points are spread around the datagen cities and three
+strategies answer the same queries (20 nearest, and everything within
+--radius km) from points near those cities:
+
+- loop: geo.haversine_km per point in a Python loop, then a sort (what
+  /events/nearby did before the location index);
+- numpy: geo.haversine_km_array over every point, then a partial sort;
+- index: geo.GridIndex, which only scores the cells near the query.
+
+Results of the three are checked against each other. Reports per-query
+latency and the index build time.
+
+Usage:
+    python benchmarks/bench_geo.py
+    python benchmarks/bench_geo.py --sizes 10000,1000000 --queries 50 --loop-queries 3
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from datagen import CITIES, SPREAD_DEGREES
+from geo import GridIndex, haversine_km, haversine_km_array
+
+
+def synthetic_points(n: int, rng: np.random.Generator):
+    centres = np.array([(lat, lng) for _, lat, lng in CITIES])
+    picks = centres[rng.integers(0, len(centres), size=n)]
+    return picks[:, 0] + rng.normal(0, SPREAD_DEGREES, n), picks[:, 1] + rng.normal(0, SPREAD_DEGREES, n)
+
+
+def loop_query(lats, lngs, lat, lng, k, radius_km):
+    distances = sorted((haversine_km(lat, lng, p_lat, p_lng), i) for i, (p_lat, p_lng) in enumerate(zip(lats, lngs)))
+    return [i for _, i in distances[:k]], [i for d, i in distances if d <= radius_km]
+
+
+def numpy_query(lats, lngs, lat, lng, k, radius_km):
+    distances = haversine_km_array(lat, lng, lats, lngs)
+    nearest = np.argpartition(distances, k - 1)[:k]
+    inside = np.flatnonzero(distances <= radius_km)
+    return nearest[np.argsort(distances[nearest])].tolist(), inside[np.argsort(distances[inside])].tolist()
+
+
+def index_query(index, lat, lng, k, radius_km):
+    return index.nearest(lat, lng, k)[0].tolist(), index.radius(lat, lng, radius_km)[0].tolist()
+
+
+def timed(fn, queries):
+    timings, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(*query))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {'median_ms': round(timings[len(timings) // 2], 3), 'worst_ms': round(timings[-1], 3)}, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,1000000')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--loop-queries', type=int, default=3, help='queries for the slow Python loop')
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--radius', type=float, default=5.0)
+    parser.add_argument('--cell-degrees', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    report = {}
+    for n in (int(size) for size in args.sizes.split(',')):
+        rng = np.random.default_rng(args.seed)
+        lats, lngs = synthetic_points(n, rng)
+        queries = list(zip(*synthetic_points(args.queries, rng)))
+
+        start = time.perf_counter()
+        index = GridIndex(args.cell_degrees)
+        index.load(zip(range(n), lats.tolist(), lngs.tolist()))
+        build_ms = (time.perf_counter() - start) * 1000
+
+        list_lats, list_lngs = lats.tolist(), lngs.tolist()
+        loop, loop_results = timed(lambda lat, lng: loop_query(list_lats, list_lngs, lat, lng, args.k, args.radius),
+                                   queries[:args.loop_queries])
+        vector, vector_results = timed(lambda lat, lng: numpy_query(lats, lngs, lat, lng, args.k, args.radius),
+                                       queries)
+        grid, grid_results = timed(lambda lat, lng: index_query(index, lat, lng, args.k, args.radius), queries)
+
+        # Ties are broken differently, so compare as sets.
+        for expected, *others in zip(loop_results, vector_results, grid_results):
+            for got in others:
+                assert set(got[0]) == set(expected[0]) and set(got[1]) == set(expected[1]), 'strategies disagree'
+        for expected, got in zip(vector_results, grid_results):
+            assert set(got[0]) == set(expected[0]) and set(got[1]) == set(expected[1]), 'strategies disagree'
+
+        report[n] = {
+            'mean_radius_hits': round(sum(len(r[1]) for r in grid_results) / len(grid_results), 1),
+            'loop': loop,
+            'numpy': vector,
+            'index': grid,
+            'index_build_ms': round(build_ms, 1),
+            'speedup_vs_loop': round(loop['median_ms'] / max(grid['median_ms'], 1e-6), 1),
+        }
+    print(json.dumps({'k': args.k, 'radius_km': args.radius, 'sizes': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
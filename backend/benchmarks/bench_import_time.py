@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Track how long `import app` takes, against a budget.
+
+Runs `python -X importtime -c "import app"` in fresh interpreters (each
+against a new SQLite file, so create_app's startup work is included), then
+reports the median cumulative import time of `app`, the heaviest top-level
+imports, and whether any module that should load lazily (Authlib, requests)
+was imported at boot. Exits 1 when the median exceeds the budget in
+import_budget.json or a lazy module was imported.
+
+Usage:
+    python benchmarks/bench_import_time.py [--runs 5] [--top 15]
+    python benchmarks/bench_import_time.py --update-budget   # budget = median x 1.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from common import BACKEND_DIR, _temp_sqlite_url
+
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_budget.json')
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self us, cumulative us, depth) rows of -X importtime output, in order."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, raw_name = line[len('import time:'):].split('|')
+        # Names are indented two spaces per nesting level, after one separator space.
+        depth = (len(raw_name) - len(raw_name.lstrip(' ')) - 1) // 2
+        rows.append((raw_name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def app_imports(rows: list) -> list:
+    """The rows imported while importing `app` (children come before their parent)."""
+    end = next(i for i, row in enumerate(rows) if row[0] == 'app' and row[3] == 0)
+    start = end
+    while start > 0 and rows[start - 1][3] > 0:
+        start -= 1
+    return rows[start:end + 1]
+
+
+def run_once() -> dict:
+    env = dict(os.environ, DATABASE_URL=_temp_sqlite_url())
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=BACKEND_DIR,
+                            env=env, capture_output=True, text=True, check=True)
+    return app_imports(parse_importtime(result.stderr))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--update-budget', action='store_true')
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+
+    runs = [run_once() for _ in range(args.runs)]
+    totals = [rows[-1][2] / 1000 for rows in runs]
+    median = statistics.median(totals)
+    last = runs[-1]
+    heaviest = sorted(
+        ((name, cumulative / 1000) for name, _, cumulative, depth in last if depth == 1),
+        key=lambda item: item[1], reverse=True,
+    )[:args.top]
+    lazy_loaded = sorted({name.split('.')[0] for name, *_ in last} & set(budget['lazy_modules']))
+
+    report = {
+        'app_import_ms': {'median': round(median, 1), 'min': round(min(totals), 1), 'max': round(max(totals), 1)},
+        'budget_ms': budget['app_import_ms'],
+        'heaviest_imports_ms': {name: round(ms, 1) for name, ms in heaviest},
+        'lazy_modules_imported': lazy_loaded,
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.update_budget:
+        budget['app_import_ms'] = round(median * 1.5)
+        with open(BUDGET_FILE, 'w') as f:
+            json.dump(budget, f, indent=2)
+            f.write('\n')
+        print(f"Budget set to {budget['app_import_ms']} ms")
+        return
+    failures = []
+    if median > budget['app_import_ms']:
+        failures.append(f"import app took {median:.0f} ms (budget {budget['app_import_ms']} ms)")
+    if lazy_loaded:
+        failures.append(f"imported at boot but should load lazily: {', '.join(lazy_loaded)}")
+    for failure in failures:
+        print(f'OVER BUDGET: {failure}', file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
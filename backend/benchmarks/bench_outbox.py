@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Outbox relay throughput and delivery guarantees.
+
+1. Relay throughput: records N messages, then drains them with one relay
+   per batch size and reports messages/s and delivery lag.
+2. Retries: a callback sink that fails every message's first attempt, next
+   to a queue sink. Every message must reach the callback, and the queue
+   sink must take each key exactly once despite the batch being retried.
+3. Two relays draining the same table concurrently must not deliver any
+   message twice.
+4. Rolled-back work leaves no message behind: a join that fails because
+   the event is full must not be published.
+
+Exits 1 if a delivery check fails. The cost of writing messages in the
+request transaction shows up as queries/request in loadtest.py.
+
+Usage:
+    python benchmarks/bench_outbox.py [--messages 5000] [--batch-sizes 1,10,100,500]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+
+from common import access_token, make_app, quiet
+from datagen import generate
+
+
+def fill(app, count: int) -> None:
+    import outbox
+    from models import db
+
+    with app.app_context():
+        for i in range(count):
+            outbox.record('bench.message', {'n': i})
+        db.session.commit()
+
+
+def reset(app) -> None:
+    from models import db, OutboxMessage
+
+    with app.app_context():
+        OutboxMessage.query.delete()
+        db.session.commit()
+
+
+def relay_with(app, sinks, batch_size: int, max_attempts: int = 10):
+    from outbox import OutboxRelay
+
+    relay = OutboxRelay(sinks=sinks, batch_size=batch_size, max_attempts=max_attempts)
+    app.extensions['outbox'] = relay
+    return relay
+
+
+def drain(app, relay, retry_backoff: bool = False) -> int:
+    """Run the relay in burst mode; with `retry_backoff`, keep going until retried messages are due."""
+    from models import db, OutboxMessage
+
+    delivered = relay.run(app, burst=True)
+    while retry_backoff:
+        with app.app_context():
+            waiting = OutboxMessage.query.filter(OutboxMessage.status == 'pending').count()
+            if not waiting:
+                break
+            # Skip the retry backoff.
+            OutboxMessage.query.filter(OutboxMessage.status == 'pending').update(
+                {'available_at': OutboxMessage.created_at})
+            db.session.commit()
+        delivered += relay.run(app, burst=True)
+    return delivered
+
+
+def throughput(app, messages: int, batch_sizes) -> dict:
+    from outbox import CallbackSink
+
+    results = {}
+    for batch_size in batch_sizes:
+        reset(app)
+        fill(app, messages)
+        sink = CallbackSink()
+        seen = Counter()
+        sink.subscribe('*', lambda message: seen.update([message['key']]))
+        relay = relay_with(app, [sink], batch_size)
+        start = time.perf_counter()
+        delivered = drain(app, relay)
+        elapsed = time.perf_counter() - start
+        with app.app_context():
+            stats = relay.stats()
+        results[f'batch_{batch_size}'] = {
+            'delivered': delivered,
+            'messages_per_s': round(delivered / elapsed),
+            'delivery_lag': stats['delivery_lag'],
+        }
+    return results
+
+
+def retries(app, messages: int) -> list:
+    from outbox import CallbackSink, QueueSink
+
+    reset(app)
+    fill(app, messages)
+    attempts = Counter()
+
+    def flaky(message):
+        attempts[message['key']] += 1
+        if attempts[message['key']] == 1:
+            raise RuntimeError('first attempt fails')
+
+    callback, queue_sink = CallbackSink(), QueueSink(max_size=messages * 2)
+    callback.subscribe('*', flaky)
+    # The queue sink runs first, so it has taken each message before the callback fails.
+    relay = relay_with(app, [queue_sink, callback], batch_size=50)
+    drain(app, relay, retry_backoff=True)
+
+    queued = Counter()
+    while not queue_sink.queue.empty():
+        queued[queue_sink.queue.get_nowait()['key']] += 1
+    failures = []
+    if len(attempts) != messages or any(n < 2 for n in attempts.values()):
+        failures.append(f'callback saw {len(attempts)} of {messages} messages after retries')
+    if len(queued) != messages or any(n != 1 for n in queued.values()):
+        failures.append(f'queue sink took {sum(queued.values())} deliveries for {messages} messages')
+    with app.app_context():
+        stats = relay.stats()
+    if stats['counts'] != {'delivered': messages}:
+        failures.append(f"unexpected final statuses {stats['counts']}")
+    return failures
+
+
+def concurrent_relays(app, messages: int) -> list:
+    from outbox import CallbackSink, OutboxRelay
+
+    reset(app)
+    fill(app, messages)
+    seen = Counter()
+    lock = threading.Lock()
+
+    def count(message):
+        with lock:
+            seen[message['key']] += 1
+
+    relays = []
+    for _ in range(2):
+        sink = CallbackSink()
+        sink.subscribe('*', count)
+        relays.append(OutboxRelay(sinks=[sink], batch_size=25))
+    threads = [threading.Thread(target=relay.run, args=(app,), kwargs={'burst': True}) for relay in relays]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    failures = []
+    if len(seen) != messages:
+        failures.append(f'two relays delivered {len(seen)} of {messages} messages')
+    twice = sum(1 for n in seen.values() if n > 1)
+    if twice:
+        failures.append(f'two relays delivered {twice} messages more than once')
+    return failures
+
+
+def rolled_back_join(app) -> list:
+    from models import OutboxMessage
+
+    reset(app)
+    with quiet():
+        dataset = generate(app, users=3, events=0, follows_per_user=0, joins_per_event=0, seed=3)
+    host, player = dataset.user_ids[0], dataset.user_ids[1]
+    client = app.test_client()
+    host_headers = {'Authorization': f'Bearer {access_token(app, host)}'}
+    with quiet():
+        event = client.post('/events', headers=host_headers, json={
+            'name': 'Outbox check', 'sport': 'Tennis', 'location': 'Court', 'max_players': 1,
+        }).get_json()['event']
+        full = client.post(f"/events/{event['id']}/join",
+                           headers={'Authorization': f'Bearer {access_token(app, player)}'}, json={})
+    with app.app_context():
+        topics = [row.topic for row in OutboxMessage.query.order_by(OutboxMessage.id)]
+    if full.status_code != 409 or topics != ['event.created']:
+        return [f'full join answered {full.status_code} and left messages {topics}']
+    return []
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--batch-sizes', default='1,10,100,500')
+    args = parser.parse_args()
+
+    app = make_app(RATE_LIMIT_ENABLED='false')
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    with quiet():
+        report = {'throughput': throughput(app, args.messages, batch_sizes)}
+        failures = retries(app, min(args.messages, 500))
+        failures += concurrent_relays(app, min(args.messages, 1000))
+    failures += rolled_back_join(app)
+    report['failures'] = failures
+    print(json.dumps(report, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Statements and latency of GET /events/<id>/participants by roster size.
+
+For each size, builds one event with that many participants (a quarter of
+them guests) and compares:
+
+- legacy: the previous view, one SELECT for the participant rows, then a
+  `User.query.get` per registered participant (guests were dropped);
+- endpoint: the current view, a count plus one LEFT JOIN of participants to
+  users (plus one GROUP BY with `group_by=team`).
+
+The statement count of the endpoint must not grow with the roster, and the
+endpoint must return every participant, guests included. Exits 1 otherwise.
+
+Usage:
+    python benchmarks/bench_participants.py [--sizes 10,100,1000] [--repeat 20]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from sqlalchemy import event as sa_event, insert
+
+from common import make_app, percentile, quiet
+from datagen import generate
+
+ENDPOINT_STATEMENTS = {'plain': 2, 'group_by=team': 3}
+
+
+def build_event(app, user_ids, size: int) -> int:
+    from models import db, Event, EventParticipant
+
+    with app.app_context():
+        event = Event(name=f'Run club {size}', sport='Running', location='Park', max_players=size,
+                      host_user_id=user_ids[0])
+        db.session.add(event)
+        db.session.flush()
+        rows = []
+        for i in range(size):
+            guest = i % 4 == 3
+            rows.append({
+                'event_id': event.id,
+                'user_id': None if guest else user_ids[i % len(user_ids)],
+                'player_name': f'guest {i}' if guest else f'player {i}',
+                'guest_name': f'guest {i}' if guest else None,
+                'team': 'team_a' if i % 2 else 'team_b',
+            })
+        db.session.execute(insert(EventParticipant), rows)
+        db.session.commit()
+        return event.id
+
+
+def legacy_participants(event_id: int):
+    from models import EventParticipant, User
+
+    users = []
+    for participant in EventParticipant.query.filter_by(event_id=event_id).all():
+        if participant.user_id:
+            user = User.query.get(participant.user_id)
+            if user:
+                users.append(user.to_dict())
+    return users
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        sa_event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        sa_event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+def measure(call, repeat: int, counter: StatementCounter):
+    samples = []
+    with counter:
+        result = call()
+    statements = counter.count
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return result, statements, round(percentile(samples, 50), 3)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    app = make_app(RATE_LIMIT_ENABLED='false')
+    with quiet():
+        dataset = generate(app, users=max(sizes), events=0, follows_per_user=0, joins_per_event=0, seed=11)
+    client = app.test_client()
+    with app.app_context():
+        from models import db
+
+        counter = StatementCounter(db.engine)
+
+    report, failures = {}, []
+    for size in sizes:
+        event_id = build_event(app, dataset.user_ids, size)
+        row = {}
+        with app.app_context():
+            legacy, statements, p50 = measure(lambda: legacy_participants(event_id), args.repeat, counter)
+        row['legacy'] = {'statements': statements, 'p50_ms': p50, 'returned': len(legacy)}
+        for name, query in (('plain', ''), ('group_by=team', '&group_by=team')):
+            url = f'/events/{event_id}/participants?limit=1000{query}'
+            with quiet():
+                response, statements, p50 = measure(lambda: client.get(url), args.repeat, counter)
+            body = response.get_json()
+            row[name] = {'statements': statements, 'p50_ms': p50, 'returned': len(body['participants'])}
+            if statements != ENDPOINT_STATEMENTS[name]:
+                failures.append(f'{size} participants, {name}: {statements} statements '
+                                f'(expected {ENDPOINT_STATEMENTS[name]})')
+            if body['total'] != size or len(body['participants']) != min(size, 1000):
+                failures.append(f"{size} participants, {name}: total {body['total']}, "
+                                f"returned {len(body['participants'])}")
+        report[f'{size}_participants'] = row
+
+    report['failures'] = failures
+    print(json.dumps(report, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Measure what a login burst does to unrelated routes.
+
+Starts the app under serve.py (one gthread worker by default) once with
+hashing on the request threads (PASSWORD_HASH_WORKERS=0) and once with the
+process pool, then runs --login-clients clients posting /auth/login back to
+back while --probe-clients clients poll --probe-path. Reports login
+throughput and the probe route's latency per mode, next to a probe-only
+baseline.
+
+Usage:
+    python benchmarks/bench_password_hashing.py [--modes 0,2] [--duration 10]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+
+from bench_serving import free_port, start_server, wait_ready
+from common import summarize
+
+EMAIL = 'bench-login@example.com'
+PASSWORD = 'bench-password-1'
+
+
+def request(conn, method, path, body=None):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def worker(port, method, path, body, stop_at, latencies, statuses):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while time.time() < stop_at:
+        start = time.perf_counter()
+        try:
+            status = request(conn, method, path, body)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            status = 'error'
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    conn.close()
+
+
+def run(port, args, login_clients):
+    stop_at = time.time() + args.duration
+    login, probe = ([], {}), ([], {})
+    threads = [
+        threading.Thread(target=worker, args=(port, 'POST', '/auth/login',
+                                              {'email': EMAIL, 'password': PASSWORD}, stop_at, *login))
+        for _ in range(login_clients)
+    ] + [
+        threading.Thread(target=worker, args=(port, 'GET', args.probe_path, None, stop_at, *probe))
+        for _ in range(args.probe_clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = {'probe': {**summarize(probe[0]), 'statuses': probe[1]}}
+    if login_clients:
+        result['login'] = {
+            'per_second': round(login[1].get(200, 0) / args.duration, 1),
+            **summarize(login[0]),
+            'statuses': login[1],
+        }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='0,2', help='PASSWORD_HASH_WORKERS values to compare')
+    parser.add_argument('--method', default='scrypt')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--login-clients', type=int, default=8)
+    parser.add_argument('--probe-clients', type=int, default=2)
+    parser.add_argument('--probe-path', default='/events/tiles/0/0/0')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(prefix='hopon-hash-', suffix='.db', delete=False).name
+    env = {
+        'DATABASE_URL': f'sqlite:///{db_file}',
+        'WEB_CONCURRENCY': str(args.workers),
+        'SERVE_THREADS': str(args.threads),
+        'RATE_LIMIT_ENABLED': 'false',
+        'RESPONSE_CACHE_BACKEND': 'none',
+        'PASSWORD_HASH_METHOD': args.method,
+        'PASSWORD_HASH_QUEUE': str(args.threads * 4),
+    }
+    results = {}
+    for hash_workers in args.modes.split(','):
+        port = free_port()
+        server = start_server('gthread', port, dict(env, PASSWORD_HASH_WORKERS=hash_workers))
+        try:
+            wait_ready(port)
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            request(conn, 'POST', '/auth/signup', {'email': EMAIL, 'password': PASSWORD, 'username': 'benchlogin'})
+            conn.close()
+            label = 'inline' if hash_workers == '0' else f'pool x{hash_workers}'
+            results[label] = {'baseline': run(port, args, 0), 'burst': run(port, args, args.login_clients)}
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=30)
+    print(json.dumps({'method': args.method, 'cpus': os.cpu_count(), 'probe_path': args.probe_path,
+                      'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of read-only session mode on the list routes.
+
+Fills one database with datagen.py, then serves the same authenticated
+requests from two apps, one with READ_ONLY_SESSIONS=true and one with
+false. For each route it reports p50/p95 latency, SQL statements and how
+many objects the request left in the session identity map. It also checks
+that a write inside read-only mode is caught (READ_ONLY_VIOLATIONS=raise).
+
+Usage:
+    python benchmarks/bench_read_sessions.py [--users 1000] [--events 2000] [--requests 200]
+"""
+
+import argparse
+import json
+import time
+
+from sqlalchemy import event as sa_event
+
+from common import _temp_sqlite_url, access_token, make_app, quiet, summarize
+from datagen import CITIES, generate
+
+
+def routes(dataset):
+    _, lat, lng = CITIES[0]
+    return [
+        '/events',
+        f'/events/nearby?lat={lat}&lng={lng}&limit=50',
+        '/users/nearby',
+        f'/users/nearby?lat={lat}&lng={lng}&limit=50',
+        f'/events/{dataset.event_ids[0]}',
+        f'/users/{dataset.user_ids[1]}',
+    ]
+
+
+def run(app, paths, token, requests_per_route: int):
+    from models import db
+
+    counters = {'statements': 0, 'identity_map': 0}
+
+    def count(*args, **kwargs):
+        counters['statements'] += 1
+
+    @app.after_request
+    def identity_map_size(response):
+        counters['identity_map'] += len(db.session.identity_map)
+        return response
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    results = {}
+    with app.app_context():
+        sa_event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for path in paths:
+            with quiet():
+                client.get(path, headers=headers)  # warm caches and indexes
+            counters.update(statements=0, identity_map=0)
+            latencies = []
+            with quiet():
+                for _ in range(requests_per_route):
+                    start = time.perf_counter()
+                    response = client.get(path, headers=headers)
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200, (path, response.status_code)
+            results[path.split('?')[0] + ('?lat&lng&limit' if '?' in path else '')] = {
+                **summarize(latencies),
+                'statements': round(counters['statements'] / requests_per_route, 2),
+                'identity_map': round(counters['identity_map'] / requests_per_route, 1),
+            }
+    finally:
+        with app.app_context():
+            sa_event.remove(db.engine, 'before_cursor_execute', count)
+    return results
+
+
+def check_violation(app) -> str:
+    from models import db, User
+    from replicas import ReadOnlyViolation, read_only_session
+
+    with app.app_context():
+        user = db.session.execute(db.select(User).limit(1)).scalar_one()
+        with read_only_session(db.session(), 'raise'):
+            user.bio = 'changed in read-only mode'
+            try:
+                db.session.flush()
+            except ReadOnlyViolation as e:
+                db.session.rollback()
+                return f'caught: {e}'
+    raise AssertionError('write in read-only mode was not detected')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    url = _temp_sqlite_url()
+    env = dict(DATABASE_URL=url, RATE_LIMIT_ENABLED='false', RESPONSE_CACHE_BACKEND='none',
+               READ_ONLY_VIOLATIONS='raise')
+    app = make_app(**env, READ_ONLY_SESSIONS='true')
+    with quiet():
+        dataset = generate(app, users=args.users, events=args.events)
+    token = access_token(app, dataset.user_ids[0])
+    paths = routes(dataset)
+
+    report = {'read_only': run(app, paths, token, args.requests)}
+    report['default'] = run(make_app(**env, READ_ONLY_SESSIONS='false'), paths, token, args.requests)
+    print(json.dumps({
+        'users': args.users,
+        'events': args.events,
+        'violation_check': check_violation(app),
+        'modes': report,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark vectorized event scoring for /events/recommended.
+
+Scores a synthetic candidate set (default 100k events around Toronto) for
+a user with two sports and a known skill level, then selects the top 20.
+The scoring pass should stay well under 100 ms at 100k candidates.
+
+Usage:
+    python benchmarks/bench_recommendations.py
+    python benchmarks/bench_recommendations.py --candidates 1000000 --repeat 5
+"""
+
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from recommendations import SPORTS, Candidates, UserFeatures, score_candidates, top_k
+
+SPORT_NAMES = ['basketball', 'tennis', 'running', 'soccer', 'volleyball', 'badminton', 'yoga']
+
+
+def synthetic_candidates(n: int, seed: int) -> Candidates:
+    rng = np.random.default_rng(seed)
+    codes = np.array([SPORTS.code(name) for name in SPORT_NAMES], dtype=np.int32)
+    skill = rng.choice([0.0, 1.0, 2.0, math.nan], size=n)
+    max_players = rng.integers(2, 30, size=n).astype(np.float64)
+    return Candidates(
+        ids=np.arange(n, dtype=np.int64),
+        sport_codes=rng.choice(codes, size=n),
+        skill=skill,
+        latitude=43.65 + rng.uniform(-0.45, 0.45, size=n),
+        longitude=-79.38 + rng.uniform(-0.6, 0.6, size=n),
+        current_players=np.floor(rng.uniform(0, 1, size=n) * (max_players + 1)),
+        max_players=max_players,
+        hours_to_start=rng.uniform(-2, 24 * 14, size=n),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    candidates = synthetic_candidates(args.candidates, args.seed)
+    features = UserFeatures(
+        sports=frozenset({'basketball', 'tennis'}),
+        skill=1.0,
+        latitude=43.6532,
+        longitude=-79.3832,
+        joined_event_ids=frozenset(),
+    )
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        scores = score_candidates(features, candidates)
+        top_k(scores, np.flatnonzero(np.isfinite(scores)), args.limit)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    print(json.dumps({
+        'candidates': args.candidates,
+        'best_ms': round(timings[0] * 1000, 3),
+        'median_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'worst_ms': round(timings[-1] * 1000, 3),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Refresh-token rotation against a large refresh_sessions table.
+
+1. Fills refresh_sessions with N rows (half of them expired), then measures
+   /auth/refresh latency and statements per request while rotating one
+   client's token repeatedly.
+2. Parallel refreshes: several threads send the same refresh cookie at
+   once. Exactly one may rotate it; the others must still get an access
+   token (reuse grace) and no new cookie.
+3. Replaying a token after the grace period ends its session, and so does
+   replaying a token two rotations old at any time.
+4. Times the batched sweeper over the expired rows.
+
+Exits 1 if a check fails.
+
+Usage:
+    python benchmarks/bench_refresh_sessions.py [--sessions 100000] [--refreshes 300]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event as sa_event
+
+from common import make_app, percentile, quiet
+
+
+def refresh_cookie(response):
+    for header in response.headers.getlist('Set-Cookie'):
+        if header.startswith('refresh_token='):
+            return header.split(';', 1)[0].split('=', 1)[1] or None
+    return None
+
+
+def fill(app, count: int, user_id: int) -> None:
+    from sqlalchemy import insert
+
+    from models import db, RefreshSession
+    from tokens import hash_token_id
+
+    now = datetime.utcnow()
+    with app.app_context():
+        for start in range(0, count, 10_000):
+            db.session.execute(insert(RefreshSession), [
+                {
+                    'token_hash': hash_token_id(f'bench-{i}'),
+                    'user_id': user_id,
+                    'expires_at': now + timedelta(days=-1 if i % 2 else 7),
+                }
+                for i in range(start, min(start + 10_000, count))
+            ])
+        db.session.commit()
+
+
+def sign_in(app, username: str):
+    client = app.test_client()
+    with quiet():
+        response = client.post('/auth/demo-login', json={'username': username})
+    return client, response.get_json()['user']['id'], refresh_cookie(response)
+
+
+def refresh(client, token: str):
+    client.set_cookie('refresh_token', token)
+    response = client.post('/auth/refresh')
+    return response.status_code, refresh_cookie(response)
+
+
+def rotation_latency(app, refreshes: int) -> dict:
+    from models import db
+
+    client, _, token = sign_in(app, 'bench_rotation')
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: statements.append(1)  # noqa: E731
+    sa_event.listen(engine, 'before_cursor_execute', listener)
+    samples = []
+    try:
+        for _ in range(refreshes):
+            start = time.perf_counter()
+            with quiet():
+                status, token = refresh(client, token)
+            samples.append((time.perf_counter() - start) * 1000)
+            if status != 200 or not token:
+                return {'error': f'rotation failed with {status}'}
+    finally:
+        sa_event.remove(engine, 'before_cursor_execute', listener)
+    samples.sort()
+    return {
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'statements_per_refresh': round(len(statements) / refreshes, 2),
+    }
+
+
+def parallel_refresh(app, threads: int) -> list:
+    _, _, token = sign_in(app, 'bench_parallel')
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        status, new_token = refresh(app.test_client(), token)
+        with lock:
+            results.append((status, new_token))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    # quiet() swaps sys.stdout for the whole process, so enter it once here.
+    with quiet():
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    failures = []
+    statuses = sorted(status for status, _ in results)
+    rotated = [new_token for _, new_token in results if new_token]
+    # SQLite may refuse a writer under contention (5xx); those count as failures too.
+    if statuses != [200] * threads:
+        failures.append(f'parallel refreshes answered {statuses}')
+    if len(rotated) != 1:
+        failures.append(f'{len(rotated)} parallel refreshes rotated the cookie (expected 1)')
+    return failures
+
+
+def replay(url: str) -> list:
+    with quiet():
+        app = make_app(DATABASE_URL=url, RATE_LIMIT_ENABLED='false', REFRESH_REUSE_GRACE_SECONDS='0')
+    client, _, first = sign_in(app, 'bench_replay')
+    with quiet():
+        _, second = refresh(client, first)
+        replayed = refresh(client, first)[0]
+        after = refresh(client, second)[0]
+    failures = []
+    if replayed != 401:
+        failures.append('replayed refresh token was accepted')
+    if after != 401:
+        failures.append('session survived a replayed refresh token')
+    return failures
+
+
+def stale_replay(url: str) -> list:
+    """A token two rotations old ends the session, even inside the grace period."""
+    with quiet():
+        app = make_app(DATABASE_URL=url, RATE_LIMIT_ENABLED='false', REFRESH_REUSE_GRACE_SECONDS='60')
+    client, _, first = sign_in(app, 'bench_stale_replay')
+    with quiet():
+        _, second = refresh(client, first)
+        _, third = refresh(client, second)
+        replayed = refresh(client, first)[0]
+        after = refresh(client, third)[0]
+    failures = []
+    if replayed != 401:
+        failures.append('refresh token two rotations old was accepted')
+    if after != 401:
+        failures.append('session survived a refresh token two rotations old')
+    return failures
+
+
+def sweep(app) -> dict:
+    from models import RefreshSession
+
+    with app.app_context():
+        before = RefreshSession.query.count()
+        start = time.perf_counter()
+        swept = app.extensions['tokens'].sweep()
+        elapsed = time.perf_counter() - start
+        after = RefreshSession.query.count()
+    return {'rows_before': before, 'swept': swept, 'rows_after': after, 'seconds': round(elapsed, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=100_000)
+    parser.add_argument('--refreshes', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with quiet():
+        app = make_app(RATE_LIMIT_ENABLED='false')
+    _, owner_id, _ = sign_in(app, 'bench_owner')
+    fill(app, args.sessions, owner_id)
+    report = {'rotation': rotation_latency(app, args.refreshes)}
+    failures = [report['rotation']['error']] if 'error' in report['rotation'] else []
+    failures += parallel_refresh(app, args.threads)
+    failures += replay(app.config['SQLALCHEMY_DATABASE_URI'])
+    failures += stale_replay(app.config['SQLALCHEMY_DATABASE_URI'])
+    report['sweep'] = sweep(app)
+    report['failures'] = failures
+    print(json.dumps(report, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Exercise read-replica routing against two local SQLite files.
+
+The primary is created and seeded, copied to a replica file, and the app is
+started with DATABASE_REPLICA_URL pointing at the copy. Writes then only
+reach the primary, which makes routing observable:
+
+1. a writer sees its new event immediately (read-your-writes stickiness);
+2. another client does not, because its reads are served by the stale replica,
+   even when it shares the writer's address (stickiness follows the user);
+3. once the sticky window passes, the writer reads from the replica too;
+4. with the replica gone, reads fall back to the primary.
+
+It also times GET /events through the replica and the primary.
+
+Usage:
+    python benchmarks/bench_replica_routing.py [--requests 200]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+from common import _temp_sqlite_url, access_token, make_app, quiet, summarize
+
+
+def event_names(client, **kwargs):
+    with quiet():
+        response = client.get('/events', **kwargs)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return {event['name'] for event in response.get_json()}
+
+
+def timed_gets(client, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        with quiet():
+            client.get('/events')
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--sticky-seconds', type=float, default=0.5)
+    args = parser.parse_args()
+
+    primary_url = _temp_sqlite_url()
+    make_app(DATABASE_URL=primary_url)
+    primary_path = primary_url[len('sqlite:///'):]
+    replica_path = primary_path.replace('.db', '-replica.db')
+    shutil.copyfile(primary_path, replica_path)
+
+    app = make_app(
+        DATABASE_URL=primary_url,
+        DATABASE_REPLICA_URL=f'sqlite:///{replica_path}',
+        REPLICA_STICKY_SECONDS=args.sticky_seconds,
+        REPLICA_CHECK_INTERVAL=0,
+        # Anonymous /events responses are cached; the checks need every read to reach a database.
+        RESPONSE_CACHE_BACKEND='none',
+    )
+    router = app.extensions['replicas']
+    writer = app.test_client()
+    reader = app.test_client()
+    reader_env = {'environ_base': {'REMOTE_ADDR': '10.0.0.2'}}
+
+    token = access_token(app, 2)
+    with quiet():
+        response = writer.post('/events', headers={'Authorization': f'Bearer {token}'}, json={
+            'name': 'Replica check', 'sport': 'Tennis', 'location': 'Court 1', 'max_players': 4,
+        })
+    assert response.status_code == 201, response.get_data(as_text=True)
+
+    checks = {
+        'writer_sees_own_write': 'Replica check' in event_names(writer, headers={'Authorization': f'Bearer {token}'}),
+        'other_client_reads_replica': 'Replica check' not in event_names(reader, **reader_env),
+        'same_address_client_reads_replica': 'Replica check' not in event_names(app.test_client()),
+    }
+    time.sleep(args.sticky_seconds + 0.1)
+    checks['writer_back_on_replica'] = 'Replica check' not in event_names(
+        writer, headers={'Authorization': f'Bearer {token}'}
+    )
+
+    timings = {
+        'replica': timed_gets(reader, args.requests),
+    }
+    os.environ.pop('DATABASE_REPLICA_URL')
+    primary_only = make_app(DATABASE_URL=primary_url)
+    timings['primary'] = timed_gets(primary_only.test_client(), args.requests)
+
+    os.remove(replica_path)
+    with app.app_context():
+        app.extensions['sqlalchemy'].engines['replica'].dispose()
+    checks['fallback_when_replica_down'] = 'Replica check' in event_names(reader, **reader_env)
+
+    print(json.dumps({'checks': checks, 'get_events': timings, 'router': router.stats()}, indent=2))
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark the response cache on anonymous discover-page traffic.
+
+Seeds N events around a city centre, then replays anonymous
+/events and /events/nearby requests from random points within a few km,
+with the cache disabled and with the in-process LRU. A write every
+--write-every requests invalidates the 'events' tag.
+
+Usage:
+    python benchmarks/bench_response_cache.py [--events 500] [--requests 300]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import access_token, make_app, quiet, summarize
+
+CENTER = (40.7128, -74.0060)
+
+
+def seed(app, n_events: int, rng: random.Random) -> None:
+    from models import db, Event
+
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(Event.__table__.insert(), [
+            {
+                'name': f'Bench {i}', 'sport': rng.choice(['Tennis', 'Basketball', 'Running']),
+                'location': 'Bench', 'max_players': 10, 'created_at': now,
+                'event_date': now + timedelta(hours=rng.uniform(1, 240)),
+                'latitude': CENTER[0] + rng.uniform(-0.2, 0.2),
+                'longitude': CENTER[1] + rng.uniform(-0.2, 0.2),
+            }
+            for i in range(n_events)
+        ])
+        db.session.commit()
+
+
+def run(backend: str, args) -> dict:
+    rng = random.Random(args.seed)
+    app = make_app(RESPONSE_CACHE_BACKEND=backend)
+    seed(app, args.events, rng)
+    client = app.test_client()
+    token = access_token(app, 1)
+    samples = []
+    for i in range(args.requests):
+        if args.write_every and i and i % args.write_every == 0:
+            with quiet():
+                client.post('/events', headers={'Authorization': f'Bearer {token}'}, json={
+                    'name': f'Write {i}', 'sport': 'Tennis', 'location': 'Bench', 'max_players': 4,
+                })
+        if rng.random() < 0.3:
+            path = '/events'
+        else:
+            lat = CENTER[0] + rng.uniform(-0.03, 0.03)
+            lng = CENTER[1] + rng.uniform(-0.03, 0.03)
+            path = f'/events/nearby?lat={lat:.5f}&lng={lng:.5f}'
+        start = time.perf_counter()
+        with quiet():
+            client.get(path)
+        samples.append(time.perf_counter() - start)
+    return {'backend': backend, **summarize(samples), 'cache': app.extensions['response_cache'].stats()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--write-every', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    results = [run('none', args), run('memory', args)]
+    for result in results:
+        result['cache'].pop('endpoints', None)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
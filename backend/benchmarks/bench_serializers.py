@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compare ORM to_dict() with the precompiled row mappers in serializers.py.
+
+Generates a data set with datagen.py, then serializes every event and every
+user (10k rows each by default) three ways:
+
+- to_dict: load ORM entities and call to_dict() (the old list-route path;
+  events run two extra queries each, one for the count and one for the host);
+- mapper: one Core select mapped through serializers.EVENTS / USERS. The
+  first run starts with empty datetime memos; later runs hit them.
+
+Reports per 10k rows the first and best run time, SQL statements per run,
+and allocations (bytes still held by the output, and the peak while
+serializing, from tracemalloc), and checks that both strategies return the
+same dicts.
+
+Usage:
+    python benchmarks/bench_serializers.py [--rows 10000] [--repeat 3]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from sqlalchemy import event as sa_event
+
+from common import make_app, quiet
+from datagen import generate
+
+
+def measure(app, fn, repeat: int):
+    """Output, run times (the first one cold), statements per run, retained and peak bytes."""
+    from models import db
+
+    timings, statements = [], [0]
+    with app.app_context():
+        def count(*args, **kwargs):
+            statements[0] += 1
+        sa_event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            for _ in range(repeat):
+                db.session.expunge_all()
+                start = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - start)
+            db.session.expunge_all()
+            tracemalloc.start()
+            output = fn()
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            sa_event.remove(db.engine, 'before_cursor_execute', count)
+    return output, timings, statements[0] // (repeat + 1), retained, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = make_app(RATE_LIMIT_ENABLED='false')
+    with quiet():
+        generate(app, users=args.rows, events=args.rows, follows_per_user=2)
+
+    from models import Event, User
+    from serializers import EVENTS, USERS
+
+    strategies = {
+        'events': {
+            'to_dict': lambda: [e.to_dict() for e in Event.query.all()],
+            'mapper': lambda: EVENTS.all(EVENTS.select()),
+        },
+        'users': {
+            'to_dict': lambda: [u.to_dict() for u in User.query.all()],
+            'mapper': lambda: USERS.all(USERS.select()),
+        },
+    }
+    report = {}
+    scale = 10_000 / args.rows
+    for kind, fns in strategies.items():
+        results, outputs = {}, {}
+        for name, fn in fns.items():
+            (EVENTS if kind == 'events' else USERS).clear_memos()
+            with quiet():
+                output, timings, statements, retained, peak = measure(app, fn, args.repeat)
+            outputs[name] = {row['id']: row for row in output}
+            results[name] = {
+                'first_ms': round(timings[0] * 1000 * scale, 1),
+                'best_ms': round(min(timings) * 1000 * scale, 1),
+                'statements': statements,
+                'retained_kib': round(retained / 1024 * scale),
+                'peak_kib': round(peak / 1024 * scale),
+            }
+        assert outputs['to_dict'] == outputs['mapper'], f'{kind}: mapper output differs from to_dict'
+        report[kind] = results
+    print(json.dumps({'rows': args.rows, 'per': '10k rows', 'results': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
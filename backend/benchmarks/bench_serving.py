@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Compare serving modes under many concurrent connections.
+
+Starts the app as a real HTTP server in each mode, then opens --connections
+keep-alive connections (default 500) that issue GET requests back to back
+for --duration seconds, plus --slow-clients connections that trickle their
+request headers one byte at a time. Reports throughput, latency percentiles
+and errors per mode.
+
+Modes:
+  dev       python app.py's development server (app.run)
+  gthread   python serve.py with threaded workers (the production default)
+  sync      python serve.py with single-threaded sync workers
+
+Usage:
+    python benchmarks/bench_serving.py [--modes dev,gthread] [--connections 500]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, percentile
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, port: int, env: dict) -> subprocess.Popen:
+    env = dict(os.environ, **env, PORT=str(port))
+    if mode == 'dev':
+        cmd = [sys.executable, '-c', f"from app import app; app.run(host='127.0.0.1', port={port})"]
+    else:
+        env['SERVE_WORKER_CLASS'] = mode
+        cmd = [sys.executable, 'serve.py']
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def wait_ready(port: int, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as sock:
+                sock.sendall(b'GET /health HTTP/1.1\r\nHost: bench\r\n\r\n')
+                if sock.recv(64).startswith(b'HTTP/1.'):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def read_response(reader) -> int:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('closed')
+    length = 0
+    close = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+        elif name.lower() == 'connection' and value.strip().lower() == 'close':
+            close = True
+    await reader.readexactly(length)
+    return int(status_line.split()[1]), close
+
+
+async def client(port: int, path: str, stop_at: float, latencies: list, errors: list) -> None:
+    request = f'GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n'.encode()
+    reader = writer = None
+    while time.time() < stop_at:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, close = await asyncio.wait_for(read_response(reader), timeout=30)
+            latencies.append(time.perf_counter() - start)
+            if status >= 500:
+                errors.append(status)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+            errors.append(type(exc).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def slow_client(port: int, stop_at: float) -> None:
+    request = b'GET /health HTTP/1.1\r\nHost: bench\r\nX-Padding: ' + b'x' * 64 + b'\r\n\r\n'
+    try:
+        _, writer = await asyncio.open_connection('127.0.0.1', port)
+        for byte in request:
+            if time.time() >= stop_at:
+                break
+            writer.write(bytes([byte]))
+            await writer.drain()
+            await asyncio.sleep(0.5)
+        writer.close()
+    except OSError:
+        pass
+
+
+async def load(port: int, args) -> dict:
+    stop_at = time.time() + args.duration
+    latencies, errors = [], []
+    tasks = [asyncio.create_task(slow_client(port, stop_at)) for _ in range(args.slow_clients)]
+    tasks += [asyncio.create_task(client(port, args.path, stop_at, latencies, errors))
+              for _ in range(args.connections)]
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'errors': len(errors),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='dev,sync,gthread')
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--slow-clients', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--path', default='/events/tiles/0/0/0')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, 4 * args.connections)), hard))
+
+    db_file = tempfile.NamedTemporaryFile(prefix='hopon-serve-', suffix='.db', delete=False).name
+    env = {
+        'DATABASE_URL': f'sqlite:///{db_file}',
+        'WEB_CONCURRENCY': str(args.workers),
+        'SERVE_THREADS': str(args.threads),
+    }
+    results = {}
+    for mode in args.modes.split(','):
+        port = free_port()
+        server = start_server(mode, port, env)
+        try:
+            wait_ready(port)
+            results[mode] = asyncio.run(load(port, args))
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=30)
+    print(json.dumps({'connections': args.connections, 'slow_clients': args.slow_clients,
+                      'path': args.path, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark /events/tiles against sending the full event list to the map.
+
+Seeds N events around a city, builds the tile buckets, and compares the
+latency and payload size of the tiles covering the city at a few zoom
+levels with GET /events. Also times the incremental bucket maintenance
+added to an event insert.
+
+Usage:
+    python benchmarks/bench_tiles.py [--events 10000] [--requests 50]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import make_app, quiet, summarize
+
+CENTER = (40.7128, -74.0060)
+
+
+def seed(app, n_events: int, rng: random.Random) -> None:
+    import tiles
+    from models import db, Event
+
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(Event.__table__.insert(), [
+            {
+                'name': f'Bench {i}', 'sport': rng.choice(['Tennis', 'Basketball', 'Running', 'Soccer']),
+                'location': 'Bench', 'max_players': 10, 'created_at': now,
+                'event_date': now + timedelta(hours=rng.uniform(1, 240)),
+                'latitude': CENTER[0] + rng.gauss(0, 0.08),
+                'longitude': CENTER[1] + rng.gauss(0, 0.08),
+            }
+            for i in range(n_events)
+        ])
+        db.session.commit()
+        tiles.rebuild()
+
+
+def time_path(client, path, n):
+    samples, size = [], 0
+    for _ in range(n):
+        start = time.perf_counter()
+        with quiet():
+            response = client.get(path)
+        samples.append(time.perf_counter() - start)
+        size = len(response.get_data())
+    return {'path': path, 'bytes': size, **summarize(samples)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=10_000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--inserts', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    import tiles
+    from models import db, Event
+
+    rng = random.Random(args.seed)
+    app = make_app(RESPONSE_CACHE_BACKEND='none')
+    seed(app, args.events, rng)
+    client = app.test_client()
+
+    results = []
+    for zoom in (8, 11, 13):
+        x, y = tiles.cell_for(CENTER[0], CENTER[1], zoom)
+        x >>= tiles.CLUSTER_BITS
+        y >>= tiles.CLUSTER_BITS
+        results.append(time_path(client, f'/events/tiles/{zoom}/{x}/{y}', args.requests))
+    results.append(time_path(client, '/events', max(1, args.requests // 10)))
+
+    samples = []
+    with app.app_context():
+        for i in range(args.inserts):
+            event = Event(name=f'Insert {i}', sport='Tennis', location='Bench', max_players=4,
+                          latitude=CENTER[0] + rng.gauss(0, 0.08), longitude=CENTER[1] + rng.gauss(0, 0.08))
+            start = time.perf_counter()
+            db.session.add(event)
+            db.session.commit()
+            samples.append(time.perf_counter() - start)
+    results.append({'path': 'insert event (with bucket upserts)', **summarize(samples)})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
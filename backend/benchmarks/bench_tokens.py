@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Access-token verification cost: full decode vs the verified-token LRU.
+
+1. Verifies the same access tokens repeatedly, the way a polling frontend
+   sends them, with JWT_VERIFY_CACHE_SIZE=0 (a full HS256 decode every time)
+   and with the cache on, and reports verifications/s for each.
+2. Checks that a cached token is rejected once revoked, once expired, and
+   after its signing key is removed from JWT_KEYS.
+
+Exits 1 if a check fails.
+
+Usage:
+    python benchmarks/bench_tokens.py [--tokens 200] [--rounds 50]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from common import make_app, quiet
+
+
+def verifications_per_second(app, tokens, rounds: int) -> float:
+    service = app.extensions['tokens']
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for token in tokens:
+                service.verify(token, 'access')
+        elapsed = time.perf_counter() - start
+    return round(rounds * len(tokens) / elapsed)
+
+
+def checks(app) -> list:
+    from models import db
+
+    service = app.extensions['tokens']
+    failures = []
+    with app.app_context():
+        token = service.generate(1, 'access')
+        service.verify(token, 'access')
+        service.revoke(token)
+        db.session.commit()
+        if service.verify(token, 'access') is not None:
+            failures.append('revoked token still verifies from the cache')
+
+        short = service.generate(1, 'access', expires_in=1)
+        service.verify(short, 'access')
+        time.sleep(2.1)
+        if service.verify(short, 'access') is not None:
+            failures.append('expired token still verifies from the cache')
+
+        before = service.generate(2, 'access')
+        service.revoke_user(2)
+        db.session.commit()
+        if service.verify(before, 'access') is not None:
+            failures.append("user revocation does not reject the user's earlier token")
+        # iat has whole-second precision, so a new token must come a second later.
+        time.sleep(1.1)
+        if service.verify(service.generate(2, 'access'), 'access') is None:
+            failures.append('token issued after a user revocation is rejected')
+    return failures
+
+
+def rotation(url: str) -> list:
+    failures = []
+    with quiet():
+        old = make_app(DATABASE_URL=url, JWT_KEYS='old:first-secret')
+        both = make_app(DATABASE_URL=url, JWT_KEYS='new:second-secret,old:first-secret')
+        new = make_app(DATABASE_URL=url, JWT_KEYS='new:second-secret')
+    token = old.extensions['tokens'].generate(1, 'access')
+    with both.app_context():
+        if both.extensions['tokens'].verify(token, 'access') is None:
+            failures.append('token signed with the previous key is rejected during rotation')
+    with new.app_context():
+        if new.extensions['tokens'].verify(token, 'access') is not None:
+            failures.append('token signed with a removed key still verifies')
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    with quiet():
+        uncached = make_app(JWT_VERIFY_CACHE_SIZE='0')
+        cached = make_app(JWT_VERIFY_CACHE_SIZE='10000')
+    tokens = [uncached.extensions['tokens'].generate(user_id, 'access') for user_id in range(args.tokens)]
+    with quiet():
+        report = {
+            'verifications_per_s': {
+                'decode_every_time': verifications_per_second(uncached, tokens, args.rounds),
+                'lru': verifications_per_second(cached, tokens, args.rounds),
+            },
+        }
+        failures = checks(cached)
+        failures += rotation(cached.config['SQLALCHEMY_DATABASE_URI'])
+    report['token_stats'] = cached.extensions['tokens'].stats()
+    report['failures'] = failures
+    print(json.dumps(report, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
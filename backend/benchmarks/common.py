@@ -0,0 +1,64 @@
+"""Shared helpers for the backend benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database unless BENCH_DATABASE_URL
+is set, and drive the app through the Flask test client so they need no
+running server.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def make_app(**env):
+    """Create a fresh app with the given environment overrides.
+
+    A new temporary SQLite file is used for each call unless DATABASE_URL
+    is passed in or BENCH_DATABASE_URL is set.
+    """
+    if 'DATABASE_URL' not in env:
+        env['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or _temp_sqlite_url()
+    os.environ.update({k: str(v) for k, v in env.items()})
+    with quiet():
+        import app as app_module
+        return app_module.create_app()
+
+
+def _temp_sqlite_url() -> str:
+    fd, path = tempfile.mkstemp(prefix='hopon-bench-', suffix='.db')
+    os.close(fd)
+    return f'sqlite:///{path}'
+
+
+def access_token(app, user_id: int) -> str:
+    """Mint an access token the same way the auth routes do."""
+    return app.extensions['tokens'].generate(user_id, 'access', expires_in=3600)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the app's debug prints so they do not skew timings."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples) -> dict:
+    return {
+        'n': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic data for benchmarks and load tests.
+
+Creates N users and M events clustered around a few cities, participations
+and a follow graph. The same --seed always produces the same rows (only
+timestamps move with the clock, so events stay upcoming). Every user can
+log in with PASSWORD.
+
+    from datagen import generate
+    dataset = generate(app, users=2000, events=5000)
+
+or, to fill the database a local server will use:
+
+    DATABASE_URL=sqlite:////tmp/hopon-load.db python benchmarks/datagen.py --users 2000
+"""
+
+import argparse
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from common import make_app, quiet
+
+PASSWORD = 'load-test-password'
+SPORTS = ['Basketball', 'Tennis', 'Running', 'Soccer', 'Volleyball', 'Badminton', 'Yoga']
+CITIES = [
+    ('Toronto', 43.6532, -79.3832),
+    ('New York', 40.7128, -74.0060),
+    ('Chicago', 41.8781, -87.6298),
+    ('Vancouver', 49.2827, -123.1207),
+]
+# Users and events are spread normally around each city centre (about 8 km).
+SPREAD_DEGREES = 0.08
+
+
+@dataclass
+class Dataset:
+    seed: int
+    user_ids: List[int] = field(default_factory=list)
+    event_ids: List[int] = field(default_factory=list)
+    cities: List[Tuple[str, float, float]] = field(default_factory=lambda: list(CITIES))
+
+    @staticmethod
+    def email(index: int) -> str:
+        """Login email of the index-th generated user (user_ids[index])."""
+        return f'load_user_{index}@example.com'
+
+
+def _point(rng: random.Random, city) -> Tuple[float, float]:
+    _, lat, lng = city
+    return round(lat + rng.gauss(0, SPREAD_DEGREES), 6), round(lng + rng.gauss(0, SPREAD_DEGREES), 6)
+
+
+def generate(app, users: int = 1000, events: int = 2000, follows_per_user: int = 10,
+             joins_per_event: int = 4, seed: int = 7, batch_size: int = 5000) -> Dataset:
+    """Insert a synthetic data set into the app's database and return its ids."""
+    import tiles
+    from models import db, Event, EventParticipant, Follow, User, UserSport, parse_sports
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    # One hash shared by every user: hashing per row would dominate generation.
+    password_hash = generate_password_hash(PASSWORD, app.config['PASSWORD_HASH_METHOD'])
+
+    def insert(table, rows):
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(table.insert(), rows[start:start + batch_size])
+
+    with app.app_context():
+        user_rows, homes = [], []
+        for i in range(users):
+            city = rng.choice(CITIES)
+            lat, lng = _point(rng, city)
+            homes.append(city)
+            user_rows.append({
+                'username': f'load_user_{i}', 'email': f'load_user_{i}@example.com',
+                'password_hash': password_hash, 'bio': f'Synthetic user {i}',
+                'location': city[0], 'latitude': lat, 'longitude': lng,
+                'rating': round(rng.uniform(3.0, 5.0), 1),
+                'sports': ', '.join(rng.sample(SPORTS, rng.randint(1, 3))),
+                'created_at': now - timedelta(days=rng.uniform(0, 365)),
+            })
+        insert(User.__table__, user_rows)
+        user_ids = [row[0] for row in db.session.execute(
+            db.select(User.id).where(User.username.like('load_user_%')).order_by(User.id)
+        )]
+        insert(UserSport.__table__, [
+            {'user_id': user_id, 'sport': sport}
+            for user_id, row in zip(user_ids, user_rows)
+            for sport in parse_sports(row['sports'])
+        ])
+
+        event_rows = []
+        for i in range(events):
+            city = rng.choice(CITIES)
+            lat, lng = _point(rng, city)
+            host_index = rng.randrange(users)
+            event_rows.append({
+                'name': f'Load event {i}', 'sport': rng.choice(SPORTS), 'location': city[0],
+                'max_players': rng.choice([4, 8, 10, 12, 22]), 'host_user_id': user_ids[host_index],
+                'latitude': lat, 'longitude': lng,
+                'created_at': now - timedelta(hours=rng.uniform(0, 96)),
+                'event_date': now + timedelta(hours=rng.uniform(1, 24 * 21)),
+            })
+        insert(Event.__table__, event_rows)
+        event_ids = [row[0] for row in db.session.execute(
+            db.select(Event.id).where(Event.name.like('Load event %')).order_by(Event.id)
+        )]
+
+        participant_rows = []
+        for event_id, row in zip(event_ids, event_rows):
+            players = rng.sample(range(users), min(users, joins_per_event, row['max_players'] - 1))
+            for n, index in enumerate(players):
+                participant_rows.append({
+                    'event_id': event_id, 'user_id': user_ids[index], 'player_name': f'load_user_{index}',
+                    'team': 'team_a' if n % 2 == 0 else 'team_b',
+                    'joined_at': row['created_at'] + timedelta(minutes=rng.uniform(1, 600)),
+                })
+        insert(EventParticipant.__table__, participant_rows)
+
+        follow_rows = set()
+        for i in range(users):
+            # Mostly follow people from the same city, as real graphs cluster.
+            for j in rng.sample(range(users), min(users, follows_per_user)):
+                if j != i and (homes[j] == homes[i] or rng.random() < 0.2):
+                    follow_rows.add((user_ids[i], user_ids[j]))
+        insert(Follow.__table__, [
+            {'follower_id': a, 'followee_id': b, 'created_at': now} for a, b in sorted(follow_rows)
+        ])
+        db.session.commit()
+        tiles.rebuild()
+
+    return Dataset(seed=seed, user_ids=user_ids, event_ids=event_ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--follows', type=int, default=10)
+    parser.add_argument('--joins', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('set DATABASE_URL to the database to fill')
+    app = make_app(DATABASE_URL=os.environ['DATABASE_URL'])
+    with quiet():
+        dataset = generate(app, args.users, args.events, args.follows, args.joins, args.seed)
+    print(json.dumps({'users': len(dataset.user_ids), 'events': len(dataset.event_ids), 'seed': args.seed}))
+
+
+if __name__ == '__main__':
+    main()
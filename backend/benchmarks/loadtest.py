@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Scripted traffic mixes against the whole API, with a saved baseline.
+
+Generates a synthetic data set (see datagen.py), replays a traffic mix and
+reports p50/p95/p99 latency, status codes and SQL queries per request for
+each route. Mixes:
+
+  discover  polling of the event list, nearby search, map tiles, event and
+            profile pages and the feed, by anonymous and signed-in users
+  rush      an event rush: joins/leaves and logins on top of discovery
+  profile   profile edits plus discovery
+  mixed     all of the above (the default)
+
+Targets:
+  (default)     the Flask test client in this process; counts queries
+  --url URL     a running server (e.g. python serve.py) with --concurrency
+                client threads. The server must use the database filled by
+                datagen.py (pass the same DATABASE_URL here, so ids can be
+                looked up) and RATE_LIMIT_ENABLED=false. Queries are not
+                counted.
+
+Baselines:
+    python benchmarks/loadtest.py --save-baseline benchmarks/baseline.json
+    python benchmarks/loadtest.py --baseline benchmarks/baseline.json
+
+compares against a saved run and exits 1 when a route's queries/request
+grew, or its p95 grew by more than --tolerance (and --min-delta-ms).
+Latency depends on the machine, so compare timings against a baseline saved
+on the same machine; query counts are comparable anywhere.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from common import access_token, make_app, quiet, summarize
+from datagen import PASSWORD, SPREAD_DEGREES, Dataset, generate
+
+TILE_ZOOM = 11
+
+
+class Traffic:
+    """Builds requests for one simulated client."""
+
+    def __init__(self, dataset: Dataset, tokens: dict, rng: random.Random):
+        self.dataset = dataset
+        self.tokens = tokens
+        self.rng = rng
+        self.joined = []
+
+    def _user(self):
+        index = self.rng.randrange(len(self.dataset.user_ids))
+        return index, self.dataset.user_ids[index]
+
+    def _auth(self, user_id):
+        return {'Authorization': f'Bearer {self.tokens[user_id]}'}
+
+    def _maybe_auth(self):
+        return self._auth(self._user()[1]) if self.rng.random() < 0.5 else {}
+
+    def _near(self):
+        _, lat, lng = self.rng.choice(self.dataset.cities)
+        return (round(lat + self.rng.gauss(0, SPREAD_DEGREES), 5),
+                round(lng + self.rng.gauss(0, SPREAD_DEGREES), 5))
+
+    # Each operation returns (label, method, path, json body, headers).
+
+    def list_events(self):
+        return 'GET /events', 'GET', '/events', None, self._maybe_auth()
+
+    def nearby_events(self):
+        lat, lng = self._near()
+        return ('GET /events/nearby', 'GET', '/events/nearby?' + urlencode({'lat': lat, 'lng': lng}),
+                None, self._maybe_auth())
+
+    def event_tile(self):
+        import tiles
+
+        lat, lng = self._near()
+        x, y = tiles.cell_for(lat, lng, TILE_ZOOM)
+        path = f'/events/tiles/{TILE_ZOOM}/{x >> tiles.CLUSTER_BITS}/{y >> tiles.CLUSTER_BITS}'
+        return 'GET /events/tiles/<z>/<x>/<y>', 'GET', path, None, {}
+
+    def event_detail(self):
+        event_id = self.rng.choice(self.dataset.event_ids)
+        return 'GET /events/<id>', 'GET', f'/events/{event_id}', None, self._maybe_auth()
+
+    def event_participants(self):
+        event_id = self.rng.choice(self.dataset.event_ids)
+        return 'GET /events/<id>/participants', 'GET', f'/events/{event_id}/participants', None, {}
+
+    def user_profile(self):
+        return 'GET /users/<id>', 'GET', f'/users/{self._user()[1]}', None, self._maybe_auth()
+
+    def feed(self):
+        return 'GET /feed', 'GET', '/feed', None, self._auth(self._user()[1])
+
+    def join(self):
+        if self.joined and self.rng.random() < 0.5:
+            event_id, user_id = self.joined.pop(self.rng.randrange(len(self.joined)))
+            return 'POST /events/<id>/leave', 'POST', f'/events/{event_id}/leave', {}, self._auth(user_id)
+        event_id = self.rng.choice(self.dataset.event_ids)
+        user_id = self._user()[1]
+        self.joined.append((event_id, user_id))
+        return 'POST /events/<id>/join', 'POST', f'/events/{event_id}/join', {}, self._auth(user_id)
+
+    def edit_profile(self):
+        body = {'bio': f'Updated bio {self.rng.randrange(10 ** 6)}',
+                'sports': self.rng.sample(['Basketball', 'Tennis', 'Running', 'Soccer'], 2)}
+        return 'PATCH /auth/profile', 'PATCH', '/auth/profile', body, self._auth(self._user()[1])
+
+    def login(self):
+        body = {'email': Dataset.email(self._user()[0]), 'password': PASSWORD}
+        return 'POST /auth/login', 'POST', '/auth/login', body, {}
+
+
+DISCOVER = [
+    (25, Traffic.list_events), (20, Traffic.nearby_events), (20, Traffic.event_tile),
+    (15, Traffic.event_detail), (8, Traffic.event_participants), (7, Traffic.user_profile), (5, Traffic.feed),
+]
+MIXES = {
+    'discover': DISCOVER,
+    'rush': [(weight // 2, op) for weight, op in DISCOVER] + [(35, Traffic.join), (15, Traffic.login)],
+    'profile': [(weight // 2, op) for weight, op in DISCOVER] + [(50, Traffic.edit_profile)],
+    'mixed': DISCOVER + [(15, Traffic.join), (8, Traffic.edit_profile), (5, Traffic.login)],
+}
+
+
+def choose(mix, traffic: Traffic):
+    ops, weights = zip(*[(op, weight) for weight, op in MIXES[mix]])
+    return traffic.rng.choices(ops, weights)[0](traffic)
+
+
+def load_dataset(app, seed: int) -> Dataset:
+    """Look up the ids of a data set generated earlier into app's database."""
+    from models import db, Event, User
+
+    with app.app_context():
+        user_ids = [row[0] for row in db.session.execute(
+            db.select(User.id).where(User.username.like('load_user_%')).order_by(User.id))]
+        event_ids = [row[0] for row in db.session.execute(
+            db.select(Event.id).where(Event.name.like('Load event %')).order_by(Event.id))]
+    if not user_ids or not event_ids:
+        raise SystemExit('No generated data found; run benchmarks/datagen.py against this database first')
+    return Dataset(seed=seed, user_ids=user_ids, event_ids=event_ids)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def add(self, label, elapsed, status, queries=None):
+        with self.lock:
+            self.latencies[label].append(elapsed)
+            self.statuses[label][str(status)] += 1
+            if queries is not None:
+                self.queries[label].append(queries)
+
+    def routes(self) -> dict:
+        out = {}
+        for label in sorted(self.latencies):
+            counts = self.queries.get(label)
+            out[label] = {
+                **summarize(self.latencies[label]),
+                'queries_per_request': round(sum(counts) / len(counts), 2) if counts else None,
+                'statuses': dict(self.statuses[label]),
+            }
+        return out
+
+
+def run_client(app, mix, dataset, tokens, args) -> Recorder:
+    """Replay the mix through the Flask test client, counting SQL statements."""
+    from sqlalchemy import event
+    from models import db
+
+    counter = [0]
+
+    def count(*_):
+        counter[0] += 1
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+
+    client = app.test_client()
+    traffic = Traffic(dataset, tokens, random.Random(args.seed))
+    recorder = Recorder()
+    try:
+        with quiet():
+            for i in range(args.warmup + args.requests):
+                label, method, path, body, headers = choose(mix, traffic)
+                before = counter[0]
+                start = time.perf_counter()
+                response = client.open(path, method=method, json=body, headers=headers)
+                elapsed = time.perf_counter() - start
+                if i >= args.warmup:
+                    recorder.add(label, elapsed, response.status_code, counter[0] - before)
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+    return recorder
+
+
+def run_http(url, mix, dataset, tokens, args) -> Recorder:
+    """Replay the mix against a running server from --concurrency threads."""
+    target = urlsplit(url)
+    recorder = Recorder()
+    per_thread = max(1, args.requests // args.concurrency)
+
+    def worker(n):
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+        traffic = Traffic(dataset, tokens, random.Random(args.seed * 1000 + n))
+        for i in range(args.warmup // args.concurrency + per_thread):
+            label, method, path, body, headers = choose(mix, traffic)
+            headers = dict(headers, **({'Content-Type': 'application/json'} if body is not None else {}))
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+                status = 'error'
+            if i >= args.warmup // args.concurrency:
+                recorder.add(label, time.perf_counter() - start, status)
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """Regressions of results against a saved baseline, as readable strings."""
+    regressions = []
+    for mix, current in results['mixes'].items():
+        previous = baseline.get('mixes', {}).get(mix)
+        if not previous:
+            continue
+        for label, stats in current['routes'].items():
+            old = previous['routes'].get(label)
+            if not old:
+                continue
+            new_q, old_q = stats.get('queries_per_request'), old.get('queries_per_request')
+            if new_q is not None and old_q is not None and new_q > old_q + 0.5:
+                regressions.append(f'{mix} {label}: queries/request {old_q} -> {new_q}')
+            delta = stats['p95_ms'] - old['p95_ms']
+            if delta > min_delta_ms and stats['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{mix} {label}: p95 {old['p95_ms']}ms -> {stats['p95_ms']}ms")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mixes', default='mixed', help=f"comma-separated, from {', '.join(MIXES)}")
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--follows', type=int, default=10)
+    parser.add_argument('--joins', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--url', help='load a running server instead of the test client')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads with --url')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--baseline', metavar='PATH', help='compare against a saved run')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed relative p95 growth')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='ignore smaller p95 changes')
+    args = parser.parse_args()
+
+    for mix in args.mixes.split(','):
+        if mix not in MIXES:
+            parser.error(f"unknown mix '{mix}'")
+    if args.url and not os.environ.get('DATABASE_URL'):
+        parser.error("--url needs DATABASE_URL set to the server's database")
+
+    results = {
+        'params': {key: getattr(args, key) for key in ('users', 'events', 'follows', 'joins', 'requests', 'seed')},
+        'target': args.url or 'test-client',
+        'mixes': {},
+    }
+    for mix in args.mixes.split(','):
+        if args.url:
+            app = make_app(DATABASE_URL=os.environ['DATABASE_URL'])
+            dataset = load_dataset(app, args.seed)
+        else:
+            # A fresh database per mix, so one mix's writes do not skew the next.
+            app = make_app(RATE_LIMIT_ENABLED='false')
+            with quiet():
+                dataset = generate(app, args.users, args.events, args.follows, args.joins, args.seed)
+        tokens = {user_id: access_token(app, user_id) for user_id in dataset.user_ids}
+        started = time.perf_counter()
+        if args.url:
+            recorder = run_http(args.url, mix, dataset, tokens, args)
+        else:
+            recorder = run_client(app, mix, dataset, tokens, args)
+        elapsed = time.perf_counter() - started
+        total = sum(len(samples) for samples in recorder.latencies.values())
+        results['mixes'][mix] = {'requests_per_second': round(total / elapsed, 1), 'routes': recorder.routes()}
+
+    print(json.dumps(results, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Concurrency check for waitlist promotion: no spot is lost or double-assigned.
+
+Creates a few small events, then runs worker threads that join (with
+"waitlist": true) and leave them at random while a host thread keeps
+raising max_players. Each player belongs to one worker, so a player's own
+actions are sequential while different players race. Afterwards it drains
+the promotion notifications with a burst worker and checks, per event:
+
+- participants never exceed max_players and nobody holds two spots;
+- nobody is both a participant and on the waitlist;
+- a non-empty waitlist means the event is full (no spot left unfilled);
+- each player's final state matches their last answered request (joined
+  or waitlisted -> participant or waitlisted, left -> neither);
+- exactly one notification job exists per promotion, and all of them ran.
+
+Exits 1 if any check fails. Requests that fail with a 5xx (e.g. SQLite
+giving up on a busy lock) are counted and reported; they must not break
+the invariants either.
+
+Usage:
+    python benchmarks/stress_waitlist.py [--players 60] [--events 3] [--capacity 4] [--workers 8] [--ops 150]
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+from collections import Counter
+
+from sqlalchemy import event as sa_event
+
+from common import access_token, make_app, quiet
+from datagen import generate
+
+
+def create_events(app, host_token: str, count: int, capacity: int):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {host_token}'}
+    event_ids = []
+    for i in range(count):
+        response = client.post('/events', headers=headers, json={
+            'name': f'Waitlist stress {i}', 'sport': 'Soccer', 'location': 'Test field',
+            'max_players': capacity,
+        })
+        event_ids.append(response.get_json()['event']['id'])
+    return event_ids
+
+
+def player_worker(app, players, tokens, event_ids, ops: int, seed: int, last_state: dict, statuses: Counter,
+                  lock: threading.Lock):
+    rng = random.Random(seed)
+    client = app.test_client()
+    for _ in range(ops):
+        user_id = rng.choice(players)
+        event_id = rng.choice(event_ids)
+        headers = {'Authorization': f'Bearer {tokens[user_id]}'}
+        if rng.random() < 0.6:
+            action = 'join'
+            response = client.post(f'/events/{event_id}/join', headers=headers, json={'waitlist': True})
+            state = 'in' if response.status_code in (200, 202) else None
+        else:
+            action = 'leave'
+            response = client.post(f'/events/{event_id}/leave', headers=headers, json={})
+            state = 'out' if response.status_code == 200 else None
+        with lock:
+            statuses[f'{action}:{response.status_code}'] += 1
+            if state is not None:
+                last_state[(event_id, user_id)] = state
+
+
+def host_worker(app, host_token: str, event_ids, raises: int, seed: int, statuses: Counter, lock: threading.Lock):
+    rng = random.Random(seed)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {host_token}'}
+    for _ in range(raises):
+        event_id = rng.choice(event_ids)
+        current = client.get(f'/events/{event_id}').get_json()['max_players']
+        response = client.patch(f'/events/{event_id}', headers=headers, json={'max_players': current + 1})
+        with lock:
+            statuses[f'raise:{response.status_code}'] += 1
+
+
+def count_promotions(app, promoted: Counter, lock: threading.Lock) -> None:
+    """Wrap waitlist.promote so committed promotions can be compared with notification jobs."""
+    import waitlist
+    from models import db
+
+    original = waitlist.promote
+
+    def promote(event_id):
+        user_ids = original(event_id)
+        info = db.session.info
+        info['promoted'] = info.get('promoted', 0) + sum(1 for user_id in user_ids if user_id is not None)
+        return user_ids
+
+    def committed(session):
+        with lock:
+            promoted['users'] += session.info.pop('promoted', 0)
+
+    def rolled_back(session):
+        session.info.pop('promoted', None)
+
+    with app.app_context():
+        # Only promotions whose transaction commits are counted.
+        sa_event.listen(db.session.session_factory, 'after_commit', committed)
+        sa_event.listen(db.session.session_factory, 'after_rollback', rolled_back)
+    waitlist.promote = promote
+
+
+def check(app, event_ids, last_state: dict, promoted: Counter):
+    from sqlalchemy import func, select
+
+    import jobs
+    from models import db, Event, EventParticipant, Job, WaitlistEntry
+
+    failures = []
+    with app.app_context():
+        with quiet():
+            jobs.Worker(app, concurrency=2, poll_interval=0.05).run(burst=True)
+        for event_id in event_ids:
+            max_players = db.session.get(Event, event_id).max_players
+            participants = db.session.execute(
+                select(EventParticipant.user_id).where(EventParticipant.event_id == event_id)
+            ).scalars().all()
+            waiting = db.session.execute(
+                select(WaitlistEntry.user_id).where(WaitlistEntry.event_id == event_id)
+            ).scalars().all()
+            if len(participants) > max_players:
+                failures.append(f'event {event_id}: {len(participants)} participants for {max_players} spots')
+            duplicates = [uid for uid, n in Counter(participants + waiting).items() if n > 1]
+            if duplicates:
+                failures.append(f'event {event_id}: users holding more than one spot or entry: {duplicates}')
+            if waiting and len(participants) < max_players:
+                failures.append(f'event {event_id}: {max_players - len(participants)} free spots '
+                                f'with {len(waiting)} players waiting')
+            present = set(participants) | set(waiting)
+            for (e_id, user_id), state in last_state.items():
+                if e_id != event_id:
+                    continue
+                if state == 'in' and user_id not in present:
+                    failures.append(f'event {event_id}: user {user_id} joined but holds no spot or entry')
+                if state == 'out' and user_id in present:
+                    failures.append(f'event {event_id}: user {user_id} left but still holds a spot or entry')
+
+        notifications = db.session.execute(
+            select(Job.status, func.count(Job.id))
+            .where(Job.name == 'notify_waitlist_promotion')
+            .group_by(Job.status)
+        ).all()
+        by_status = dict(notifications)
+        if set(by_status) - {'done'}:
+            failures.append(f'promotion notifications not all delivered: {by_status}')
+        if sum(by_status.values()) != promoted['users']:
+            failures.append(f"{sum(by_status.values())} notifications for {promoted['users']} promotions")
+        remaining = db.session.execute(select(func.count(WaitlistEntry.id))).scalar()
+    return failures, by_status, remaining
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=60)
+    parser.add_argument('--events', type=int, default=3)
+    parser.add_argument('--capacity', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=150, help='Requests per player worker.')
+    parser.add_argument('--raises', type=int, default=15, help='max_players increases by the host.')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    app = make_app(RATE_LIMIT_ENABLED='false')
+    with quiet():
+        dataset = generate(app, users=args.players + 1, events=0, follows_per_user=0, joins_per_event=0,
+                           seed=args.seed)
+    host_id, players = dataset.user_ids[0], dataset.user_ids[1:]
+    tokens = {user_id: access_token(app, user_id) for user_id in dataset.user_ids}
+    with quiet():
+        event_ids = create_events(app, tokens[host_id], args.events, args.capacity)
+
+    # Players are dealt to workers so each player's requests stay in order.
+    slices = [players[i::args.workers] for i in range(args.workers)]
+    last_state: dict = {}
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    promoted: Counter = Counter()
+    count_promotions(app, promoted, lock)
+    threads = [
+        threading.Thread(target=player_worker, args=(app, chunk, tokens, event_ids, args.ops, args.seed + i,
+                                                     last_state, statuses, lock))
+        for i, chunk in enumerate(slices) if chunk
+    ]
+    threads.append(threading.Thread(target=host_worker, args=(app, tokens[host_id], event_ids, args.raises,
+                                                              args.seed, statuses, lock)))
+    with quiet():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    failures, notifications, remaining = check(app, event_ids, last_state, promoted)
+    print(json.dumps({
+        'requests': dict(sorted(statuses.items())),
+        'promotions': promoted['users'],
+        'promotion_notifications': notifications,
+        'still_waiting': remaining,
+        'failures': failures,
+    }, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
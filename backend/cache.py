@@ -0,0 +1,284 @@
+"""Response cache for hot anonymous reads.
+
+Views opt in with a decorator naming the tags their response depends on:
+
+    @bp.get('/events/nearby')
+    @cached('events', quantize=('lat', 'lng'))
+    def nearby_events():
+        ...
+
+(``cached`` uses the app's ``ResponseCache``; ``response_cache.cached``
+binds one instance directly.)
+
+Only anonymous GET requests with a 200 response are cached (any GET for
+views marked ``public``). Arguments listed in ``quantize`` are snapped to
+the centre of a ``RESPONSE_CACHE_GRID_DEGREES`` cell before the view runs,
+so every visitor in the same cell shares one entry (and gets the same
+distances).
+
+Invalidation is by tag version: each tag has a counter that is part of the
+cache key, and bumping it orphans every entry built under the old value
+(they age out of the LRU or expire). The event mutation signals bump the
+``events`` tag.
+
+Backends:
+
+- ``memory``: per-process LRU with a TTL. Invalidations only reach the
+  process that handled the mutation; other workers serve entries until the
+  TTL expires.
+- ``redis``: shared by every worker (``pip install redis``), so one
+  invalidation is seen everywhere. Set ``RESPONSE_CACHE_URL``.
+- ``none``: disabled.
+"""
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import current_app, g, make_response, request
+from werkzeug.datastructures import ImmutableMultiDict
+
+import signals
+
+CACHE_BACKENDS = ('memory', 'redis', 'none')
+
+# (body, status, content type, Cache-Control header or '')
+Entry = Tuple[bytes, int, str, str]
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, Tuple[float, Entry]]" = OrderedDict()
+        self._tags: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Entry, ttl: float) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, entry)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def tag_version(self, tag: str) -> int:
+        return self._tags.get(tag, 0)
+
+    def bump_tag(self, tag: str) -> None:
+        with self._lock:
+            self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def size(self) -> int:
+        return len(self._items)
+
+
+class RedisBackend:
+    """Shared backend; entries are stored with a Redis TTL."""
+
+    def __init__(self, url: str, prefix: str = 'hopon:cache:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package") from e
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Entry]:
+        values = self.client.hmget(self.prefix + key, 'body', 'status', 'type', 'cache_control')
+        if values[0] is None:
+            return None
+        return values[0], int(values[1]), values[2].decode(), (values[3] or b'').decode()
+
+    def set(self, key: str, entry: Entry, ttl: float) -> None:
+        body, status, content_type, cache_control = entry
+        name = self.prefix + key
+        pipe = self.client.pipeline()
+        pipe.hset(name, mapping={'body': body, 'status': status, 'type': content_type,
+                                 'cache_control': cache_control})
+        pipe.pexpire(name, int(ttl * 1000))
+        pipe.execute()
+
+    def tag_version(self, tag: str) -> int:
+        return int(self.client.get(f"{self.prefix}tag:{tag}") or 0)
+
+    def bump_tag(self, tag: str) -> None:
+        self.client.incr(f"{self.prefix}tag:{tag}")
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class ResponseCache:
+    """Caches anonymous GET responses keyed by path, arguments and tag versions."""
+
+    def __init__(self, backend: str = 'memory', url: Optional[str] = None, ttl: float = 30.0,
+                 max_entries: int = 1000, grid_degrees: float = 0.01):
+        if backend not in CACHE_BACKENDS:
+            raise ValueError(f"RESPONSE_CACHE_BACKEND must be one of {CACHE_BACKENDS}, got '{backend}'")
+        self.backend_name = backend
+        self.ttl = ttl
+        self.grid_degrees = grid_degrees
+        if backend == 'memory':
+            self.backend = MemoryBackend(max_entries=max_entries)
+        elif backend == 'redis':
+            self.backend = RedisBackend(url or 'redis://localhost:6379/0')
+        else:
+            self.backend = None
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'ResponseCache':
+        return cls(
+            backend=config['RESPONSE_CACHE_BACKEND'],
+            url=config['RESPONSE_CACHE_URL'],
+            ttl=config['RESPONSE_CACHE_TTL'],
+            max_entries=config['RESPONSE_CACHE_SIZE'],
+            grid_degrees=config['RESPONSE_CACHE_GRID_DEGREES'],
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def init_app(self, app) -> None:
+        app.extensions['response_cache'] = self
+        if not self.enabled:
+            return
+        for signal in (signals.event_created, signals.event_updated, signals.event_deleted,
+                       signals.participant_joined, signals.participant_left):
+            signal.connect(self._on_event_changed, sender=app, weak=False)
+
+    def _on_event_changed(self, sender, **kwargs):
+        self.invalidate('events')
+
+    # Keys
+
+    def snap(self, value: float) -> float:
+        """Centre of the grid cell containing `value`."""
+        cell = math.floor(value / self.grid_degrees)
+        return round((cell + 0.5) * self.grid_degrees, 6)
+
+    def _quantized_args(self, quantize: Iterable[str]) -> ImmutableMultiDict:
+        items = []
+        for name, value in request.args.items(multi=True):
+            if name in quantize:
+                try:
+                    value = repr(self.snap(float(value)))
+                except (ValueError, OverflowError):
+                    # Not a finite number: left as sent, for the view to reject.
+                    pass
+            items.append((name, value))
+        return ImmutableMultiDict(items)
+
+    def _key(self, args: ImmutableMultiDict, tags: Tuple[str, ...]) -> str:
+        query = '&'.join(f"{k}={v}" for k, v in sorted(args.items(multi=True)))
+        versions = ','.join(f"{tag}:{self.backend.tag_version(tag)}" for tag in tags)
+        return f"{request.path}?{query}#{versions}"
+
+    # Invalidation
+
+    def invalidate(self, *tags: str) -> None:
+        if not self.enabled:
+            return
+        for tag in tags:
+            self.backend.bump_tag(tag)
+        with self._lock:
+            self._invalidations += 1
+
+    # Decorator
+
+    def cached(self, *tags: str, quantize: Tuple[str, ...] = (), public: bool = False):
+        """Cache a view's anonymous responses under `tags`.
+
+        With `public`, responses are shared by authenticated callers too
+        (for views whose output does not depend on the caller).
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                return self.serve(view, args, kwargs, tags, quantize, public)
+            return wrapper
+        return decorator
+
+    def serve(self, view, args, kwargs, tags: Tuple[str, ...], quantize: Tuple[str, ...], public: bool):
+        """Answer the current request from the cache, or run `view` and store its response."""
+        anonymous = g.get('current_user') is None and 'Authorization' not in request.headers
+        if not self.enabled or request.method != 'GET' or not (public or anonymous):
+            return view(*args, **kwargs)
+        if quantize:
+            # The view sees the snapped coordinates, so the cached
+            # body is valid for the whole cell.
+            request.args = self._quantized_args(quantize)
+        key = self._key(request.args, tags)
+        entry = self.backend.get(key)
+        if entry is not None:
+            self._count(request.endpoint, 'hits')
+            body, status, content_type, cache_control = entry
+            response = make_response(body, status)
+            response.content_type = content_type
+            if cache_control:
+                response.headers['Cache-Control'] = cache_control
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        self._count(request.endpoint, 'misses')
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            entry = (response.get_data(), response.status_code, response.content_type,
+                     response.headers.get('Cache-Control', ''))
+            self.backend.set(key, entry, self.ttl)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+    # Stats
+
+    def _count(self, endpoint: str, field: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            counters[field] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            endpoints = {name: dict(c) for name, c in self._stats.items()}
+            invalidations = self._invalidations
+        for counters in endpoints.values():
+            total = counters['hits'] + counters['misses']
+            counters['hit_ratio'] = round(counters['hits'] / total, 4) if total else 0.0
+        hits = sum(c['hits'] for c in endpoints.values())
+        total = hits + sum(c['misses'] for c in endpoints.values())
+        return {
+            'backend': self.backend_name,
+            'entries': self.backend.size() if self.enabled else 0,
+            'hits': hits,
+            'misses': total - hits,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'invalidations': invalidations,
+            'endpoints': endpoints,
+        }
+
+
+def cached(*tags: str, quantize: Tuple[str, ...] = (), public: bool = False):
+    """``ResponseCache.cached`` for blueprint views, using the current app's cache."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions['response_cache']
+            return cache.serve(view, args, kwargs, tags, quantize, public)
+        return wrapper
+    return decorator
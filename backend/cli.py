@@ -0,0 +1,31 @@
+"""``hopon`` console script: the app's Flask CLI without ``--app``.
+
+    hopon snapshot export ./snap      # same as: flask --app app snapshot export ./snap
+    hopon jobs work --concurrency 4
+
+Every command group registered on the app (``jobs``, ``outbox``,
+``tiles``, ``snapshot``) is available. The target database comes from
+``DATABASE_URL`` as for the server. Unlike the server, the CLI does not
+insert the demo seed data unless ``SEED_DATA=true`` is set, so a fresh
+target for ``snapshot import`` stays empty.
+"""
+import os
+
+from flask.cli import FlaskGroup
+
+
+def _load_app():
+    os.environ.setdefault('SEED_DATA', 'false')
+    from app import app
+    return app
+
+
+cli = FlaskGroup(name='hopon', create_app=_load_app, help='HopOn management commands.')
+
+
+def main() -> None:
+    cli()
+
+
+if __name__ == '__main__':
+    main()
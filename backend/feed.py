@@ -0,0 +1,248 @@
+"""Friends' events feed built over the follow graph.
+
+The feed for a user is the set of upcoming events hosted or joined by the
+people they follow. Each entry is keyed by event id and remembers the time
+of the most recent friend activity on it (hosting or joining), which is
+what the recency part of the ranking uses.
+
+Two strategies are supported, selected with ``FEED_STRATEGY``:
+
+- ``read`` (fan-in on read): a feed is built from the database the first
+  time it is requested and cached. Any activity by someone a user follows
+  simply drops that user's cached feed so it is rebuilt on the next read.
+- ``write`` (fan-out on write): activity is pushed into the cached feeds of
+  every follower of the actor, so cached feeds stay warm. Feeds that are
+  not cached are built on first read exactly like the ``read`` strategy.
+
+Caches are per process and bounded both in number of users and entries per
+user; ``FEED_CACHE_TTL`` bounds how stale a feed can get when a mutation
+lands on another worker.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, or_, select
+
+import signals
+from geo import haversine_km
+from models import db, Event, EventParticipant, Follow
+from serializers import EVENTS
+
+FEED_STRATEGIES = ('read', 'write')
+
+# Ranking knobs: activity loses half its recency weight every
+# RECENCY_HALF_LIFE_HOURS, and proximity halves at DISTANCE_SCALE_KM.
+RECENCY_HALF_LIFE_HOURS = 24.0
+DISTANCE_SCALE_KM = 10.0
+RECENCY_WEIGHT = 0.5
+DISTANCE_WEIGHT = 0.5
+
+
+class FeedCache:
+    """Thread-safe LRU of user id -> {event_id: activity datetime}."""
+
+    def __init__(self, max_users: int = 1000, max_items: int = 200, ttl: float = 60.0):
+        self.max_users = max_users
+        self.max_items = max_items
+        self.ttl = ttl
+        self._feeds: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Dict[int, datetime]]:
+        with self._lock:
+            item = self._feeds.get(user_id)
+            if item is None:
+                return None
+            stored_at, entries = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._feeds[user_id]
+                return None
+            self._feeds.move_to_end(user_id)
+            return dict(entries)
+
+    def put(self, user_id: int, entries: Dict[int, datetime]) -> None:
+        with self._lock:
+            self._feeds[user_id] = (time.monotonic(), self._trim(entries))
+            self._feeds.move_to_end(user_id)
+            while len(self._feeds) > self.max_users:
+                self._feeds.popitem(last=False)
+
+    def push(self, user_id: int, event_id: int, activity_at: datetime) -> None:
+        """Add an entry to a cached feed. Feeds that are not cached are left alone."""
+        with self._lock:
+            item = self._feeds.get(user_id)
+            if item is None:
+                return
+            stored_at, entries = item
+            previous = entries.get(event_id)
+            if previous is None or previous < activity_at:
+                entries[event_id] = activity_at
+            if len(entries) > self.max_items:
+                self._feeds[user_id] = (stored_at, self._trim(entries))
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._feeds.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._feeds.clear()
+
+    def _trim(self, entries: Dict[int, datetime]) -> Dict[int, datetime]:
+        if len(entries) <= self.max_items:
+            return dict(entries)
+        newest = sorted(entries.items(), key=lambda kv: kv[1], reverse=True)[:self.max_items]
+        return dict(newest)
+
+
+class FeedService:
+    """Builds, caches and ranks friends' event feeds."""
+
+    def __init__(self, strategy: str = 'read', max_users: int = 1000,
+                 max_items: int = 200, ttl: float = 60.0):
+        if strategy not in FEED_STRATEGIES:
+            raise ValueError(f"Unknown feed strategy '{strategy}'. Expected one of {FEED_STRATEGIES}")
+        self.strategy = strategy
+        self.cache = FeedCache(max_users=max_users, max_items=max_items, ttl=ttl)
+
+    @classmethod
+    def from_config(cls, config) -> 'FeedService':
+        return cls(
+            strategy=config['FEED_STRATEGY'],
+            max_users=config['FEED_CACHE_USERS'],
+            max_items=config['FEED_CACHE_ITEMS'],
+            ttl=config['FEED_CACHE_TTL'],
+        )
+
+    def init_app(self, app) -> None:
+        app.extensions['feed'] = self
+        signals.event_created.connect(self._on_event_created, sender=app, weak=False)
+        signals.participant_joined.connect(self._on_participant_joined, sender=app, weak=False)
+        signals.participant_left.connect(self._on_participant_left, sender=app, weak=False)
+        signals.user_followed.connect(self._on_follow_changed, sender=app, weak=False)
+        signals.user_unfollowed.connect(self._on_follow_changed, sender=app, weak=False)
+        signals.user_deleted.connect(self._on_user_deleted, sender=app, weak=False)
+
+    # Building
+
+    def build(self, user_id: int) -> Dict[int, datetime]:
+        """Fan-in: collect upcoming events hosted or joined by followees."""
+        now = datetime.utcnow()
+        followees = select(Follow.followee_id).where(Follow.follower_id == user_id).scalar_subquery()
+
+        hosted = db.session.execute(
+            select(Event.id, Event.created_at)
+            .where(Event.host_user_id.in_(followees))
+            .where(Event.host_user_id != user_id)
+            .where(Event.event_date >= now)
+        ).all()
+        joined = db.session.execute(
+            select(EventParticipant.event_id, func.max(EventParticipant.joined_at))
+            .join(Event, Event.id == EventParticipant.event_id)
+            .where(EventParticipant.user_id.in_(followees))
+            .where(or_(Event.host_user_id.is_(None), Event.host_user_id != user_id))
+            .where(Event.event_date >= now)
+            .group_by(EventParticipant.event_id)
+        ).all()
+
+        entries: Dict[int, datetime] = {}
+        for event_id, activity_at in list(hosted) + list(joined):
+            activity_at = activity_at or now
+            if event_id not in entries or entries[event_id] < activity_at:
+                entries[event_id] = activity_at
+        return entries
+
+    def entries_for(self, user_id: int) -> Dict[int, datetime]:
+        entries = self.cache.get(user_id)
+        if entries is None:
+            entries = self.build(user_id)
+            self.cache.put(user_id, entries)
+        return entries
+
+    # Reading
+
+    def get_feed(self, user_id: int, lat: Optional[float] = None,
+                 lng: Optional[float] = None, limit: int = 50) -> List[dict]:
+        """Return ranked, serialized feed items for ``user_id``."""
+        entries = self.entries_for(user_id)
+        if not entries:
+            return []
+        now = datetime.utcnow()
+        # Entries pushed on write may point at the caller's own events or at
+        # events that have since started; filter both here. Counts and hosts
+        # come with the rows, so the whole feed is one statement.
+        events = EVENTS.all(EVENTS.select().where(
+            Event.id.in_(list(entries.keys())),
+            Event.event_date >= now,
+            or_(Event.host_user_id.is_(None), Event.host_user_id != user_id),
+        ))
+
+        ranked = []
+        for item in events:
+            distance = None
+            if lat is not None and lng is not None and item['latitude'] is not None and item['longitude'] is not None:
+                distance = haversine_km(lat, lng, item['latitude'], item['longitude'])
+            score = self.score(entries[item['id']], distance, now)
+            ranked.append((score, item, distance, entries[item['id']]))
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+
+        out = []
+        for score, item, distance, activity_at in ranked[:limit]:
+            item['distance_km'] = distance
+            item['activity_at'] = activity_at.isoformat()
+            item['score'] = round(score, 4)
+            out.append(item)
+        return out
+
+    @staticmethod
+    def score(activity_at: datetime, distance_km: Optional[float], now: datetime) -> float:
+        age_hours = max((now - activity_at).total_seconds() / 3600.0, 0.0)
+        recency = 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+        proximity = 0.0
+        if distance_km is not None:
+            proximity = 0.5 ** (distance_km / DISTANCE_SCALE_KM)
+        return RECENCY_WEIGHT * recency + DISTANCE_WEIGHT * proximity
+
+    # Invalidation
+
+    def _followers_of(self, user_id: int) -> List[int]:
+        return list(db.session.execute(
+            select(Follow.follower_id).where(Follow.followee_id == user_id)
+        ).scalars())
+
+    def record_activity(self, actor_id: Optional[int], event_id: int,
+                        activity_at: Optional[datetime] = None) -> None:
+        """Propagate a user's activity on an event to their followers' feeds."""
+        if not actor_id:
+            return
+        activity_at = activity_at or datetime.utcnow()
+        for follower_id in self._followers_of(actor_id):
+            if self.strategy == 'write':
+                self.cache.push(follower_id, event_id, activity_at)
+            else:
+                self.cache.invalidate(follower_id)
+
+    def _on_event_created(self, sender, event_id, host_user_id, **kwargs):
+        self.record_activity(host_user_id, event_id)
+
+    def _on_participant_joined(self, sender, event_id, user_id, **kwargs):
+        self.record_activity(user_id, event_id)
+
+    def _on_participant_left(self, sender, event_id, user_id, **kwargs):
+        # Another followee may still be on the event, so an entry cannot be
+        # removed in place; drop the followers' feeds instead.
+        if not user_id:
+            return
+        for follower_id in self._followers_of(user_id):
+            self.cache.invalidate(follower_id)
+
+    def _on_follow_changed(self, sender, follower_id, followee_id, **kwargs):
+        # The set of followees changed, so the cached feed is no longer a
+        # subset or superset of the truth; rebuild on next read.
+        self.cache.invalidate(follower_id)
+
+    def _on_user_deleted(self, sender, user_id, **kwargs):
+        self.cache.invalidate(user_id)
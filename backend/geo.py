@@ -0,0 +1,219 @@
+"""Geographic helpers shared by the discovery endpoints.
+
+``GridIndex`` is an in-memory spatial index of points keyed by id. Points
+are bucketed into a grid of ``cell_degrees`` square cells; a radius query
+only computes distances (vectorized, per cell) for the cells overlapping
+the query's bounding box, and a nearest-k query widens the radius until it
+holds k points.
+"""
+import math
+import threading
+from math import asin, cos, radians, sin, sqrt
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+HALF_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM
+
+
+def non_finite(**values: Optional[float]) -> Optional[str]:
+    """Name of the first given value that is NaN or infinite (None is fine)."""
+    for name, value in values.items():
+        if value is not None and not math.isfinite(value):
+            return name
+    return None
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Compute haversine distance in km between two coordinates."""
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(a))
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_km_array(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Haversine distance in km from one point to arrays of points.
+
+    NaN coordinates yield NaN distances, so missing locations can be
+    carried through as NaN and masked by the caller.
+    """
+    lat1 = radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - radians(lon)
+    a = np.sin(dlat / 2) ** 2 + cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    # Rounding can push `a` a hair above 1 for antipodal points.
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distances_km(lat: float, lon: float, points: Iterable[Tuple[Optional[float], Optional[float]]]) -> List[Optional[float]]:
+    """Distances from lat/lon to each (lat, lon) pair; None where a pair is missing."""
+    coords = np.array([
+        (p_lat, p_lon) if p_lat is not None and p_lon is not None else (math.nan, math.nan)
+        for p_lat, p_lon in points
+    ], dtype=np.float64).reshape(-1, 2)
+    distances = haversine_km_array(lat, lon, coords[:, 0], coords[:, 1])
+    return [None if math.isnan(d) else float(d) for d in distances]
+
+
+class _Cell:
+    """Points of one grid cell, with column arrays built lazily for queries."""
+
+    __slots__ = ('ids', 'lats', 'lons', 'positions', '_arrays')
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.lats: List[float] = []
+        self.lons: List[float] = []
+        self.positions: Dict[int, int] = {}
+        self._arrays = None
+
+    def add(self, key: int, lat: float, lon: float) -> None:
+        self.positions[key] = len(self.ids)
+        self.ids.append(key)
+        self.lats.append(lat)
+        self.lons.append(lon)
+        self._arrays = None
+
+    def discard(self, key: int) -> None:
+        # Swap the last point into the freed slot so removal stays O(1).
+        position = self.positions.pop(key)
+        last = len(self.ids) - 1
+        if position != last:
+            moved = self.ids[last]
+            self.ids[position], self.lats[position], self.lons[position] = moved, self.lats[last], self.lons[last]
+            self.positions[moved] = position
+        self.ids.pop()
+        self.lats.pop()
+        self.lons.pop()
+        self._arrays = None
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self.ids, dtype=np.int64),
+                np.array(self.lats, dtype=np.float64),
+                np.array(self.lons, dtype=np.float64),
+            )
+        return self._arrays
+
+
+class GridIndex:
+    """Thread-safe grid of id -> (lat, lon) answering radius and nearest-k queries."""
+
+    def __init__(self, cell_degrees: float = 0.1):
+        self.cell_degrees = cell_degrees
+        self._columns = math.ceil(360.0 / cell_degrees)
+        self._rows = math.ceil(180.0 / cell_degrees)
+        self._cells: Dict[Tuple[int, int], _Cell] = {}
+        self._points: Dict[int, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._points
+
+    def _cell_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = min(max(int((lat + 90.0) // self.cell_degrees), 0), self._rows - 1)
+        column = int((lon + 180.0) // self.cell_degrees) % self._columns
+        return row, column
+
+    # Maintenance
+
+    def upsert(self, key: int, lat: Optional[float], lon: Optional[float]) -> None:
+        """Add or move a point. A missing coordinate removes it instead."""
+        if lat is None or lon is None or math.isnan(lat) or math.isnan(lon):
+            self.remove(key)
+            return
+        cell_key = self._cell_of(lat, lon)
+        with self._lock:
+            previous = self._points.get(key)
+            if previous is not None:
+                self._cells[previous].discard(key)
+                if not self._cells[previous].ids:
+                    del self._cells[previous]
+            self._cells.setdefault(cell_key, _Cell()).add(key, lat, lon)
+            self._points[key] = cell_key
+
+    def remove(self, key: int) -> None:
+        with self._lock:
+            cell_key = self._points.pop(key, None)
+            if cell_key is None:
+                return
+            cell = self._cells[cell_key]
+            cell.discard(key)
+            if not cell.ids:
+                del self._cells[cell_key]
+
+    def load(self, rows: Iterable[Tuple[int, Optional[float], Optional[float]]]) -> int:
+        """Replace the contents with (id, lat, lon) rows; returns points indexed."""
+        cells: Dict[Tuple[int, int], _Cell] = {}
+        points: Dict[int, Tuple[int, int]] = {}
+        for key, lat, lon in rows:
+            if lat is None or lon is None or key in points:
+                continue
+            cell_key = self._cell_of(lat, lon)
+            cells.setdefault(cell_key, _Cell()).add(key, lat, lon)
+            points[key] = cell_key
+        with self._lock:
+            self._cells, self._points = cells, points
+        return len(points)
+
+    # Queries
+
+    def _candidate_cells(self, lat: float, lon: float, radius_km: float) -> List[_Cell]:
+        """Cells overlapping the bounding box of the radius-km circle around lat/lon."""
+        angle = radius_km / EARTH_RADIUS_KM
+        first_row, _ = self._cell_of(max(lat - math.degrees(angle), -90.0), 0.0)
+        last_row, _ = self._cell_of(min(lat + math.degrees(angle), 90.0), 0.0)
+        if angle >= math.pi / 2 or sin(angle) >= cos(radians(lat)):
+            # The circle reaches a pole, so it spans every longitude.
+            first_column, last_column = 0, self._columns - 1
+        else:
+            half_width = math.degrees(asin(sin(angle) / cos(radians(lat))))
+            first_column = int((lon - half_width + 180.0) // self.cell_degrees)
+            last_column = min(int((lon + half_width + 180.0) // self.cell_degrees),
+                              first_column + self._columns - 1)
+        if (last_row - first_row + 1) * (last_column - first_column + 1) > len(self._cells):
+            # A box wider than the occupied grid: filtering occupied cells is cheaper.
+            columns = {column % self._columns for column in range(first_column, last_column + 1)}
+            return [
+                cell for (row, column), cell in self._cells.items()
+                if first_row <= row <= last_row and column in columns
+            ]
+        cells = []
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                cell = self._cells.get((row, column % self._columns))
+                if cell is not None:
+                    cells.append(cell)
+        return cells
+
+    def radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, distances in km) of the points within radius_km, nearest first."""
+        with self._lock:
+            chunks = [cell.arrays() for cell in self._candidate_cells(lat, lon, radius_km)]
+        if not chunks:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        ids = np.concatenate([c[0] for c in chunks])
+        distances = haversine_km_array(lat, lon, np.concatenate([c[1] for c in chunks]),
+                                       np.concatenate([c[2] for c in chunks]))
+        inside = np.flatnonzero(distances <= radius_km)
+        order = inside[np.argsort(distances[inside], kind='stable')]
+        return ids[order], distances[order]
+
+    def nearest(self, lat: float, lon: float, k: int,
+                max_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, distances in km) of the k nearest points (within max_km), nearest first."""
+        limit = HALF_CIRCUMFERENCE_KM if max_km is None else min(max_km, HALF_CIRCUMFERENCE_KM)
+        radius_km = min(self.cell_degrees * 111.32, limit)
+        while True:
+            ids, distances = self.radius(lat, lon, radius_km)
+            if len(ids) >= k or radius_km >= limit:
+                return ids[:k], distances[:k]
+            radius_km = min(radius_km * 4, limit)
@@ -0,0 +1,114 @@
+"""Guest identity: players who join events without an account.
+
+A guest is identified by a random token that the server only ever stores
+as its SHA-256 hash, in ``event_participants.guest_token`` (and
+``event_waitlist.guest_token``). One token is a guest session: it can be
+reused for any number of events, sent either as ``guest_token`` in the
+body or in the ``X-Guest-Token`` header.
+
+- ``(guest_token, event_id)`` has a unique index, so finding a guest's spot
+  in one event, or every spot the guest holds, is an index lookup;
+- hashes of recently seen tokens are memoized, so a guest session does not
+  re-hash its token on every request;
+- ``claim`` moves a guest's spots to a registered user with one UPDATE when
+  the guest signs up or logs in.
+"""
+import functools
+import hashlib
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from flask import request
+from sqlalchemy import and_, delete, exists, select, update
+from sqlalchemy.orm import aliased
+
+from models import db, EventParticipant, User, WaitlistEntry
+
+GUEST_TOKEN_HEADER = 'X-Guest-Token'
+
+
+def new_token() -> str:
+    return uuid4().hex
+
+
+@functools.lru_cache(maxsize=10_000)
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def request_token(data: Optional[Dict] = None) -> Optional[str]:
+    """The guest token sent with the current request (body first, then header)."""
+    token = (data or {}).get('guest_token') or request.headers.get(GUEST_TOKEN_HEADER)
+    return token if isinstance(token, str) and token else None
+
+
+def find_participant(event_id: int, token_hash: str) -> Optional[EventParticipant]:
+    return db.session.execute(
+        select(EventParticipant).where(EventParticipant.guest_token == token_hash,
+                                       EventParticipant.event_id == event_id)
+    ).scalar_one_or_none()
+
+
+def participations(token_hash: str) -> List[Dict]:
+    """Every spot the guest holds, across events, with one indexed query."""
+    rows = db.session.execute(
+        select(EventParticipant.event_id, EventParticipant.player_name, EventParticipant.team,
+               EventParticipant.joined_at)
+        .where(EventParticipant.guest_token == token_hash)
+        .order_by(EventParticipant.event_id)
+    ).all()
+    return [
+        {
+            'event_id': row.event_id,
+            'player_name': row.player_name,
+            'team': row.team,
+            'joined_at': row.joined_at.isoformat() if row.joined_at else None,
+        }
+        for row in rows
+    ]
+
+
+def claim(user: User, token_hash: str) -> List[int]:
+    """Re-link the guest's spots and waitlist entries to `user` (no commit).
+
+    Events where the user already has a spot (or waitlist entry) keep the
+    guest's row as it is. Where a spot moves, the user's own waitlist entry
+    for that event is dropped, so nobody holds a spot and a waitlist place
+    at once. Returns the ids of the events whose spots moved.
+    """
+    mine = aliased(EventParticipant)
+    claimable = and_(
+        EventParticipant.guest_token == token_hash,
+        ~exists().where(and_(mine.event_id == EventParticipant.event_id, mine.user_id == user.id)),
+    )
+    statement = (
+        update(EventParticipant)
+        .where(claimable)
+        .values(user_id=user.id, player_name=user.username, guest_name=None, guest_token=None)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        event_ids = list(db.session.execute(statement.returning(EventParticipant.event_id)).scalars())
+    else:
+        event_ids = list(db.session.execute(select(EventParticipant.event_id).where(claimable)).scalars())
+        db.session.execute(statement)
+    if event_ids:
+        db.session.execute(
+            delete(WaitlistEntry)
+            .where(WaitlistEntry.user_id == user.id, WaitlistEntry.event_id.in_(event_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+    waiting = aliased(WaitlistEntry)
+    db.session.execute(
+        update(WaitlistEntry)
+        .where(
+            WaitlistEntry.guest_token == token_hash,
+            ~exists().where(and_(waiting.event_id == WaitlistEntry.event_id, waiting.user_id == user.id)),
+            ~exists().where(and_(EventParticipant.event_id == WaitlistEntry.event_id,
+                                 EventParticipant.user_id == user.id)),
+        )
+        .values(user_id=user.id, player_name=user.username, guest_name=None, guest_token=None)
+        .execution_options(synchronize_session=False)
+    )
+    return sorted(event_ids)
@@ -0,0 +1,333 @@
+"""Lightweight DB-backed background job queue.
+
+Handlers register a job function by name and enqueue work inside their own
+transaction, so a job only becomes visible to workers once the request that
+created it commits:
+
+    @job('send_welcome_email')
+    def send_welcome_email(payload):
+        ...
+
+    enqueue('send_welcome_email', {'user_id': user.id}, idempotency_key=f'welcome:{user.id}')
+    db.session.commit()
+
+Workers are started from the Flask CLI and run jobs on a thread pool, each
+inside an app context:
+
+    flask --app app jobs work --concurrency 4
+    flask --app app jobs work --burst   # drain the queue and exit (tests/local)
+
+Claiming is a conditional UPDATE (status='queued' -> 'running'), so several
+workers can share one database. A job function's database changes are
+committed together with the job being marked done; on error they are rolled
+back and the job is retried with exponential backoff until `max_attempts`.
+Jobs left 'running' by a crashed worker are requeued after `lease_seconds`.
+
+Periodic jobs are declared per app with `schedule(app, name, every=...)`.
+Every worker enqueues them once per interval using an idempotency key
+derived from the interval number, so running several workers does not run
+a periodic job more than once per interval.
+
+Finished jobs are pruned by the periodic `prune_jobs` job: done ones after
+``JOBS_RETENTION_HOURS``, failed ones after ``JOBS_FAILED_RETENTION_DAYS``.
+"""
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from uuid import uuid4
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, delete, func, or_, select, update
+
+from models import db, Job
+
+JobFunc = Callable[[Dict[str, Any]], Any]
+
+_registry: Dict[str, 'JobSpec'] = {}
+
+MAX_BACKOFF_SECONDS = 300
+
+
+class JobSpec:
+    def __init__(self, name: str, func: JobFunc, max_attempts: int):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+
+
+def job(name: str, max_attempts: int = 5):
+    """Register a job function under `name`. The function receives the payload dict."""
+    def decorator(func: JobFunc) -> JobFunc:
+        _registry[name] = JobSpec(name, func, max_attempts)
+        return func
+    return decorator
+
+
+def registered_jobs() -> Dict[str, JobSpec]:
+    return dict(_registry)
+
+
+def schedule(app, name: str, every: float, payload: Optional[Dict[str, Any]] = None) -> None:
+    """Run job `name` every `every` seconds while a worker for `app` is running."""
+    app.extensions.setdefault('job_schedule', {})[name] = (float(every), payload or {})
+
+
+def enqueue(name: str, payload: Optional[Dict[str, Any]] = None,
+            idempotency_key: Optional[str] = None, delay: float = 0,
+            max_attempts: Optional[int] = None) -> None:
+    """Add a job to the current session's transaction.
+
+    Nothing is committed here; the caller's commit makes the job visible.
+    A second enqueue with the same `idempotency_key` is silently dropped,
+    even if the first job has already finished, until that job is pruned.
+    """
+    if max_attempts is None:
+        spec = _registry.get(name)
+        max_attempts = spec.max_attempts if spec else 5
+    now = datetime.utcnow()
+    values = {
+        'name': name,
+        'payload': json.dumps(payload or {}),
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': max_attempts,
+        'idempotency_key': idempotency_key,
+        'run_at': now + timedelta(seconds=delay),
+        'created_at': now,
+    }
+    statement = (insert_ignoring_duplicates(Job.__table__, 'idempotency_key')
+                 if idempotency_key else Job.__table__.insert())
+    db.session.execute(statement, values)
+
+
+def insert_ignoring_duplicates(table, key_column: str):
+    """INSERT into `table` that skips rows whose `key_column` value already exists.
+
+    Execute it with one dict of values or a list of them. Dialects without
+    ON CONFLICT get a plain INSERT, so a duplicate raises IntegrityError.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return table.insert()
+    return insert(table).on_conflict_do_nothing(index_elements=[key_column])
+
+
+def queue_stats() -> Dict[str, Any]:
+    """Job counts by status and the age of the oldest runnable job."""
+    counts = dict(db.session.execute(
+        select(Job.status, func.count(Job.id)).group_by(Job.status)
+    ).all())
+    oldest = db.session.execute(
+        select(func.min(Job.run_at)).where(Job.status == 'queued')
+    ).scalar()
+    lag = max((datetime.utcnow() - oldest).total_seconds(), 0.0) if oldest else 0.0
+    return {'counts': counts, 'oldest_queued_seconds': round(lag, 3)}
+
+
+def prune(done_hours: float, failed_days: float) -> int:
+    """Delete done jobs older than `done_hours` and failed ones older than `failed_days` (no commit)."""
+    now = datetime.utcnow()
+    return db.session.execute(
+        delete(Job).where(or_(
+            and_(Job.status == 'done', Job.finished_at < now - timedelta(hours=done_hours)),
+            and_(Job.status == 'failed', Job.finished_at < now - timedelta(days=failed_days)),
+        ))
+    ).rowcount
+
+
+class Worker:
+    """Polls the jobs table and runs claimed jobs on a thread pool."""
+
+    def __init__(self, app, concurrency: int = 4, poll_interval: float = 1.0,
+                 lease_seconds: int = 300):
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:6]}"
+        self._stop = threading.Event()
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        self._last_scheduled: Dict[str, int] = {}
+
+    def stop(self, *_args) -> None:
+        self._stop.set()
+
+    def run(self, burst: bool = False) -> int:
+        """Process jobs until stopped (or, with `burst`, until the queue is empty).
+
+        Returns the number of jobs processed.
+        """
+        processed = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='hopon-job') as pool:
+            while not self._stop.is_set():
+                with self.app.app_context():
+                    self.requeue_stale()
+                    self.enqueue_periodic()
+                    free = self.concurrency - self._inflight
+                    claimed = self.claim(free) if free > 0 else []
+                for job_id in claimed:
+                    with self._inflight_lock:
+                        self._inflight += 1
+                    pool.submit(self._run_one, job_id)
+                processed += len(claimed)
+                if not claimed:
+                    if burst and self._inflight == 0:
+                        break
+                    self._stop.wait(self.poll_interval if not burst else 0.05)
+        return processed
+
+    def claim(self, limit: int):
+        now = datetime.utcnow()
+        candidates = db.session.execute(
+            select(Job.id)
+            .where(Job.status == 'queued', Job.run_at <= now)
+            .order_by(Job.run_at, Job.id)
+            .limit(limit)
+        ).scalars().all()
+        claimed = []
+        for job_id in candidates:
+            result = db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', attempts=Job.attempts + 1,
+                        locked_at=now, locked_by=self.worker_id)
+            )
+            if result.rowcount == 1:
+                claimed.append(job_id)
+        db.session.commit()
+        return claimed
+
+    def enqueue_periodic(self) -> None:
+        periodic = self.app.extensions.get('job_schedule', {})
+        if not periodic:
+            return
+        now = time.time()
+        for name, (every, payload) in periodic.items():
+            slot = int(now // every)
+            if self._last_scheduled.get(name) == slot:
+                continue
+            enqueue(name, payload, idempotency_key=f"periodic:{name}:{slot}")
+            self._last_scheduled[name] = slot
+        db.session.commit()
+
+    def requeue_stale(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        result = db.session.execute(
+            update(Job)
+            .where(Job.status == 'running', Job.locked_at < cutoff)
+            .values(status='queued', locked_at=None, locked_by=None)
+        )
+        if result.rowcount:
+            print(f"[JOBS] Requeued {result.rowcount} stale jobs", flush=True)
+        db.session.commit()
+
+    def _run_one(self, job_id: int) -> None:
+        try:
+            with self.app.app_context():
+                run_job(job_id)
+        finally:
+            with self._inflight_lock:
+                self._inflight -= 1
+
+
+def run_job(job_id: int) -> bool:
+    """Run one claimed job in the current app context. Returns True on success."""
+    record = db.session.get(Job, job_id)
+    if record is None:
+        return False
+    spec = _registry.get(record.name)
+    try:
+        if spec is None:
+            raise LookupError(f"No job registered under '{record.name}'")
+        spec.func(json.loads(record.payload or '{}'))
+        record.status = 'done'
+        record.finished_at = datetime.utcnow()
+        record.last_error = None
+        db.session.commit()
+        return True
+    except Exception as exc:
+        db.session.rollback()
+        error = f"{type(exc).__name__}: {exc}"
+        print(f"[JOBS] Job {job_id} ({record.name}) failed on attempt {record.attempts}: {error}", flush=True)
+        record = db.session.get(Job, job_id)
+        record.last_error = traceback.format_exc()[-4000:]
+        record.locked_at = None
+        record.locked_by = None
+        if record.attempts >= record.max_attempts:
+            record.status = 'failed'
+            record.finished_at = datetime.utcnow()
+        else:
+            record.status = 'queued'
+            backoff = min(2 ** record.attempts, MAX_BACKOFF_SECONDS)
+            record.run_at = datetime.utcnow() + timedelta(seconds=backoff)
+        db.session.commit()
+        return False
+
+
+@job('prune_jobs', max_attempts=3)
+def prune_jobs_job(payload):
+    from flask import current_app
+
+    pruned = prune(current_app.config['JOBS_RETENTION_HOURS'], current_app.config['JOBS_FAILED_RETENTION_DAYS'])
+    if pruned:
+        print(f"[JOBS] Pruned {pruned} finished jobs", flush=True)
+
+
+@click.group('jobs')
+def jobs_cli():
+    """Background job queue commands."""
+
+
+@jobs_cli.command('work')
+@click.option('--concurrency', default=4, show_default=True, help='Jobs run in parallel.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds between polls when idle.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+@with_appcontext
+def work_command(concurrency, poll_interval, burst):
+    """Run a job worker."""
+    from flask import current_app
+
+    worker = Worker(current_app._get_current_object(), concurrency=concurrency, poll_interval=poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    click.echo(f"[JOBS] Worker {worker.worker_id} started (concurrency={concurrency})")
+    processed = worker.run(burst=burst)
+    click.echo(f"[JOBS] Worker {worker.worker_id} stopped after {processed} jobs")
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name')
+@click.option('--payload', default='{}', help='JSON object passed to the job.')
+@with_appcontext
+def enqueue_command(name, payload):
+    """Enqueue a job by name (e.g. to trigger a periodic job now)."""
+    if name not in _registry:
+        raise click.BadParameter(f"No job registered under '{name}'", param_hint='NAME')
+    enqueue(name, json.loads(payload))
+    db.session.commit()
+    click.echo(f"[JOBS] Enqueued {name}")
+
+
+@jobs_cli.command('stats')
+@with_appcontext
+def stats_command():
+    """Print job counts by status."""
+    click.echo(json.dumps(queue_stats(), indent=2))
+
+
+def init_app(app) -> None:
+    app.cli.add_command(jobs_cli)
+    schedule(app, 'prune_jobs', every=3600)
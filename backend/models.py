@@ -1,9 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-from typing import Optional
+from typing import FrozenSet, Optional
 
-db = SQLAlchemy()
+from sqlalchemy import event as orm_event
+
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def normalize_sport(name: str) -> str:
+    """Canonical form used for sport lookups (case and whitespace insensitive)."""
+    return ' '.join(name.split()).lower()
+
+
+def parse_sports(value: Optional[str]) -> FrozenSet[str]:
+    """Split a comma-separated sports string into normalized sport keys."""
+    if not value:
+        return frozenset()
+    return frozenset(normalize_sport(s) for s in value.split(',') if s.strip())
 
 class Event(db.Model):
     __tablename__ = 'events'
@@ -15,7 +31,7 @@ class Event(db.Model):
     notes = db.Column(db.Text, nullable=True)
     max_players = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    event_date = db.Column(db.DateTime, nullable=True)
+    event_date = db.Column(db.DateTime, nullable=True, index=True)
     # Optional geo + metadata for sorting/filtering
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
@@ -44,8 +60,70 @@ class Event(db.Model):
             'host': self.host.to_public_dict() if self.host else None,
         }
 
+class ArchivedEvent(db.Model):
+    """An event moved out of the hot `events` table by the archival job (see archive.py)."""
+    __tablename__ = 'events_archive'
+    __table_args__ = (
+        db.Index('ix_events_archive_host_user_id', 'host_user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # original events.id
+    name = db.Column(db.String(100), nullable=False)
+    sport = db.Column(db.String(50), nullable=False)
+    location = db.Column(db.Text, nullable=False)
+    notes = db.Column(db.Text, nullable=True)
+    max_players = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    event_date = db.Column(db.DateTime, nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    skill_level = db.Column(db.String(32), nullable=True)
+    host_user_id = db.Column(db.Integer, nullable=True)
+    participant_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'sport': self.sport,
+            'location': self.location,
+            'notes': self.notes,
+            'max_players': self.max_players,
+            'current_players': self.participant_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'event_date': self.event_date.isoformat() if self.event_date else None,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'skill_level': self.skill_level,
+            'host_user_id': self.host_user_id,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
+        }
+
+class ArchivedEventParticipant(db.Model):
+    __tablename__ = 'event_participants_archive'
+    __table_args__ = (
+        db.Index('ix_event_participants_archive_event_id', 'event_id'),
+        db.Index('ix_event_participants_archive_user_id', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # original event_participants.id
+    event_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    player_name = db.Column(db.String(100), nullable=False)
+    team = db.Column(db.String(20), nullable=True)
+    joined_at = db.Column(db.DateTime, nullable=True)
+    guest_name = db.Column(db.String(100), nullable=True)
+    guest_token = db.Column(db.String(128), nullable=True)
+
 class EventParticipant(db.Model):
     __tablename__ = 'event_participants'
+    __table_args__ = (
+        db.Index('ix_event_participants_event_id', 'event_id'),
+        db.Index('ix_event_participants_user_id', 'user_id'),
+        # Guest token first: serves one guest's spot in an event and all of their spots.
+        db.Index('uq_event_participants_guest_token', 'guest_token', 'event_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
@@ -54,7 +132,7 @@ class EventParticipant(db.Model):
     team = db.Column(db.String(20), nullable=True)  # 'team_a' or 'team_b'
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
     guest_name = db.Column(db.String(100), nullable=True)
-    guest_token = db.Column(db.String(128), nullable=True, unique=False)
+    guest_token = db.Column(db.String(128), nullable=True)  # sha256 of the guest's token (see guests.py)
     
     def to_dict(self):
         return {
@@ -67,6 +145,25 @@ class EventParticipant(db.Model):
             'guest_name': self.guest_name,
         }
 
+class WaitlistEntry(db.Model):
+    """A player queued for a full event, promoted in `position` order (see waitlist.py)."""
+    __tablename__ = 'event_waitlist'
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'position', name='uq_event_waitlist_position'),
+        db.UniqueConstraint('event_id', 'user_id', name='uq_event_waitlist_user'),
+        db.UniqueConstraint('event_id', 'guest_token', name='uq_event_waitlist_guest_token'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user_model.id'), nullable=True)
+    player_name = db.Column(db.String(100), nullable=False)
+    team = db.Column(db.String(20), nullable=True)
+    guest_name = db.Column(db.String(100), nullable=True)
+    guest_token = db.Column(db.String(128), nullable=True)  # sha256 of the guest's token
+    position = db.Column(db.Integer, nullable=False)  # increases per event; gaps are fine
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class User(db.Model):
     __tablename__ = 'user_model'
     
@@ -88,6 +185,18 @@ class User(db.Model):
 
     # Relationship to events through EventParticipant
     events_joined = db.relationship('EventParticipant', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    # Indexed copy of `sports`, kept in sync whenever `sports` is assigned
+    sport_links = db.relationship('UserSport', cascade='all, delete-orphan')
+
+    def sync_sport_links(self, value: Optional[str]) -> None:
+        """Make `sport_links` match the sports listed in `value`."""
+        wanted = parse_sports(value)
+        current = {link.sport: link for link in self.sport_links}
+        for sport, link in current.items():
+            if sport not in wanted:
+                self.sport_links.remove(link)
+        for sport in sorted(wanted - current.keys()):
+            self.sport_links.append(UserSport(sport=sport))
     
     def set_password(self, password: str) -> None:
         """Hash and set the user password."""
@@ -119,9 +228,123 @@ class User(db.Model):
             'avatar_url': self.avatar_url,
         }
 
+@orm_event.listens_for(User.sports, 'set')
+def _sync_user_sports(target, value, oldvalue, initiator):
+    target.sync_sport_links(value)
+
+class UserSport(db.Model):
+    """Normalized user -> sport association used for sport-filtered discovery.
+
+    `User.sports` stays the display value returned by the API; this table is
+    the indexed lookup side and stores normalized (lowercase) sport keys.
+    """
+    __tablename__ = 'user_sports'
+    __table_args__ = (
+        db.Index('ix_user_sports_sport_user', 'sport', 'user_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user_model.id'), primary_key=True)
+    sport = db.Column(db.String(50), primary_key=True)
+
+class EventTileBucket(db.Model):
+    """Per-zoom grid aggregate of event locations, maintained by tiles.py.
+
+    Each map tile at `zoom` is split into a fixed grid of cells; a row holds
+    the number of events of one sport in one cell and the sums of their
+    coordinates, so a tile's clusters are a range scan over the primary key.
+    """
+    __tablename__ = 'event_tile_buckets'
+
+    zoom = db.Column(db.Integer, primary_key=True)
+    cell_x = db.Column(db.Integer, primary_key=True)
+    cell_y = db.Column(db.Integer, primary_key=True)
+    sport = db.Column(db.String(50), primary_key=True)
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+    latitude_sum = db.Column(db.Float, nullable=False, default=0.0)
+    longitude_sum = db.Column(db.Float, nullable=False, default=0.0)
+
 class Follow(db.Model):
     __tablename__ = 'follows'
     id = db.Column(db.Integer, primary_key=True)
     follower_id = db.Column(db.Integer, db.ForeignKey('user_model.id'), nullable=False)
     followee_id = db.Column(db.Integer, db.ForeignKey('user_model.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    """A unit of deferred work processed by the background worker (see jobs.py)."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=True)  # JSON object
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    idempotency_key = db.Column(db.String(255), unique=True, nullable=True)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(64), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'idempotency_key': self.idempotency_key,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class OutboxMessage(db.Model):
+    """A change to publish, written in the transaction that made it (see outbox.py)."""
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        db.Index('ix_outbox_status_available_at', 'status', 'available_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(100), nullable=False)
+    key = db.Column(db.String(255), unique=True, nullable=False)  # dedupe key passed to sinks
+    payload = db.Column(db.Text, nullable=True)  # JSON object
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, relaying, delivered, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(64), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+
+
+class RevokedToken(db.Model):
+    """A revoked JWT (by jti), or every token of a user issued up to created_at (see tokens.py)."""
+    __tablename__ = 'revoked_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(64), unique=True, nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)  # no foreign key: outlives the deleted user
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # prunable once the token(s) expired
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class RefreshSession(db.Model):
+    """One signed-in client: the hashed id (jti) of its current refresh token (see tokens.py)."""
+    __tablename__ = 'refresh_sessions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user_model.id'), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    rotated_from = db.Column(db.String(64), nullable=True, index=True)  # previous token's hash
+    rotated_at = db.Column(db.DateTime, nullable=True)  # when rotated_from was replaced
+    family_id = db.Column(db.String(32), unique=True, index=True, nullable=True)  # 'sid' claim of every token in the session
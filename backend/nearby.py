@@ -0,0 +1,144 @@
+"""In-memory spatial indexes of event and user locations.
+
+``/events/nearby`` and ``/users/nearby`` answer radius and nearest-k
+queries from a ``geo.GridIndex`` per kind instead of computing a distance
+to every row. An index is loaded from the database on first use and kept
+current through signals:
+
+- events: ``event_created`` adds the event, ``event_deleted`` drops it;
+- users: ``user_updated`` re-reads the user's location, ``user_deleted``
+  drops the user.
+
+Indexes are per process. ``NEARBY_INDEX_TTL`` bounds how stale one can get
+when a mutation lands on another worker (or bypasses the signals, like
+archival): an older index is reloaded on the next query. Matching rows are
+always re-read and filtered by the caller, so a stale entry never surfaces
+a deleted or archived row; it only costs an extra candidate.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+import archive
+import signals
+from geo import GridIndex
+from models import db, Event, User
+
+KINDS = ('events', 'users')
+# Ids per `load` call, to keep IN lists a reasonable size.
+LOAD_CHUNK = 500
+
+
+class NearbyIndex:
+    """Per-kind grid indexes with lazy loading and signal-driven updates."""
+
+    def __init__(self, cell_degrees: float = 0.1, ttl: float = 60.0):
+        self.cell_degrees = cell_degrees
+        self.ttl = ttl
+        self._indexes: Dict[str, Tuple[GridIndex, float]] = {}
+        self._load_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'NearbyIndex':
+        return cls(cell_degrees=config['NEARBY_INDEX_CELL_DEGREES'], ttl=config['NEARBY_INDEX_TTL'])
+
+    def init_app(self, app) -> None:
+        app.extensions['nearby'] = self
+        signals.event_created.connect(self._on_event_created, sender=app, weak=False)
+        signals.event_deleted.connect(self._on_event_deleted, sender=app, weak=False)
+        signals.user_updated.connect(self._on_user_updated, sender=app, weak=False)
+        signals.user_deleted.connect(self._on_user_deleted, sender=app, weak=False)
+
+    # Loading
+
+    def index(self, kind: str) -> GridIndex:
+        """The index for `kind`, loading it on first use or once older than the TTL."""
+        entry = self._indexes.get(kind)
+        if entry is None or (self.ttl and time.monotonic() - entry[1] > self.ttl):
+            with self._load_lock:
+                entry = self._indexes.get(kind)
+                if entry is None or (self.ttl and time.monotonic() - entry[1] > self.ttl):
+                    grid = entry[0] if entry is not None else GridIndex(self.cell_degrees)
+                    loaded_at = time.monotonic()
+                    grid.load(db.session.execute(self._source(kind)))
+                    entry = self._indexes[kind] = (grid, loaded_at)
+        return entry[0]
+
+    @staticmethod
+    def _source(kind: str):
+        if kind == 'events':
+            return (
+                select(Event.id, Event.latitude, Event.longitude)
+                .where(archive.live_events_filter(), Event.latitude.isnot(None), Event.longitude.isnot(None))
+            )
+        if kind == 'users':
+            return select(User.id, User.latitude, User.longitude).where(
+                User.latitude.isnot(None), User.longitude.isnot(None)
+            )
+        raise ValueError(f"Unknown index kind '{kind}'. Expected one of {KINDS}")
+
+    def _loaded(self, kind: str) -> Optional[GridIndex]:
+        # Updates only matter for an index that exists; a later load reads them anyway.
+        entry = self._indexes.get(kind)
+        return entry[0] if entry is not None else None
+
+    def clear(self) -> None:
+        with self._load_lock:
+            self._indexes.clear()
+
+    # Signal handlers
+
+    def _on_event_created(self, sender, event_id=None, **kwargs):
+        grid = self._loaded('events')
+        if grid is not None:
+            row = db.session.execute(select(Event.latitude, Event.longitude).where(Event.id == event_id)).first()
+            grid.upsert(event_id, *(row or (None, None)))
+
+    def _on_event_deleted(self, sender, event_id=None, **kwargs):
+        grid = self._loaded('events')
+        if grid is not None:
+            grid.remove(event_id)
+
+    def _on_user_updated(self, sender, user_id=None, **kwargs):
+        grid = self._loaded('users')
+        if grid is not None:
+            row = db.session.execute(select(User.latitude, User.longitude).where(User.id == user_id)).first()
+            grid.upsert(user_id, *(row or (None, None)))
+
+    def _on_user_deleted(self, sender, user_id=None, **kwargs):
+        grid = self._loaded('users')
+        if grid is not None:
+            grid.remove(user_id)
+
+    # Queries
+
+    def nearby(self, kind: str, lat: float, lng: float, load: Callable[[List[int]], Sequence],
+               radius_km: Optional[float] = None, limit: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """(row, distance_km) pairs near lat/lng, nearest first.
+
+        `load(ids)` returns the rows among `ids` that pass the caller's
+        filters, as dicts with an ``'id'``. With a `limit`, candidates are
+        over-fetched until `limit` rows survive or the index runs out. At
+        least one of `radius_km` and `limit` is required.
+        """
+        if radius_km is None and limit is None:
+            raise ValueError('nearby() needs a radius_km or a limit')
+        grid = self.index(kind)
+        fetch = limit * 2 if limit is not None else None
+        while True:
+            if fetch is None:
+                ids, distances = grid.radius(lat, lng, radius_km)
+            else:
+                ids, distances = grid.nearest(lat, lng, fetch, max_km=radius_km)
+            ids = ids.tolist()
+            rows = {}
+            for start in range(0, len(ids), LOAD_CHUNK):
+                rows.update((row['id'], row) for row in load(ids[start:start + LOAD_CHUNK]))
+            hits = [(rows[key], distance) for key, distance in zip(ids, distances.tolist()) if key in rows]
+            if fetch is None:
+                return hits
+            if len(hits) >= limit or len(ids) < fetch:
+                return hits[:limit]
+            fetch *= 4
@@ -0,0 +1,407 @@
+"""Transactional outbox for event and participation changes.
+
+Routes that change events or rosters record what happened in the ``outbox``
+table before they commit, so a message exists exactly when its change was
+committed:
+
+    outbox.record('participant.joined', {'event_id': event.id, 'user_id': user.id})
+    db.session.commit()
+
+A relay drains the table in id order and hands each batch to the sinks
+named in ``OUTBOX_SINKS``:
+
+    flask --app app outbox relay            # long-running
+    flask --app app outbox relay --burst    # drain and exit
+
+- ``callback`` calls functions registered in the relay's process with
+  ``subscribe(app, topic, func)`` (``'*'`` for every topic);
+- ``queue`` puts messages on an in-process ``queue.Queue`` for a consumer
+  thread in the relay's process;
+- ``webhook`` POSTs each batch as JSON to ``OUTBOX_WEBHOOK_URL``. It is a
+  stub: no signing, and failures are only retried by the relay.
+
+Batches are claimed with a conditional UPDATE, so several relays can share
+the table. Delivery is at least once: a batch that fails is retried one
+message at a time with exponential backoff, and a message moves to
+``failed`` after ``OUTBOX_MAX_ATTEMPTS``. Every message carries a unique
+``key``. Sinks skip keys they already took within the last
+``DEDUPE_WINDOW`` messages, so a retry does not deliver twice to the sinks
+that had succeeded. Consumers elsewhere should dedupe on the key.
+Delivered messages are pruned after ``OUTBOX_RETENTION_HOURS``.
+"""
+import json
+import os
+import queue
+import signal
+import socket
+import threading
+import urllib.request
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select, update
+
+import jobs
+from models import db, OutboxMessage
+
+OUTBOX_SINKS = ('callback', 'queue', 'webhook')
+DEDUPE_WINDOW = 10_000
+MAX_BACKOFF_SECONDS = 300
+
+Message = Dict[str, Any]  # id, topic, key, payload, created_at
+
+
+def record(topic: str, payload: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> None:
+    """Add a message to the current session's transaction (no commit).
+
+    A second message with the same `key` is silently dropped.
+    """
+    now = datetime.utcnow()
+    values = {
+        'topic': topic,
+        'key': key or uuid4().hex,
+        'payload': json.dumps(payload or {}),
+        'status': 'pending',
+        'attempts': 0,
+        'available_at': now,
+        'created_at': now,
+    }
+    db.session.execute(jobs.insert_ignoring_duplicates(OutboxMessage.__table__, 'key'), values)
+
+
+class Sink:
+    """Delivers batches of messages somewhere. Subclasses implement `deliver`."""
+
+    name = 'sink'
+
+    def __init__(self):
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+    def send(self, messages: List[Message]) -> None:
+        """Deliver the messages whose keys this sink has not taken yet."""
+        fresh = [message for message in messages if message['key'] not in self._seen]
+        if not fresh:
+            return
+        self.deliver(fresh)
+        for message in fresh:
+            self._seen[message['key']] = None
+        while len(self._seen) > DEDUPE_WINDOW:
+            self._seen.popitem(last=False)
+
+    def deliver(self, messages: List[Message]) -> None:
+        raise NotImplementedError
+
+
+class CallbackSink(Sink):
+    """Calls in-process subscribers, by topic or for every topic (``'*'``)."""
+
+    name = 'callback'
+
+    def __init__(self):
+        super().__init__()
+        self._subscribers: Dict[str, List[Callable[[Message], Any]]] = {}
+
+    def subscribe(self, topic: str, func: Callable[[Message], Any]) -> None:
+        self._subscribers.setdefault(topic, []).append(func)
+
+    def deliver(self, messages: List[Message]) -> None:
+        for message in messages:
+            for func in self._subscribers.get(message['topic'], []) + self._subscribers.get('*', []):
+                func(message)
+
+
+class QueueSink(Sink):
+    """Puts messages on a bounded in-process queue; a full queue fails the batch."""
+
+    name = 'queue'
+
+    def __init__(self, max_size: int = 10_000):
+        super().__init__()
+        self.queue: "queue.Queue[Message]" = queue.Queue(maxsize=max_size)
+
+    def deliver(self, messages: List[Message]) -> None:
+        if self.queue.maxsize and self.queue.maxsize - self.queue.qsize() < len(messages):
+            raise queue.Full(f'Outbox queue has no room for {len(messages)} messages')
+        for message in messages:
+            self.queue.put_nowait(message)
+
+
+class WebhookSink(Sink):
+    """POSTs ``{"messages": [...]}`` to a URL; any non-2xx answer fails the batch."""
+
+    name = 'webhook'
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        super().__init__()
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, messages: List[Message]) -> None:
+        body = json.dumps({'messages': messages}).encode()
+        request = urllib.request.Request(self.url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if not 200 <= response.status < 300:
+                raise RuntimeError(f'Webhook answered {response.status}')
+
+
+def _message(row: OutboxMessage) -> Message:
+    return {
+        'id': row.id,
+        'topic': row.topic,
+        'key': row.key,
+        'payload': json.loads(row.payload or '{}'),
+        'created_at': row.created_at.isoformat(),
+    }
+
+
+class OutboxRelay:
+    """Moves committed outbox messages to the configured sinks."""
+
+    def __init__(self, sinks: Optional[List[Sink]] = None, batch_size: int = 100, poll_interval: float = 1.0,
+                 max_attempts: int = 10, retention_hours: float = 24, lease_seconds: int = 60):
+        self.sinks = sinks or []
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retention_hours = retention_hours
+        self.lease_seconds = lease_seconds
+        self.relay_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:6]}"
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._counts = {'batches': 0, 'delivered': 0, 'retried': 0, 'failed': 0}
+        self._lag_samples: deque = deque(maxlen=1000)  # created -> delivered, seconds
+
+    @classmethod
+    def from_config(cls, config) -> 'OutboxRelay':
+        sinks: List[Sink] = []
+        for name in filter(None, (s.strip().lower() for s in config['OUTBOX_SINKS'].split(','))):
+            if name == 'callback':
+                sinks.append(CallbackSink())
+            elif name == 'queue':
+                sinks.append(QueueSink())
+            elif name == 'webhook':
+                if not config['OUTBOX_WEBHOOK_URL']:
+                    raise ValueError("OUTBOX_SINKS includes 'webhook' but OUTBOX_WEBHOOK_URL is not set")
+                sinks.append(WebhookSink(config['OUTBOX_WEBHOOK_URL'], timeout=config['OUTBOX_WEBHOOK_TIMEOUT']))
+            else:
+                raise ValueError(f"OUTBOX_SINKS entries must be among {OUTBOX_SINKS}, got '{name}'")
+        return cls(
+            sinks=sinks,
+            batch_size=config['OUTBOX_BATCH_SIZE'],
+            poll_interval=config['OUTBOX_POLL_INTERVAL'],
+            max_attempts=config['OUTBOX_MAX_ATTEMPTS'],
+            retention_hours=config['OUTBOX_RETENTION_HOURS'],
+        )
+
+    def init_app(self, app) -> None:
+        app.extensions['outbox'] = self
+        app.cli.add_command(outbox_cli)
+        jobs.schedule(app, 'prune_outbox', every=3600)
+
+    def sink(self, name: str) -> Optional[Sink]:
+        return next((sink for sink in self.sinks if sink.name == name), None)
+
+    # Relaying
+
+    def stop(self, *_args) -> None:
+        self._stop.set()
+
+    def run(self, app, burst: bool = False) -> int:
+        """Relay until stopped (or, with `burst`, until nothing is pending). Returns messages delivered."""
+        delivered = 0
+        while not self._stop.is_set():
+            with app.app_context():
+                self.requeue_stale()
+                relayed = self.relay_once()
+            delivered += relayed
+            if not relayed:
+                if burst:
+                    break
+                self._stop.wait(self.poll_interval)
+        return delivered
+
+    def relay_once(self) -> int:
+        """Claim and deliver one batch. Returns the number of messages delivered."""
+        rows = self.claim()
+        if not rows:
+            return 0
+        messages = [_message(row) for row in rows]
+        try:
+            self._deliver(messages)
+            delivered, failures = messages, []
+        except Exception as exc:
+            # Retry one by one so a single bad message does not hold back the batch.
+            delivered, failures = [], []
+            for message in messages:
+                try:
+                    self._deliver([message])
+                    delivered.append(message)
+                except Exception as single_exc:
+                    failures.append((message, single_exc))
+            print(f"[OUTBOX] Batch of {len(messages)} failed ({type(exc).__name__}: {exc}); "
+                  f"{len(failures)} messages will be retried", flush=True)
+        self._finish(rows, delivered, failures)
+        return len(delivered)
+
+    def _deliver(self, messages: List[Message]) -> None:
+        for sink in self.sinks:
+            sink.send(messages)
+
+    def claim(self) -> List[OutboxMessage]:
+        now = datetime.utcnow()
+        candidates = db.session.execute(
+            select(OutboxMessage.id)
+            .where(OutboxMessage.status == 'pending', OutboxMessage.available_at <= now)
+            .order_by(OutboxMessage.id)
+            .limit(self.batch_size)
+        ).scalars().all()
+        if not candidates:
+            db.session.commit()
+            return []
+        db.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(candidates), OutboxMessage.status == 'pending')
+            .values(status='relaying', attempts=OutboxMessage.attempts + 1,
+                    locked_at=now, locked_by=self.relay_id)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return db.session.execute(
+            select(OutboxMessage)
+            .where(OutboxMessage.id.in_(candidates), OutboxMessage.locked_by == self.relay_id,
+                   OutboxMessage.status == 'relaying')
+            .order_by(OutboxMessage.id)
+        ).scalars().all()
+
+    def _finish(self, rows: List[OutboxMessage], delivered: List[Message], failures) -> None:
+        now = datetime.utcnow()
+        if delivered:
+            db.session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_([message['id'] for message in delivered]))
+                .values(status='delivered', delivered_at=now, locked_at=None, locked_by=None, last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+        by_id = {row.id: row for row in rows}
+        failed = 0
+        for message, exc in failures:
+            row = by_id[message['id']]
+            row.last_error = f"{type(exc).__name__}: {exc}"[:4000]
+            row.locked_at = None
+            row.locked_by = None
+            if row.attempts >= self.max_attempts:
+                row.status = 'failed'
+                failed += 1
+            else:
+                row.status = 'pending'
+                row.available_at = now + timedelta(seconds=min(2 ** row.attempts, MAX_BACKOFF_SECONDS))
+        created = {row.id: row.created_at for row in rows}
+        db.session.commit()
+        with self._stats_lock:
+            self._counts['batches'] += 1
+            self._counts['delivered'] += len(delivered)
+            self._counts['retried'] += len(failures) - failed
+            self._counts['failed'] += failed
+            for message in delivered:
+                self._lag_samples.append((now - created[message['id']]).total_seconds())
+
+    def requeue_stale(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        result = db.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.status == 'relaying', OutboxMessage.locked_at < cutoff)
+            .values(status='pending', locked_at=None, locked_by=None)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            print(f"[OUTBOX] Requeued {result.rowcount} messages from a stalled relay", flush=True)
+        db.session.commit()
+
+    def prune(self) -> int:
+        """Delete delivered messages older than the retention window (no commit)."""
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        return db.session.execute(
+            delete(OutboxMessage).where(OutboxMessage.status == 'delivered', OutboxMessage.delivered_at < cutoff)
+        ).rowcount
+
+    # Metrics
+
+    def stats(self) -> Dict[str, Any]:
+        """Backlog from the table plus this process's relay counters and delivery lag."""
+        counts = dict(db.session.execute(
+            select(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status)
+        ).all())
+        oldest = db.session.execute(
+            select(func.min(OutboxMessage.created_at)).where(OutboxMessage.status.in_(('pending', 'relaying')))
+        ).scalar()
+        with self._stats_lock:
+            relay = dict(self._counts)
+            lags = sorted(self._lag_samples)
+        if lags:
+            lag = {
+                'p50_ms': round(lags[len(lags) // 2] * 1000, 2),
+                'p95_ms': round(lags[min(len(lags) - 1, int(len(lags) * 0.95))] * 1000, 2),
+                'max_ms': round(lags[-1] * 1000, 2),
+            }
+        else:
+            lag = {'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'sinks': [sink.name for sink in self.sinks],
+            'counts': counts,
+            'oldest_pending_seconds': round(max((datetime.utcnow() - oldest).total_seconds(), 0.0), 3)
+            if oldest else 0.0,
+            'relay': relay,
+            'delivery_lag': lag,
+        }
+
+
+def subscribe(app, topic: str, func: Callable[[Message], Any]) -> None:
+    """Call `func(message)` for `topic` (or ``'*'``) when the app's relay delivers it."""
+    sink = app.extensions['outbox'].sink('callback')
+    if sink is None:
+        raise RuntimeError("subscribe() needs 'callback' in OUTBOX_SINKS")
+    sink.subscribe(topic, func)
+
+
+@jobs.job('prune_outbox', max_attempts=3)
+def prune_outbox_job(payload):
+    from flask import current_app
+
+    pruned = current_app.extensions['outbox'].prune()
+    if pruned:
+        print(f"[OUTBOX] Pruned {pruned} delivered messages", flush=True)
+
+
+@click.group('outbox')
+def outbox_cli():
+    """Transactional outbox commands."""
+
+
+@outbox_cli.command('relay')
+@click.option('--burst', is_flag=True, help='Exit once nothing is pending.')
+@with_appcontext
+def relay_command(burst):
+    """Deliver outbox messages to the configured sinks."""
+    from flask import current_app
+
+    app = current_app._get_current_object()
+    relay = app.extensions['outbox']
+    signal.signal(signal.SIGTERM, relay.stop)
+    signal.signal(signal.SIGINT, relay.stop)
+    click.echo(f"[OUTBOX] Relay {relay.relay_id} started (sinks: {', '.join(s.name for s in relay.sinks) or 'none'})")
+    delivered = relay.run(app, burst=burst)
+    click.echo(f"[OUTBOX] Relay {relay.relay_id} stopped after {delivered} messages")
+
+
+@outbox_cli.command('stats')
+@with_appcontext
+def stats_command():
+    """Print outbox backlog and lag."""
+    from flask import current_app
+
+    click.echo(json.dumps(current_app.extensions['outbox'].stats(), indent=2))
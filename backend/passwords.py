@@ -0,0 +1,165 @@
+"""Password hashing off the request thread.
+
+Hashing and verification are deliberately slow. Run inline, a burst of
+logins keeps request threads busy (and, for methods that hold the GIL,
+stalls every other thread in the worker). ``PasswordHasher`` runs them in a
+small process pool instead:
+
+- ``PASSWORD_HASH_WORKERS`` processes (0 runs inline, as before). At most
+  ``PASSWORD_HASH_QUEUE`` calls may be queued or running per worker; beyond
+  that ``HasherBusy`` is raised and the route answers 503, so a login storm
+  is capped at a fixed share of CPU. A call that waits longer than
+  ``PASSWORD_HASH_TIMEOUT`` also answers 503; its task is cancelled if it
+  has not started, and otherwise keeps its slot until it finishes.
+- ``PASSWORD_HASH_METHOD`` is any werkzeug method string, e.g.
+  ``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. Hashes made with
+  another method (or cost) are transparently rehashed after the next
+  successful login.
+- Latency of hash/verify calls, including time queued, is kept for
+  ``/admin/metrics``.
+
+Pool processes are forked, and forking copies only the calling thread, so
+a lock another thread holds would stay locked in the child. ``serve.py``
+therefore calls ``start()`` in gunicorn's ``post_fork``, before the worker
+runs any request threads. Elsewhere the pool is created lazily in each
+process that uses it, so a worker never shares one inherited from the
+master. The children only run werkzeug's hash functions.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from typing import Dict, Optional, Tuple
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(RuntimeError):
+    """Raised when too many hash calls are already queued, or one timed out."""
+
+
+class PasswordHasher:
+    def __init__(self, method: str = 'scrypt', workers: int = 2, max_queue: int = 16,
+                 timeout: float = 10.0):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
+        self._prefix: Optional[str] = None
+        self._samples = {'hash': deque(maxlen=1000), 'verify': deque(maxlen=1000)}
+        self._counts = {'hash': 0, 'verify': 0, 'rehash': 0, 'busy': 0, 'timeout': 0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'PasswordHasher':
+        return cls(
+            method=config['PASSWORD_HASH_METHOD'],
+            workers=config['PASSWORD_HASH_WORKERS'],
+            max_queue=config['PASSWORD_HASH_QUEUE'],
+            timeout=config['PASSWORD_HASH_TIMEOUT'],
+        )
+
+    def init_app(self, app) -> None:
+        app.extensions['password_hasher'] = self
+
+    # Execution
+
+    def start(self) -> None:
+        """Create the pool and fork its processes now, while this process has no other threads."""
+        if self.workers > 0:
+            self._executor().submit(os.getpid).result()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('fork')
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, kind: str, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._counts['busy'] += 1
+            raise HasherBusy('Password hashing queue is full')
+        start = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                try:
+                    return func(*args)
+                finally:
+                    self._slots.release()
+            try:
+                future = self._executor().submit(func, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # The slot belongs to the task, not the caller: a call that times
+            # out still occupies a pool process until it finishes.
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                return future.result(timeout=self.timeout)
+            except FuturesTimeout as e:
+                future.cancel()
+                with self._stats_lock:
+                    self._counts['timeout'] += 1
+                raise HasherBusy(f'Password hashing took longer than {self.timeout:g}s') from e
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self._counts[kind] += 1
+                self._samples[kind].append(elapsed)
+
+    # API
+
+    def hash(self, password: str) -> str:
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: Optional[str], password: str) -> Tuple[bool, bool]:
+        """Check a password. Returns (matches, needs_rehash)."""
+        if not password_hash:
+            return False, False
+        ok = self._run('verify', check_password_hash, password_hash, password)
+        return ok, ok and self.needs_rehash(password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return password_hash.split('$', 1)[0] != self.method_prefix()
+
+    def method_prefix(self) -> str:
+        """The fully expanded method of new hashes (e.g. 'pbkdf2:sha256' -> 'pbkdf2:sha256:1000000')."""
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def record_rehash(self) -> None:
+        with self._stats_lock:
+            self._counts['rehash'] += 1
+
+    def stats(self) -> Dict:
+        def summary(samples):
+            ordered = sorted(samples)
+            if not ordered:
+                return {'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+            return {
+                'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+                'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+                'max_ms': round(ordered[-1] * 1000, 2),
+            }
+
+        with self._stats_lock:
+            counts = dict(self._counts)
+            samples = {kind: list(values) for kind, values in self._samples.items()}
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'counts': counts,
+            'hash': summary(samples['hash']),
+            'verify': summary(samples['verify']),
+        }
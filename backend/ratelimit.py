@@ -0,0 +1,317 @@
+"""Per-route rate limiting and load shedding.
+
+Rate limits are token buckets keyed by route and caller identity (user id
+when authenticated, client address otherwise). Views opt in with a default
+rate that ``RATE_LIMITS`` can override per endpoint:
+
+    @bp.post('/auth/login')
+    @limit('10/minute', burst=5)
+    def login():
+        ...
+
+    RATE_LIMITS="login=20/minute,join_event=2/second"
+
+Anonymous callers behind one NAT or proxy share an address, so views that
+act on a named account (login, signup) also pass ``account``. The bucket is
+then keyed by address and account, and a second bucket per address allows
+``RATE_LIMIT_IP_FACTOR`` times the rate across all accounts:
+
+    @limit('10/minute', account=json_field('email'))
+
+A caller over the limit gets 429 with ``Retry-After``. Buckets live in
+process (``memory``) or in Redis (``redis``, needs ``RATE_LIMIT_URL``) so
+that all workers share them.
+
+The load shedder rejects requests with 503 and ``Retry-After`` before any
+work is done when the worker already has ``SHED_MAX_INFLIGHT`` requests in
+flight, or when every connection of the database pool is checked out (new
+requests would only queue for a connection).
+"""
+import functools
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import current_app, g, jsonify, make_response, request
+
+RATE_LIMIT_BACKENDS = ('memory', 'redis')
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+RATE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*/\s*(second|minute|hour|day)\s*$')
+EXEMPT_PATHS = frozenset(['/health'])
+
+
+def parse_rate(value: str) -> Tuple[float, float]:
+    """'10/minute' -> (10 tokens, 60 seconds)."""
+    match = RATE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid rate '{value}'; expected e.g. '10/minute'")
+    return float(match.group(1)), float(PERIODS[match.group(2)])
+
+
+def json_field(name: str) -> Callable[[], Optional[str]]:
+    """An ``account`` callable reading `name` from the JSON body (trimmed, lowercased)."""
+    def account() -> Optional[str]:
+        value = (request.get_json(silent=True) or {}).get(name)
+        if not isinstance(value, str):
+            return None
+        return value.strip().lower() or None
+    return account
+
+
+def parse_overrides(value: Optional[str]) -> Dict[str, str]:
+    """'login=20/minute,join_event=2/second' -> {'login': '20/minute', ...}."""
+    overrides = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        endpoint, _, rate = item.partition('=')
+        parse_rate(rate)
+        overrides[endpoint.strip()] = rate.strip()
+    return overrides
+
+
+class MemoryBuckets:
+    """Thread-safe token buckets in an LRU-bounded dict."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float, float]:
+        """Take one token. Returns (allowed, tokens left, seconds until the next token)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        wait = 0.0 if tokens >= 1.0 else (1.0 - tokens) / refill_per_second
+        return allowed, tokens, wait
+
+
+class RedisBuckets:
+    """Token buckets shared by all workers, updated atomically with a Lua script."""
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str, prefix: str = 'hopon:ratelimit:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from e
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(self.SCRIPT)
+
+    def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float, float]:
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[capacity, refill_per_second, time.time()])
+        tokens = float(tokens)
+        wait = 0.0 if tokens >= 1.0 else (1.0 - tokens) / refill_per_second
+        return bool(allowed), tokens, wait
+
+
+class RateLimiter:
+    """Applies per-route token buckets to decorated views."""
+
+    def __init__(self, enabled: bool = True, backend: str = 'memory', url: Optional[str] = None,
+                 overrides: Optional[Dict[str, str]] = None, ip_factor: float = 10.0):
+        if backend not in RATE_LIMIT_BACKENDS:
+            raise ValueError(f"RATE_LIMIT_BACKEND must be one of {RATE_LIMIT_BACKENDS}, got '{backend}'")
+        self.enabled = enabled
+        self.overrides = overrides or {}
+        self.ip_factor = ip_factor
+        if not enabled:
+            self.buckets = None
+        elif backend == 'redis':
+            self.buckets = RedisBuckets(url or 'redis://localhost:6379/0')
+        else:
+            self.buckets = MemoryBuckets()
+        self._limited: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'RateLimiter':
+        return cls(
+            enabled=config['RATE_LIMIT_ENABLED'],
+            backend=config['RATE_LIMIT_BACKEND'],
+            url=config['RATE_LIMIT_URL'],
+            overrides=parse_overrides(config['RATE_LIMITS']),
+            ip_factor=config['RATE_LIMIT_IP_FACTOR'],
+        )
+
+    def init_app(self, app) -> None:
+        app.extensions['rate_limiter'] = self
+
+    @staticmethod
+    def identity() -> str:
+        user = g.get('current_user')
+        if user is not None:
+            return f"user:{user.id}"
+        return f"ip:{request.remote_addr}"
+
+    def identities(self, account: Optional[Callable[[], Optional[str]]] = None) -> List[Tuple[str, float]]:
+        """(bucket identity, rate multiplier) pairs the request must all have a token in."""
+        identity = self.identity()
+        name = account() if account is not None and identity.startswith('ip:') else None
+        if not name:
+            return [(identity, 1.0)]
+        digest = hashlib.sha256(name.encode()).hexdigest()[:16]
+        return [(f"{identity}:account:{digest}", 1.0), (identity, self.ip_factor)]
+
+    def limit(self, rate: str, burst: Optional[int] = None,
+              account: Optional[Callable[[], Optional[str]]] = None):
+        """Limit a view to `rate` per caller, allowing bursts of `burst` (default: the rate count)."""
+        parse_rate(rate)
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                return self.call(view, args, kwargs, rate, burst, account)
+            return wrapper
+        return decorator
+
+    def call(self, view, args, kwargs, rate: str, burst: Optional[int] = None,
+             account: Optional[Callable[[], Optional[str]]] = None):
+        """Run `view` if the caller has a token left, else answer 429."""
+        if not self.enabled:
+            return view(*args, **kwargs)
+        # Overrides name the view function, without any blueprint prefix.
+        endpoint = (request.endpoint or view.__name__).rpartition('.')[2]
+        count, period = parse_rate(self.overrides.get(endpoint, rate))
+        capacity = float(burst) if burst and endpoint not in self.overrides else count
+        allowed, remaining, wait = True, capacity, 0.0
+        for identity, factor in self.identities(account):
+            ok, left, until = self.buckets.take(
+                f"{endpoint}:{identity}", capacity * factor, count * factor / period
+            )
+            allowed, remaining, wait = allowed and ok, min(remaining, left), max(wait, until)
+        if not allowed:
+            with self._lock:
+                self._limited[endpoint] = self._limited.get(endpoint, 0) + 1
+            response = jsonify({'error': 'Too many requests, please slow down.'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+            response.headers['X-RateLimit-Limit'] = f"{count:g}/{period:g}s"
+            return response
+        response = make_response(view(*args, **kwargs))
+        response.headers['X-RateLimit-Remaining'] = str(int(remaining))
+        return response
+
+    def stats(self) -> Dict:
+        with self._lock:
+            limited = dict(self._limited)
+        return {'enabled': self.enabled, 'limited': limited, 'overrides': dict(self.overrides)}
+
+
+def limit(rate: str, burst: Optional[int] = None, account: Optional[Callable[[], Optional[str]]] = None):
+    """``RateLimiter.limit`` for blueprint views, using the current app's limiter."""
+    parse_rate(rate)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return current_app.extensions['rate_limiter'].call(view, args, kwargs, rate, burst, account)
+        return wrapper
+    return decorator
+
+
+class LoadShedder:
+    """Rejects new requests with 503 while this worker or its DB pool is saturated."""
+
+    def __init__(self, max_inflight: int = 0, shed_on_pool_exhaustion: bool = True, retry_after: int = 1):
+        self.max_inflight = max_inflight
+        self.shed_on_pool_exhaustion = shed_on_pool_exhaustion
+        self.retry_after = retry_after
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._shed = {'inflight': 0, 'pool': 0}
+        self._peak_inflight = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'LoadShedder':
+        return cls(
+            max_inflight=config['SHED_MAX_INFLIGHT'],
+            shed_on_pool_exhaustion=config['SHED_ON_POOL_EXHAUSTION'],
+            retry_after=config['SHED_RETRY_AFTER'],
+        )
+
+    def init_app(self, app) -> None:
+        app.extensions['load_shedder'] = self
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        with self._lock:
+            self._inflight += 1
+            inflight = self._inflight
+            self._peak_inflight = max(self._peak_inflight, inflight)
+        g._counted_inflight = True
+        if request.path in EXEMPT_PATHS:
+            return None
+        if self.max_inflight and inflight > self.max_inflight:
+            return self._reject('inflight')
+        if self.shed_on_pool_exhaustion and self.pool_exhausted():
+            return self._reject('pool')
+        return None
+
+    def _teardown_request(self, exc=None):
+        if g.pop('_counted_inflight', False):
+            with self._lock:
+                self._inflight -= 1
+
+    @staticmethod
+    def pool_exhausted() -> bool:
+        """True when every connection the primary pool may open is checked out."""
+        db = current_app.extensions.get('sqlalchemy')
+        if db is None:
+            return False
+        pool = db.engine.pool
+        try:
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            return pool._max_overflow >= 0 and pool.checkedout() >= capacity
+        except AttributeError:
+            return False  # pools without a fixed size (NullPool, StaticPool) never queue
+
+    def _reject(self, reason: str):
+        with self._lock:
+            self._shed[reason] += 1
+        print(f"[HOPON] Shedding {request.method} {request.path} ({reason})", flush=True)
+        response = jsonify({'error': 'Server is busy, please retry shortly.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'inflight': self._inflight,
+                'peak_inflight': self._peak_inflight,
+                'max_inflight': self.max_inflight,
+                'shed': dict(self._shed),
+            }
@@ -0,0 +1,309 @@
+"""Event recommendations from sport, skill level and location affinity.
+
+Candidates are prefiltered in SQL with a bounding box around the user and
+then scored in one vectorized pass. Each component is normalized to
+[0, 1] and combined with ``WEIGHTS``:
+
+- sport: 1 when the event's sport is one the user plays
+- skill: closeness of the event's skill level to the user's
+- distance: halves every ``DISTANCE_SCALE_KM``
+- fill: how full the event is (full events are never recommended)
+- start: halves every ``START_SCALE_HOURS`` until the event starts
+
+Per-user features (sports, inferred skill, location) are cached and
+dropped when the user edits their profile or joins/leaves an event.
+"""
+import math
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, FrozenSet, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import func, or_, select
+
+import signals
+from geo import haversine_km_array
+from models import db, Event, EventParticipant, User, normalize_sport, parse_sports
+from serializers import EVENTS
+
+WEIGHTS = {
+    'sport': 0.35,
+    'skill': 0.15,
+    'distance': 0.25,
+    'fill': 0.10,
+    'start': 0.15,
+}
+DISTANCE_SCALE_KM = 10.0
+START_SCALE_HOURS = 48.0
+KM_PER_DEGREE = 111.32
+
+# Ordinal skill levels. 'All Levels' events (and unknown levels) fit anyone.
+SKILL_LEVELS = {'beginner': 0.0, 'intermediate': 1.0, 'advanced': 2.0}
+OPEN_SKILL_SCORE = 0.75
+UNKNOWN_USER_SKILL_SCORE = 0.5
+UNDATED_START_SCORE = 0.25
+
+
+def skill_rank(level: Optional[str]) -> float:
+    """Return the ordinal rank of a skill level, or NaN for open/unknown levels."""
+    if not level:
+        return math.nan
+    return SKILL_LEVELS.get(level.strip().lower(), math.nan)
+
+
+class SportVocabulary:
+    """Stable integer codes for sport names so overlap can be tested with np.isin."""
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def code(self, sport: Optional[str]) -> int:
+        key = normalize_sport(sport or '')
+        code = self._codes.get(key)
+        if code is None:
+            with self._lock:
+                code = self._codes.setdefault(key, len(self._codes))
+        return code
+
+    def known_codes(self, sports) -> np.ndarray:
+        return np.array([self._codes[s] for s in sports if s in self._codes], dtype=np.int32)
+
+
+SPORTS = SportVocabulary()
+
+
+class UserFeatures(NamedTuple):
+    sports: FrozenSet[str]
+    skill: float  # NaN when unknown
+    latitude: Optional[float]
+    longitude: Optional[float]
+    joined_event_ids: FrozenSet[int]
+
+
+class Candidates(NamedTuple):
+    """Column arrays for a candidate set, one entry per event."""
+    ids: np.ndarray
+    sport_codes: np.ndarray
+    skill: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+    current_players: np.ndarray
+    max_players: np.ndarray
+    hours_to_start: np.ndarray
+
+
+class FeatureCache:
+    """Thread-safe LRU of user id -> UserFeatures."""
+
+    def __init__(self, max_users: int = 5000):
+        self.max_users = max_users
+        self._items: "OrderedDict[int, UserFeatures]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[UserFeatures]:
+        with self._lock:
+            features = self._items.get(user_id)
+            if features is not None:
+                self._items.move_to_end(user_id)
+            return features
+
+    def put(self, user_id: int, features: UserFeatures) -> None:
+        with self._lock:
+            self._items[user_id] = features
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.max_users:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[int]) -> None:
+        if user_id is None:
+            return
+        with self._lock:
+            self._items.pop(user_id, None)
+
+
+def score_candidates(features: UserFeatures, candidates: Candidates,
+                     lat: Optional[float] = None, lng: Optional[float] = None) -> np.ndarray:
+    """Score every candidate at once. Ineligible candidates score -inf."""
+    n = len(candidates.ids)
+    if n == 0:
+        return np.zeros(0)
+
+    if features.sports:
+        sport_score = np.isin(candidates.sport_codes, SPORTS.known_codes(features.sports)).astype(np.float64)
+    else:
+        sport_score = np.full(n, 0.5)
+
+    if math.isnan(features.skill):
+        skill_score = np.full(n, UNKNOWN_USER_SKILL_SCORE)
+    else:
+        skill_score = 1.0 - np.abs(candidates.skill - features.skill) / 2.0
+        skill_score = np.where(np.isnan(candidates.skill), OPEN_SKILL_SCORE, skill_score)
+
+    if lat is None or lng is None:
+        lat, lng = features.latitude, features.longitude
+    if lat is not None and lng is not None:
+        distance = haversine_km_array(lat, lng, candidates.latitude, candidates.longitude)
+        distance_score = np.where(np.isnan(distance), 0.0, 0.5 ** (distance / DISTANCE_SCALE_KM))
+    else:
+        distance_score = np.zeros(n)
+
+    max_players = np.maximum(candidates.max_players, 1)
+    fill = candidates.current_players / max_players
+
+    hours = candidates.hours_to_start
+    start_score = np.where(np.isnan(hours), UNDATED_START_SCORE,
+                           0.5 ** (np.maximum(hours, 0.0) / START_SCALE_HOURS))
+
+    score = (
+        WEIGHTS['sport'] * sport_score
+        + WEIGHTS['skill'] * skill_score
+        + WEIGHTS['distance'] * distance_score
+        + WEIGHTS['fill'] * np.clip(fill, 0.0, 1.0)
+        + WEIGHTS['start'] * start_score
+    )
+    ineligible = (candidates.current_players >= candidates.max_players) | (hours < 0)
+    return np.where(ineligible, -np.inf, score)
+
+
+def top_k(scores: np.ndarray, eligible: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best eligible scores, best first."""
+    if eligible.size > k:
+        eligible = eligible[np.argpartition(-scores[eligible], k - 1)[:k]]
+    return eligible[np.argsort(-scores[eligible], kind='stable')]
+
+
+class RecommendationService:
+    """Loads candidates and user features and ranks events for a user."""
+
+    def __init__(self, radius_km: float = 50.0, max_candidates: int = 5000, cache_users: int = 5000):
+        self.radius_km = radius_km
+        self.max_candidates = max_candidates
+        self.features = FeatureCache(max_users=cache_users)
+
+    @classmethod
+    def from_config(cls, config) -> 'RecommendationService':
+        return cls(
+            radius_km=config['RECOMMEND_RADIUS_KM'],
+            max_candidates=config['RECOMMEND_MAX_CANDIDATES'],
+            cache_users=config['RECOMMEND_CACHE_USERS'],
+        )
+
+    def init_app(self, app) -> None:
+        app.extensions['recommendations'] = self
+        signals.user_updated.connect(self._on_user_changed, sender=app, weak=False)
+        signals.user_deleted.connect(self._on_user_changed, sender=app, weak=False)
+        signals.participant_joined.connect(self._on_user_changed, sender=app, weak=False)
+        signals.participant_left.connect(self._on_user_changed, sender=app, weak=False)
+
+    def _on_user_changed(self, sender, user_id=None, **kwargs):
+        self.features.invalidate(user_id)
+
+    # Features
+
+    def user_features(self, user: User) -> UserFeatures:
+        features = self.features.get(user.id)
+        if features is None:
+            features = self._load_features(user)
+            self.features.put(user.id, features)
+        return features
+
+    def _load_features(self, user: User) -> UserFeatures:
+        rows = db.session.execute(
+            select(EventParticipant.event_id, Event.skill_level)
+            .join(Event, Event.id == EventParticipant.event_id)
+            .where(EventParticipant.user_id == user.id)
+        ).all()
+        # Users have no skill field; infer it from the levels they play at.
+        levels = Counter(rank for rank in (skill_rank(level) for _, level in rows) if not math.isnan(rank))
+        skill = levels.most_common(1)[0][0] if levels else math.nan
+        return UserFeatures(
+            sports=parse_sports(user.sports),
+            skill=skill,
+            latitude=user.latitude,
+            longitude=user.longitude,
+            joined_event_ids=frozenset(event_id for event_id, _ in rows),
+        )
+
+    # Candidates
+
+    def load_candidates(self, user_id: int, lat: Optional[float], lng: Optional[float],
+                        radius_km: Optional[float] = None, exclude=()) -> Candidates:
+        """Upcoming (or undated) events inside a bounding box around lat/lng."""
+        now = datetime.utcnow()
+        radius_km = radius_km or self.radius_km
+        counts = (
+            select(EventParticipant.event_id, func.count(EventParticipant.id).label('n'))
+            .group_by(EventParticipant.event_id)
+            .subquery()
+        )
+        query = (
+            select(Event.id, Event.sport, Event.skill_level, Event.latitude, Event.longitude,
+                   Event.max_players, Event.event_date, func.coalesce(counts.c.n, 0))
+            .outerjoin(counts, counts.c.event_id == Event.id)
+            .where(or_(Event.event_date.is_(None), Event.event_date >= now))
+            .where(or_(Event.host_user_id.is_(None), Event.host_user_id != user_id))
+        )
+        if lat is not None and lng is not None:
+            dlat = radius_km / KM_PER_DEGREE
+            dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+            query = query.where(
+                Event.latitude.between(lat - dlat, lat + dlat),
+                Event.longitude.between(lng - dlng, lng + dlng),
+            )
+        query = query.order_by(Event.created_at.desc()).limit(self.max_candidates)
+        rows = [row for row in db.session.execute(query).all() if row[0] not in exclude]
+        return self.to_arrays(rows, now)
+
+    @staticmethod
+    def to_arrays(rows, now: datetime) -> Candidates:
+        nan = math.nan
+        return Candidates(
+            ids=np.array([r[0] for r in rows], dtype=np.int64),
+            sport_codes=np.array([SPORTS.code(r[1]) for r in rows], dtype=np.int32),
+            skill=np.array([skill_rank(r[2]) for r in rows], dtype=np.float64),
+            latitude=np.array([r[3] if r[3] is not None else nan for r in rows], dtype=np.float64),
+            longitude=np.array([r[4] if r[4] is not None else nan for r in rows], dtype=np.float64),
+            max_players=np.array([r[5] or 0 for r in rows], dtype=np.float64),
+            hours_to_start=np.array(
+                [(r[6] - now).total_seconds() / 3600.0 if r[6] else nan for r in rows], dtype=np.float64
+            ),
+            current_players=np.array([r[7] for r in rows], dtype=np.float64),
+        )
+
+    # Ranking
+
+    def recommend(self, user: User, lat: Optional[float] = None, lng: Optional[float] = None,
+                  radius_km: Optional[float] = None, limit: int = 20,
+                  skill_level: Optional[str] = None) -> List[Dict]:
+        features = self.user_features(user)
+        if skill_level:
+            features = features._replace(skill=skill_rank(skill_level))
+        if lat is None or lng is None:
+            lat, lng = features.latitude, features.longitude
+
+        candidates = self.load_candidates(user.id, lat, lng, radius_km, exclude=features.joined_event_ids)
+        scores = score_candidates(features, candidates, lat, lng)
+        eligible = np.flatnonzero(np.isfinite(scores))
+        if eligible.size == 0:
+            return []
+        top = top_k(scores, eligible, limit)
+
+        ranked_ids = [int(candidates.ids[i]) for i in top]
+        # One statement for the page: counts and hosts come with the rows.
+        events = {item['id']: item for item in EVENTS.all(EVENTS.select().where(Event.id.in_(ranked_ids)))}
+        distances = None
+        if lat is not None and lng is not None:
+            distances = haversine_km_array(lat, lng, candidates.latitude[top], candidates.longitude[top])
+
+        out = []
+        for position, index in enumerate(top):
+            item = events.get(int(candidates.ids[index]))
+            if item is None:
+                continue
+            distance = float(distances[position]) if distances is not None else math.nan
+            item['distance_km'] = None if math.isnan(distance) else distance
+            item['score'] = round(float(scores[index]), 4)
+            out.append(item)
+        return out
@@ -0,0 +1,274 @@
+"""Optional read-replica routing for read-only endpoints.
+
+When ``DATABASE_REPLICA_URL`` is set it is registered as the ``replica``
+bind and views decorated with ``@read_only`` run their queries against it:
+
+    @app.get('/events')
+    @read_only
+    def get_events():
+        ...
+
+Everything else, and any flush or INSERT/UPDATE/DELETE issued from a
+read-only view, goes to the primary. The replica is skipped (falling back
+to the primary) when:
+
+- the caller mutated something within the last ``REPLICA_STICKY_SECONDS``
+  (read-your-writes). Stickiness is kept in the signed session cookie, so
+  it also holds when the next request lands on another worker process,
+  and in process per user id. Anonymous callers are also tracked by client
+  address, but only behind a trusted ``ProxyFix`` (``PROXY_FIX_X_FOR``);
+  otherwise every client of a proxy would share the proxy's address, and
+  one write would send all of their reads to the primary;
+- the last health check found the replica unreachable or more than
+  ``REPLICA_MAX_LAG_SECONDS`` behind. Checks run at most every
+  ``REPLICA_CHECK_INTERVAL`` seconds;
+- a query on the replica fails with an OperationalError, in which case the
+  replica is marked down and the view is retried once on the primary.
+
+With ``READ_ONLY_SESSIONS`` enabled (the default), ``@read_only`` also puts
+the session in read-only mode for the duration of the view, with or without
+a replica:
+
+- autoflush is off, so queries skip the pending-changes check before each
+  statement, and commits do not expire loaded objects;
+- a flush or an INSERT/UPDATE/DELETE from the view is a violation.
+  ``READ_ONLY_VIOLATIONS=log`` prints it, counts it in ``/admin/metrics``
+  and lets the write go to the primary. ``raise`` fails the request with
+  ``ReadOnlyViolation``, which is meant for development and benchmarks.
+
+The identity map itself cannot be switched off for ORM entity loads, so
+list views select plain rows instead (see serializers.py).
+"""
+import contextlib
+import functools
+import threading
+import time
+from typing import Dict, Optional
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import OperationalError
+
+REPLICA_BIND_KEY = 'replica'
+USE_REPLICA = 'use_replica'
+READ_ONLY = 'read_only'
+READ_ONLY_VIOLATION_MODES = ('log', 'raise')
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+STICKY_SESSION_KEY = 'primary_until'
+
+# Postgres standby lag: zero when everything received has been replayed,
+# otherwise the age of the last replayed transaction. NULL on a primary.
+POSTGRES_LAG_SQL = sa.text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReadOnlyViolation(RuntimeError):
+    """A write was attempted while the session was in read-only mode."""
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica while ``info['use_replica']`` is set.
+
+    Writes always go to the primary, and the first write pins the session to
+    the primary for the rest of its life so later reads see it. While
+    ``info['read_only']`` holds a violation mode, writes are reported first.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if self.info.get(READ_ONLY) and (self._flushing or isinstance(clause, sa.UpdateBase)):
+            self._read_only_violation(clause)
+        if bind is None and self.info.get(USE_REPLICA):
+            if self._flushing or isinstance(clause, sa.UpdateBase):
+                self.info[USE_REPLICA] = False
+            else:
+                engine = self._db.engines.get(REPLICA_BIND_KEY)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _read_only_violation(self, clause) -> None:
+        mode = self.info.pop(READ_ONLY)
+        what = 'flush' if self._flushing else str(clause).split('\n', 1)[0]
+        endpoint = request.endpoint if has_request_context() else None
+        message = f"Write in read-only view {endpoint}: {what}"
+        if mode == 'raise':
+            raise ReadOnlyViolation(message)
+        # Report once per view; the write itself goes ahead on the primary.
+        print(f"[REPLICA] {message}", flush=True)
+        router = current_app.extensions.get('replicas')
+        if router is not None:
+            router.record_violation()
+
+
+@contextlib.contextmanager
+def read_only_session(session, violations: str = 'log'):
+    """Run a block with `session` in read-only mode (see the module docstring)."""
+    if violations not in READ_ONLY_VIOLATION_MODES:
+        raise ValueError(f"Unknown read-only violation mode '{violations}'. Expected one of {READ_ONLY_VIOLATION_MODES}")
+    previous = session.autoflush, session.expire_on_commit
+    session.autoflush = False
+    session.expire_on_commit = False
+    session.info[READ_ONLY] = violations
+    try:
+        yield session
+    finally:
+        session.info.pop(READ_ONLY, None)
+        session.autoflush, session.expire_on_commit = previous
+
+
+class ReplicaRouter:
+    """Decides per request whether the replica may serve a read-only view."""
+
+    def __init__(self, url: Optional[str] = None, sticky_seconds: float = 5.0,
+                 max_lag_seconds: float = 5.0, check_interval: float = 10.0,
+                 max_sticky_entries: int = 100_000, trust_client_address: bool = False):
+        self.url = url
+        self.trust_client_address = trust_client_address
+        self.sticky_seconds = sticky_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.max_sticky_entries = max_sticky_entries
+        self._sticky: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._healthy = True
+        self._lag: Optional[float] = None
+        self._checked_at = 0.0
+        self._stats = {'replica_reads': 0, 'primary_reads': 0, 'sticky': 0, 'unhealthy': 0, 'fallbacks': 0,
+                       'read_only_violations': 0}
+
+    @classmethod
+    def from_config(cls, config) -> 'ReplicaRouter':
+        return cls(
+            url=config['DATABASE_REPLICA_URL'],
+            sticky_seconds=config['REPLICA_STICKY_SECONDS'],
+            max_lag_seconds=config['REPLICA_MAX_LAG_SECONDS'],
+            check_interval=config['REPLICA_CHECK_INTERVAL'],
+            trust_client_address=config['PROXY_FIX_X_FOR'] > 0,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def init_app(self, app) -> None:
+        app.extensions['replicas'] = self
+        if self.enabled:
+            app.after_request(self._after_request)
+
+    # Stickiness
+
+    def _client_keys(self):
+        user = g.get('current_user')
+        if user is not None:
+            return [f"user:{user.id}"]
+        if self.trust_client_address:
+            return [f"ip:{request.remote_addr}"]
+        return []
+
+    def _after_request(self, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        until = time.time() + self.sticky_seconds
+        with self._lock:
+            for key in self._client_keys():
+                self._sticky[key] = until
+            if len(self._sticky) > self.max_sticky_entries:
+                now = time.time()
+                self._sticky = {k: v for k, v in self._sticky.items() if v > now}
+        session[STICKY_SESSION_KEY] = until
+        return response
+
+    def is_sticky(self) -> bool:
+        now = time.time()
+        if session.get(STICKY_SESSION_KEY, 0) > now:
+            return True
+        with self._lock:
+            return any(self._sticky.get(key, 0) > now for key in self._client_keys())
+
+    # Health
+
+    def healthy(self, engine) -> bool:
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return self._healthy
+        self._checked_at = now
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name == 'postgresql':
+                    lag = conn.execute(POSTGRES_LAG_SQL).scalar()
+                    self._lag = float(lag) if lag is not None else 0.0
+                else:
+                    conn.execute(sa.text('SELECT 1'))
+                    self._lag = 0.0
+            healthy = self._lag <= self.max_lag_seconds
+            if not healthy:
+                print(f"[REPLICA] Lag {self._lag:.1f}s exceeds {self.max_lag_seconds}s; reading from primary", flush=True)
+        except Exception as e:
+            print(f"[REPLICA] Health check failed: {e}", flush=True)
+            healthy = False
+        self._healthy = healthy
+        return healthy
+
+    def mark_down(self, error: Exception) -> None:
+        print(f"[REPLICA] Query failed, falling back to primary: {error}", flush=True)
+        self._healthy = False
+        self._checked_at = time.time()
+        self._stats['fallbacks'] += 1
+
+    # Routing
+
+    def use_replica(self, db) -> bool:
+        """Route the current request's session to the replica if it is safe to."""
+        engine = db.engines.get(REPLICA_BIND_KEY)
+        if engine is None or not has_request_context():
+            return False
+        if self.is_sticky():
+            reason = 'sticky'
+        elif not self.healthy(engine):
+            reason = 'unhealthy'
+        else:
+            db.session.info[USE_REPLICA] = True
+            self._stats['replica_reads'] += 1
+            return True
+        self._stats[reason] += 1
+        self._stats['primary_reads'] += 1
+        return False
+
+    def record_violation(self) -> None:
+        self._stats['read_only_violations'] += 1
+
+    def stats(self) -> Dict:
+        return dict(
+            self._stats,
+            enabled=self.enabled,
+            healthy=self._healthy,
+            lag_seconds=self._lag,
+        )
+
+
+def read_only(view):
+    """Mark a view as read-only so it may be served from the replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        db = current_app.extensions['sqlalchemy']
+        if not current_app.config['READ_ONLY_SESSIONS']:
+            return _routed(view, db, args, kwargs)
+        with read_only_session(db.session(), current_app.config['READ_ONLY_VIOLATIONS']):
+            return _routed(view, db, args, kwargs)
+    return wrapper
+
+
+def _routed(view, db, args, kwargs):
+    router = current_app.extensions.get('replicas')
+    if router is None or not router.enabled or not router.use_replica(db):
+        return view(*args, **kwargs)
+    try:
+        return view(*args, **kwargs)
+    except OperationalError as e:
+        router.mark_down(e)
+        db.session.rollback()
+        db.session.info[USE_REPLICA] = False
+        return view(*args, **kwargs)
@@ -0,0 +1,201 @@
+"""Batch joins and leaves for one event (``POST /events/<id>/roster``).
+
+A group signup sends every join and leave in one request. The entries are
+applied in order in the caller's transaction:
+
+- the players the batch names are looked up with one query, and the event's
+  player count with another (guests through the guest token index); the
+  event row is locked by the caller;
+- each entry is checked against that in-memory state, so a leave earlier in
+  the batch frees a spot for a later join and duplicates are reported
+  instead of inserted;
+- while players are waiting, a free spot belongs to the head of the
+  waitlist (as with ``waitlist.promote``): a join for the next player in
+  line moves them from the waitlist into the spot, and any other join is
+  reported ``full``. Spots nobody in the batch takes are promoted by the
+  caller afterwards;
+- the outcome is written with one bulk DELETE and one bulk INSERT, plus one
+  DELETE for the waitlist entries that were taken up.
+
+Registered players can only be added or removed by themselves or by the
+event's host. Guests are identified by their guest token, which is stored
+hashed as with single joins.
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, or_, select
+
+import guests
+from models import db, Event, EventParticipant, User, WaitlistEntry
+
+ACTIONS = ('join', 'leave')
+DEFAULT_TEAM = 'team_a'
+MAX_ENTRIES = 50
+
+Identity = Tuple[str, object]  # ('user', user_id) or ('guest', hashed token)
+
+
+class RosterOutcome(NamedTuple):
+    results: List[Dict]
+    joined_user_ids: List[Optional[int]]  # None for guests
+    left_user_ids: List[Optional[int]]
+
+
+def _parse(index: int, entry, caller: Optional[User], is_host: bool) -> Dict:
+    """Normalize one entry, or return it with an 'error'."""
+    if not isinstance(entry, dict):
+        return {'index': index, 'error': 'Entry must be an object'}
+    action = entry.get('action')
+    parsed = {'index': index, 'action': action}
+    if action not in ACTIONS:
+        return dict(parsed, error=f"action must be one of {', '.join(ACTIONS)}")
+    team = entry.get('team', DEFAULT_TEAM)
+    if not isinstance(team, str) or len(team) > 20:
+        return dict(parsed, error='team must be a string of at most 20 characters')
+    parsed['team'] = team
+
+    user_id = entry.get('user_id')
+    if user_id is None and 'player_name' not in entry and 'guest_token' not in entry:
+        # A bare entry means the caller themselves.
+        if caller is None:
+            return dict(parsed, error='Authentication required')
+        user_id = caller.id
+    if user_id is not None:
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
+            return dict(parsed, error='user_id must be an integer')
+        if caller is None:
+            return dict(parsed, error='Authentication required')
+        if user_id != caller.id and not is_host:
+            return dict(parsed, error="Only the host can change another player's spot")
+        return dict(parsed, identity=('user', user_id), user_id=user_id)
+
+    guest_token = entry.get('guest_token')
+    if guest_token is not None and (not isinstance(guest_token, str) or not guest_token):
+        return dict(parsed, error='guest_token must be a non-empty string')
+    if action == 'leave':
+        if guest_token is None:
+            return dict(parsed, error='guest_token is required for guest users')
+    else:
+        player_name = entry.get('player_name')
+        if not isinstance(player_name, str) or not player_name.strip() or len(player_name) > 100:
+            return dict(parsed, error='Player name is required')
+        parsed['player_name'] = player_name
+        if guest_token is None:
+            guest_token = guests.new_token()
+    parsed['guest_token'] = guest_token
+    parsed['identity'] = ('guest', guests.hash_token(guest_token))
+    return parsed
+
+
+def _result(entry: Dict, status: str) -> Dict:
+    result = {'index': entry['index'], 'action': entry['action'], 'status': status}
+    for key in ('user_id', 'player_name', 'guest_token', 'error'):
+        if key in entry:
+            result[key] = entry[key]
+    return result
+
+
+def apply_roster(event: Event, entries: List, caller: Optional[User]) -> RosterOutcome:
+    """Apply `entries` in order to `event` without committing.
+
+    Statuses: joined, already_joined, full, left, not_participant, error.
+    """
+    is_host = caller is not None and caller.id == event.host_user_id
+    parsed = [_parse(index, entry, caller, is_host) for index, entry in enumerate(entries)]
+    valid = [entry for entry in parsed if 'error' not in entry]
+
+    user_ids = {entry['user_id'] for entry in valid if 'user_id' in entry}
+    token_hashes = {entry['identity'][1] for entry in valid if entry['identity'][0] == 'guest'}
+    usernames = dict(db.session.execute(
+        select(User.id, User.username).where(User.id.in_(user_ids))
+    ).all()) if user_ids else {}
+
+    current: Dict[Identity, Tuple[int, Optional[int]]] = {}  # identity -> (participant id, user id)
+    conditions = []
+    if user_ids:
+        conditions.append(EventParticipant.user_id.in_(user_ids))
+    if token_hashes:
+        conditions.append(EventParticipant.guest_token.in_(token_hashes))
+    if conditions:
+        rows = db.session.execute(
+            select(EventParticipant.id, EventParticipant.user_id, EventParticipant.guest_token)
+            .where(EventParticipant.event_id == event.id, or_(*conditions))
+        ).all()
+        for participant_id, user_id, token_hash in rows:
+            identity = ('user', user_id) if user_id is not None else ('guest', token_hash)
+            current[identity] = (participant_id, user_id)
+    count = db.session.execute(
+        select(func.count(EventParticipant.id)).where(EventParticipant.event_id == event.id)
+    ).scalar()
+    # The batch can fill at most the spots free now plus one per leave, so
+    # only that many entries from the head of the waitlist can matter.
+    reach = max(event.max_players - count, 0) + sum(1 for entry in valid if entry['action'] == 'leave')
+    queue: List[Tuple[int, Identity]] = []
+    if reach:
+        queue = [
+            (entry_id, ('user', user_id) if user_id is not None else ('guest', token_hash))
+            for entry_id, user_id, token_hash in db.session.execute(
+                select(WaitlistEntry.id, WaitlistEntry.user_id, WaitlistEntry.guest_token)
+                .where(WaitlistEntry.event_id == event.id)
+                .order_by(WaitlistEntry.position)
+                .limit(reach)
+            ).all()
+        ]
+    # Fewer rows than `reach` means the whole waitlist was read.
+    more_waiting = bool(queue) and len(queue) == reach
+    taken: List[int] = []  # waitlist entries moved into a spot
+
+    inserts: Dict[Identity, Dict] = {}
+    deletes: List[int] = []
+    left_user_ids: List[Optional[int]] = []
+    results = []
+    for entry in parsed:
+        if 'error' in entry:
+            results.append(_result(entry, 'error'))
+            continue
+        identity = entry['identity']
+        if entry['action'] == 'join':
+            if 'user_id' in entry and entry['user_id'] not in usernames:
+                results.append(_result(dict(entry, error='User not found'), 'error'))
+            elif identity in current or identity in inserts:
+                results.append(_result(entry, 'already_joined'))
+            elif count >= event.max_players or (queue[0][1] != identity if queue else more_waiting):
+                results.append(_result(entry, 'full'))
+            else:
+                if queue:
+                    taken.append(queue.pop(0)[0])
+                is_user = identity[0] == 'user'
+                inserts[identity] = {
+                    'event_id': event.id,
+                    'user_id': entry['user_id'] if is_user else None,
+                    'player_name': usernames[entry['user_id']] if is_user else entry['player_name'],
+                    'team': entry['team'],
+                    'guest_name': None if is_user else entry['player_name'],
+                    'guest_token': None if is_user else identity[1],
+                }
+                count += 1
+                results.append(_result(entry, 'joined'))
+        elif identity in inserts:
+            del inserts[identity]
+            count -= 1
+            results.append(_result(entry, 'left'))
+        elif identity in current:
+            participant_id, user_id = current.pop(identity)
+            deletes.append(participant_id)
+            left_user_ids.append(user_id)
+            count -= 1
+            results.append(_result(entry, 'left'))
+        else:
+            results.append(_result(entry, 'not_participant'))
+
+    if deletes:
+        db.session.execute(delete(EventParticipant).where(EventParticipant.id.in_(deletes)))
+    if taken:
+        db.session.execute(delete(WaitlistEntry).where(WaitlistEntry.id.in_(taken)))
+    if inserts:
+        db.session.execute(insert(EventParticipant), list(inserts.values()))
+    return RosterOutcome(
+        results=results,
+        joined_user_ids=[row['user_id'] for row in inserts.values()],
+        left_user_ids=left_user_ids,
+    )
@@ -0,0 +1,13 @@
+"""HTTP routes, one blueprint per area.
+
+Blueprints keep their original endpoint paths (no url_prefix); endpoint
+names gain the blueprint prefix, e.g. ``auth.login``.
+"""
+from routes import admin, auth, events, users
+
+BLUEPRINTS = (auth.bp, events.bp, users.bp, admin.bp)
+
+
+def register_blueprints(app) -> None:
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
@@ -0,0 +1,104 @@
+"""Admin routes, guarded by the X-Admin-Secret header (ADMIN_SECRET)."""
+import os
+
+from flask import Blueprint, current_app, jsonify, request
+
+import accounts
+import jobs
+from models import db, User
+from ratelimit import limit
+
+bp = Blueprint('admin', __name__)
+
+
+@bp.post("/admin/users/delete")
+@limit('10/minute')
+def admin_delete_user():
+    """Admin endpoint to delete a user and all associated data. Restricted to development/admin only."""
+    # Simple check - in production, you would add proper authentication
+    # For now, allow this endpoint (you can add JWT/API key validation later)
+    
+    data = request.get_json(silent=True) or {}
+    identifier = data.get('identifier')
+    
+    if not identifier:
+        return jsonify({'error': 'identifier parameter is required'}), 400
+    
+    try:
+        # Find user by username or ID
+        user = None
+        if isinstance(identifier, int) or (isinstance(identifier, str) and identifier.isdigit()):
+            user = User.query.filter_by(id=int(identifier)).first()
+        else:
+            user = User.query.filter_by(username=identifier).first()
+        
+        if not user:
+            print(f"[HOPON] Admin delete failed: User '{identifier}' not found", flush=True)
+            return jsonify({'error': f'User {identifier} not found'}), 404
+        
+        username = user.username
+        user_id = user.id
+        
+        counts = accounts.delete_user_data(user_id, chunk_size=current_app.config['DELETE_CHUNK_SIZE'], app=current_app._get_current_object())
+        
+        print(f"[HOPON] Admin deleted user: {username} (ID: {user_id}). Counts: {counts}", flush=True)
+        
+        return jsonify({
+            'message': f'User {username} successfully deleted',
+            'username': username,
+            'follows_deleted': counts['follows'],
+            'participations_deleted': counts['participations'],
+            'events_deleted': counts['events']
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"[HOPON] Error in admin delete user: {str(e)}", flush=True)
+        return jsonify({'error': f'Failed to delete user: {str(e)}'}), 500
+
+
+@bp.get("/admin/metrics")
+def admin_metrics():
+    """Cache, replica, rate limit, load shedding, password hashing, job queue, outbox and token verification counters. Requires ADMIN_SECRET header."""
+    admin_secret = os.environ.get('ADMIN_SECRET', 'dev-admin-secret')
+    if request.headers.get('X-Admin-Secret', '') != admin_secret:
+        return jsonify({'error': 'Unauthorized'}), 401
+    extensions = current_app.extensions
+    return jsonify({
+        'response_cache': extensions['response_cache'].stats(),
+        'replicas': extensions['replicas'].stats(),
+        'rate_limits': extensions['rate_limiter'].stats(),
+        'load_shedding': extensions['load_shedder'].stats(),
+        'password_hashing': extensions['password_hasher'].stats(),
+        'jobs': jobs.queue_stats(),
+        'outbox': extensions['outbox'].stats(),
+        'tokens': extensions['tokens'].stats(),
+    }), 200
+
+
+@bp.post("/admin/delete-user-by-username/<username>")
+@limit('10/minute')
+def admin_delete_user_by_username(username):
+    """Admin endpoint to delete a user by username. Requires ADMIN_SECRET header."""
+    admin_secret = os.environ.get('ADMIN_SECRET', 'dev-admin-secret')
+    provided_secret = request.headers.get('X-Admin-Secret', '')
+    
+    if provided_secret != admin_secret:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    user = User.query.filter(db.func.lower(User.username) == username.lower()).first()
+    if not user:
+        return jsonify({'error': f'User "{username}" not found'}), 404
+    
+    user_id = user.id
+    print(f"[ADMIN] Deleting user: {user.username} (ID: {user_id}), Sports: {user.sports}", flush=True)
+    
+    counts = accounts.delete_user_data(user_id, chunk_size=current_app.config['DELETE_CHUNK_SIZE'], app=current_app._get_current_object())
+    
+    return jsonify({
+        'message': f'User "{username}" deleted successfully',
+        'user_id': user_id,
+        'event_participants_deleted': counts['participations'],
+        'events_deleted': counts['events'],
+        'follows_deleted': counts['follows']
+    }), 200
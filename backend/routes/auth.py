@@ -0,0 +1,840 @@
+"""Auth routes: Google OAuth, email/password, tokens, sessions and profile setup."""
+import json
+import threading
+from datetime import datetime
+
+from flask import Blueprint, current_app, g, jsonify, make_response, redirect, request, session, url_for
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+import accounts
+import guests
+import outbox
+import signals
+from models import db, User
+from passwords import HasherBusy
+from ratelimit import json_field, limit
+from tokens import (
+    decode_token,
+    end_refresh_session,
+    generate_token,
+    revoke_token,
+    rotate_refresh_token,
+    start_refresh_session,
+)
+
+bp = Blueprint('auth', __name__)
+
+_oauth_lock = threading.Lock()
+
+
+def get_google_client():
+    """The registered Google OAuth client, or None when Google is not configured.
+
+    Authlib (and requests, which it imports) is loaded on first use, so
+    workers that never serve a Google login do not pay for it at boot.
+    """
+    app = current_app._get_current_object()
+    if not (app.config['GOOGLE_CLIENT_ID'] and app.config['GOOGLE_CLIENT_SECRET']):
+        return None
+    oauth = app.extensions.get('google_oauth')
+    if oauth is None:
+        with _oauth_lock:
+            oauth = app.extensions.get('google_oauth')
+            if oauth is None:
+                from authlib.integrations.flask_client import OAuth
+
+                oauth = OAuth(app)
+                oauth.register(
+                    name='google',
+                    client_id=app.config['GOOGLE_CLIENT_ID'],
+                    client_secret=app.config['GOOGLE_CLIENT_SECRET'],
+                    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+                    client_kwargs={
+                        'scope': 'openid email profile',
+                        'prompt': 'select_account',
+                        'access_type': 'offline',
+                        'default_timeout': app.config['OAUTH_TIMEOUT'],
+                    },
+                )
+                app.extensions['google_oauth'] = oauth
+    return oauth.create_client('google')
+
+
+def ensure_unique_username(base: str) -> str:
+    candidate = base
+    suffix = 1
+    while User.query.filter_by(username=candidate).first():
+        candidate = f"{base}{suffix}"
+        suffix += 1
+    return candidate
+
+
+def hasher_busy():
+    response = jsonify({'error': 'Server is busy, please retry shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(current_app.config['SHED_RETRY_AFTER'])
+    return response
+
+
+@bp.before_app_request
+def attach_current_user():
+    g.current_user = None
+    auth_header = request.headers.get('Authorization', '')
+    print(f"[DEBUG] ==== REQUEST: {request.method} {request.path} ====", flush=True)
+    print(f"[DEBUG] Authorization header present: {bool(auth_header)}", flush=True)
+    if auth_header:
+        print(f"[DEBUG] Auth header value (first 50 chars): {auth_header[:50]}", flush=True)
+    if auth_header.startswith('Bearer '):
+        token = auth_header.split(' ', 1)[1].strip()
+        print(f"[DEBUG] Token extracted (length: {len(token)}, first 30 chars): {token[:30]}...", flush=True)
+        payload = decode_token(token, expected_type='access')
+        print(f"[DEBUG] Token validation result: {payload}", flush=True)
+        if payload:
+            user = User.query.get(payload.get('sub'))
+            print(f"[DEBUG] User query result: {user}", flush=True)
+            if user:
+                g.current_user = user
+                print(f"[DEBUG] Current user set to: {user.username}", flush=True)
+    else:
+        print(f"[DEBUG] No Bearer token in Authorization header", flush=True)
+
+
+@bp.get("/auth/google/login")
+def google_login():
+    frontend_origins = current_app.config['FRONTEND_ORIGINS']
+    client = get_google_client()
+    # If Google OAuth is not configured, and dev mode is enabled, redirect
+    # to a development-only callback that simulates a Google sign-in.
+    if client is None:
+        if current_app.config.get('DEV_GOOGLE_LOGIN'):
+            # preserve next/origin in session and redirect to the dev flow
+            next_url = request.args.get('next')
+            next_origin = None
+            if isinstance(next_url, str):
+                try:
+                    from urllib.parse import urlparse
+
+                    parsed = urlparse(next_url)
+                    candidate_origin = f"{parsed.scheme}://{parsed.netloc}"
+                    if candidate_origin in frontend_origins:
+                        next_origin = candidate_origin
+                except Exception:
+                    next_origin = None
+
+            session['oauth_next'] = next_origin or frontend_origins[0]
+            # Allow optional `email` and `name` query params to customize the dev user.
+            dev_redirect = url_for('auth.google_dev', _external=True)
+            return redirect(dev_redirect)
+        return jsonify({'error': 'Google OAuth is not configured. Set GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET or enable DEV_GOOGLE_LOGIN for local testing.'}), 500
+    # The frontend should pass its origin as the `next` param (e.g. window.location.origin)
+    next_url = request.args.get('next')
+    next_origin = frontend_origins[0]  # Default to first allowed origin
+    if isinstance(next_url, str):
+        try:
+            from urllib.parse import urlparse
+
+            parsed = urlparse(next_url)
+            candidate_origin = f"{parsed.scheme}://{parsed.netloc}"
+            if candidate_origin in frontend_origins:
+                next_origin = candidate_origin
+        except Exception:
+            pass
+
+    # Store the next URL in the session for the callback to retrieve
+    session['oauth_next'] = next_origin
+    # Use the configured GOOGLE_REDIRECT_URI from environment (not auto-generated URL)
+    # to ensure it matches what's registered in Google Cloud Console
+    redirect_uri = current_app.config['GOOGLE_REDIRECT_URI']
+    return client.authorize_redirect(redirect_uri)
+
+
+@bp.get("/auth/google/callback")
+def google_callback():
+    frontend_origins = current_app.config['FRONTEND_ORIGINS']
+    try:
+        client = get_google_client()
+        if client is None:
+            return jsonify({'error': 'Google OAuth is not configured on this server.'}), 400
+        token = client.authorize_access_token()
+    except Exception as exc:  # noqa: W0703 - surface error to client
+        return jsonify({'error': f'Failed to authorize with Google: {exc}'}), 400
+
+    userinfo = token.get('userinfo')
+    if not userinfo:
+        try:
+            userinfo = client.parse_id_token(token)
+        except Exception as exc:  # noqa: W0703
+            return jsonify({'error': f'Failed to fetch Google user info: {exc}'}), 400
+
+    google_sub = userinfo.get('sub')
+    email = userinfo.get('email')
+    if not google_sub or not email:
+        return jsonify({'error': 'Google profile is missing required information (sub, email).'}), 400
+
+    user = User.query.filter(or_(User.google_sub == google_sub, User.email == email)).first()
+    display_name = userinfo.get('name') or email.split('@')[0]
+    given_name = userinfo.get('given_name') or display_name
+    username_seed = "".join(ch if ch.isalnum() else "_" for ch in given_name.lower()).strip("_") or "player"
+    
+    is_new_user = not user
+    needs_username_setup = False
+
+    if not user:
+        # Create user with temporary username that will be updated
+        username = ensure_unique_username(username_seed)
+        user = User(
+            username=username,
+            email=email,
+            bio=userinfo.get('profile'),
+            gender=None,
+            rating=None,
+            location=None,
+            sports=None,
+            google_sub=google_sub,
+            avatar_url=userinfo.get('picture'),
+        )
+        db.session.add(user)
+        needs_username_setup = True
+    else:
+        user.google_sub = user.google_sub or google_sub
+        if userinfo.get('picture'):
+            user.avatar_url = userinfo.get('picture')
+
+    db.session.commit()
+
+    access_token = generate_token(user.id, 'access')
+    refresh_token = start_refresh_session(user.id)
+    db.session.commit()
+
+    payload = {
+        'message': 'Login successful',
+        'user': user.to_dict(),
+        'access_token': access_token,
+        'needs_username_setup': needs_username_setup,
+    }
+    redirect_target = session.pop('oauth_next', frontend_origins[0])
+    # Ensure redirect_target is one of the allowed frontend origins
+    if redirect_target not in frontend_origins:
+        redirect_target = frontend_origins[0]
+
+    # Properly escape JSON for embedding in HTML using JSON string
+    payload_json = json.dumps(payload)
+    
+    script = f"""<!DOCTYPE html>
+<html lang="en">
+  <head>
+    <meta charset="utf-8" />
+    <title>Signing in…</title>
+  </head>
+  <body>
+    <script>
+      (function() {{
+        const payload = {payload_json};
+        console.log('Received payload:', payload);
+        if (window.opener && window.opener !== window) {{
+            console.log('Posting message to opener');
+            window.opener.postMessage({{ type: "hopon:auth", payload: payload }}, "*");
+            setTimeout(() => {{ window.close(); }}, 100);
+        }} else {{
+            console.log('No opener, redirecting to: {redirect_target}');
+            window.localStorage.setItem("hoponAuthPayload", JSON.stringify(payload));
+            window.location.replace("{redirect_target}");
+        }}
+      }})();
+    </script>
+    <p>Signing you in…</p>
+  </body>
+</html>"""
+
+    response = make_response(script)
+    response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    response.set_cookie(
+        'refresh_token',
+        refresh_token,
+        max_age=current_app.config['JWT_REFRESH_EXPIRES'],
+        httponly=True,
+        secure=current_app.config['SESSION_COOKIE_SECURE'],
+        samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+    )
+    return response
+
+
+@bp.get('/auth/google/dev')
+def google_dev():
+    """Development-only: simulate a Google OAuth callback.
+
+    This endpoint creates or finds a user using the provided `email` and
+    optional `name` query params (or generates defaults), issues JWT
+    tokens, sets the refresh cookie, and returns the same HTML payload
+    that the real Google callback returns so the frontend popup flow
+    can be exercised locally without real Google credentials.
+    """
+    # Only allow in non-production when enabled explicitly
+    if current_app.config.get('ENV') == 'production' or not current_app.config.get('DEV_GOOGLE_LOGIN'):
+        return jsonify({'error': 'Dev Google login is not allowed in production.'}), 403
+    frontend_origins = current_app.config['FRONTEND_ORIGINS']
+
+    # Determine the frontend origin to post back to
+    next_url = request.args.get('next') or session.get('oauth_next')
+    next_origin = None
+    if isinstance(next_url, str):
+        try:
+            from urllib.parse import urlparse
+
+            parsed = urlparse(next_url)
+            candidate_origin = f"{parsed.scheme}://{parsed.netloc}"
+            if candidate_origin in frontend_origins:
+                next_origin = candidate_origin
+        except Exception:
+            next_origin = None
+    redirect_target = next_origin or frontend_origins[0]
+
+    # Allow developer to pass email/name for deterministic testing
+    email = request.args.get('email') or f"dev+{int(datetime.utcnow().timestamp())}@example.com"
+    name = request.args.get('name') or email.split('@')[0]
+
+    # Reuse user creation logic similar to google_callback
+    google_sub = f"dev:{email}"
+    user = User.query.filter(or_(User.google_sub == google_sub, User.email == email)).first()
+    display_name = name
+    given_name = name
+    username_seed = "".join(ch if ch.isalnum() else "_" for ch in given_name.lower()).strip("_") or "player"
+    
+    is_new_user = not user
+    needs_username_setup = False
+
+    if not user:
+        username = ensure_unique_username(username_seed)
+        user = User(
+            username=username,
+            email=email,
+            bio='Development user (Google dev login)',
+            gender=None,
+            rating=None,
+            location=None,
+            sports=None,
+            google_sub=google_sub,
+            avatar_url=None,
+        )
+        db.session.add(user)
+        needs_username_setup = True
+    else:
+        user.google_sub = user.google_sub or google_sub
+
+    db.session.commit()
+
+    access_token = generate_token(user.id, 'access')
+    refresh_token = start_refresh_session(user.id)
+    db.session.commit()
+
+    payload = {
+        'message': 'Dev login successful',
+        'user': user.to_dict(),
+        'access_token': access_token,
+        'needs_username_setup': needs_username_setup,
+    }
+
+    script = f"""<!DOCTYPE html>
+<html lang=\"en\">\n  <head>\n    <meta charset=\"utf-8\" />\n    <title>Signing in…</title>\n  </head>\n  <body>\n    <script>\n      (function() {{\n        const payload = {json.dumps(payload)};\n                if (window.opener && window.opener !== window) {{\n                    window.opener.postMessage({{ type: \"hopon:auth\", payload }}, \"{redirect_target}\");\n                    window.close();\n                }} else {{\n                    window.localStorage.setItem(\"hoponAuthPayload\", JSON.stringify(payload));\n                    window.location.replace(\"{redirect_target}\");\n                }}\n      }})();\n    </script>\n    <p>Signing you in…</p>\n  </body>\n</html>"""
+
+    response = make_response(script)
+    response.headers['Content-Type'] = 'text/html'
+    response.set_cookie(
+        'refresh_token',
+        refresh_token,
+        max_age=current_app.config['JWT_REFRESH_EXPIRES'],
+        httponly=True,
+        secure=current_app.config['SESSION_COOKIE_SECURE'],
+        samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+    )
+    return response
+
+
+@bp.post("/auth/refresh")
+def refresh_access_token():
+    """Exchange the refresh cookie for an access token, rotating the refresh token."""
+    refresh_token = request.cookies.get('refresh_token')
+    if not refresh_token:
+        return jsonify({'error': 'Missing refresh token'}), 401
+    user_id, new_refresh_token = rotate_refresh_token(refresh_token)
+    # Commits the rotation, or the end of a session whose token was reused.
+    db.session.commit()
+    user = db.session.get(User, user_id) if user_id is not None else None
+    if not user:
+        response = make_response(jsonify({'error': 'Invalid refresh token'}), 401)
+        response.set_cookie(
+            'refresh_token',
+            '',
+            max_age=0,
+            httponly=True,
+            secure=current_app.config['SESSION_COOKIE_SECURE'],
+            samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+        )
+        return response
+    access_token = generate_token(user.id, 'access')
+    response = jsonify({'access_token': access_token, 'user': user.to_dict()})
+    # None: a parallel refresh already rotated the cookie; keep that one.
+    if new_refresh_token:
+        response.set_cookie(
+            'refresh_token',
+            new_refresh_token,
+            max_age=current_app.config['JWT_REFRESH_EXPIRES'],
+            httponly=True,
+            secure=current_app.config['SESSION_COOKIE_SECURE'],
+            samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+        )
+    return response
+
+
+@bp.post("/auth/demo-login")
+def demo_login():
+    """Development-only: create/find a user and return tokens for local testing.
+    This endpoint should NOT be enabled in production unless intentionally.
+    """
+    if current_app.config.get('ENV') == 'production':
+        return jsonify({'error': 'Demo login not allowed in production'}), 403
+
+    data = request.get_json(silent=True) or {}
+    username = (data.get('username') or 'dev_user').strip()
+    email = data.get('email') or f"{username}@example.com"
+
+    # Prefer find by email, otherwise create a new user
+    user = User.query.filter_by(email=email).first()
+
+    if not user:
+        username_final = ensure_unique_username(username)
+        user = User(
+            username=username_final,
+            email=email,
+            bio='Development user',
+            gender=None,
+            rating=None,
+            location=None,
+            sports=None,
+            google_sub=None,
+            avatar_url=None,
+        )
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            user = User.query.filter_by(email=email).first()
+
+    access_token = generate_token(user.id, 'access')
+    refresh_token = start_refresh_session(user.id)
+    db.session.commit()
+
+    response = jsonify({'access_token': access_token, 'user': user.to_dict()})
+    response.set_cookie(
+        'refresh_token',
+        refresh_token,
+        max_age=current_app.config['JWT_REFRESH_EXPIRES'],
+        httponly=True,
+        secure=current_app.config['SESSION_COOKIE_SECURE'],
+        samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+    )
+    return response
+
+
+@bp.post("/auth/signup")
+@limit('5/minute', account=json_field('email'))
+def signup():
+    """Create a new user account with email and password."""
+    data = request.get_json(silent=True) or {}
+    
+    # Validate required fields
+    email = (data.get('email') or '').strip().lower()
+    password = data.get('password') or ''
+    username = (data.get('username') or '').strip()
+    
+    if not email:
+        return jsonify({'error': 'Email is required'}), 400
+    if not password or len(password) < 6:
+        return jsonify({'error': 'Password must be at least 6 characters'}), 400
+    if not username:
+        return jsonify({'error': 'Username is required'}), 400
+    
+    # Validate email format
+    if '@' not in email or '.' not in email.split('@')[1]:
+        return jsonify({'error': 'Invalid email format'}), 400
+    
+    # Check if email already exists
+    if User.query.filter_by(email=email).first():
+        return jsonify({'error': 'Email already in use'}), 409
+    
+    # Check if username already exists
+    if User.query.filter_by(username=username).first():
+        return jsonify({'error': 'Username already taken'}), 409
+    
+    try:
+        user = User(
+            username=username,
+            email=email,
+            bio=None,
+            gender=None,
+            rating=None,
+            location=None,
+            sports=None,
+            google_sub=None,
+            avatar_url=None,
+        )
+        user.password_hash = current_app.extensions['password_hasher'].hash(password)
+        db.session.add(user)
+        db.session.flush()
+        # A guest signing up keeps the spots they took as a guest.
+        guest_token = guests.request_token(data)
+        claimed_event_ids = []
+        if guest_token:
+            claimed_event_ids = guests.claim(user, guests.hash_token(guest_token))
+            if claimed_event_ids:
+                outbox.record('guest.claimed', {'user_id': user.id, 'event_ids': claimed_event_ids})
+        refresh_token = start_refresh_session(user.id)
+        db.session.commit()
+        
+        # Issue tokens
+        access_token = generate_token(user.id, 'access')
+        
+        response = jsonify({
+            'message': 'Signup successful',
+            'user': user.to_dict(),
+            'access_token': access_token,
+            'needs_username_setup': True,  # Email signup requires full profile setup
+            'claimed_event_ids': claimed_event_ids,
+        })
+        response.set_cookie(
+            'refresh_token',
+            refresh_token,
+            max_age=current_app.config['JWT_REFRESH_EXPIRES'],
+            httponly=True,
+            secure=current_app.config['SESSION_COOKIE_SECURE'],
+            samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+        )
+        return response, 201
+    except HasherBusy:
+        return hasher_busy()
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to create account'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to create account'}), 500
+
+
+@bp.post("/auth/login")
+@limit('10/minute', account=json_field('email'))
+def login():
+    """Authenticate user with email and password."""
+    data = request.get_json(silent=True) or {}
+    
+    email = (data.get('email') or '').strip().lower()
+    password = data.get('password') or ''
+    
+    if not email or not password:
+        return jsonify({'error': 'Email and password required'}), 400
+    
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        return jsonify({'error': 'Invalid email or password'}), 401
+    password_hasher = current_app.extensions['password_hasher']
+    try:
+        valid, needs_rehash = password_hasher.verify(user.password_hash, password)
+        if valid and needs_rehash:
+            user.password_hash = password_hasher.hash(password)
+            db.session.commit()
+            password_hasher.record_rehash()
+    except HasherBusy:
+        return hasher_busy()
+    if not valid:
+        return jsonify({'error': 'Invalid email or password'}), 401
+    
+    access_token = generate_token(user.id, 'access')
+    refresh_token = start_refresh_session(user.id)
+    response = jsonify({
+        'message': 'Login successful',
+        'user': user.to_dict(),
+        'access_token': access_token,
+    })
+    # After serializing: the commit expires `user`.
+    db.session.commit()
+    response.set_cookie(
+        'refresh_token',
+        refresh_token,
+        max_age=current_app.config['JWT_REFRESH_EXPIRES'],
+        httponly=True,
+        secure=current_app.config['SESSION_COOKIE_SECURE'],
+        samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+    )
+    return response, 200
+
+
+@bp.post("/auth/claim-guest")
+@limit('10/minute')
+def claim_guest():
+    """Move the spots held with a guest token (body or X-Guest-Token) to the signed-in user."""
+    if not g.current_user:
+        return jsonify({'error': 'Authentication required'}), 401
+    data = request.get_json(silent=True) or {}
+    guest_token = guests.request_token(data)
+    if not guest_token:
+        return jsonify({'error': 'guest_token is required'}), 400
+    user = g.current_user
+    try:
+        event_ids = guests.claim(user, guests.hash_token(guest_token))
+        if event_ids:
+            outbox.record('guest.claimed', {'user_id': user.id, 'event_ids': event_ids})
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Guest spots changed concurrently, please retry'}), 409
+    app = current_app._get_current_object()
+    for event_id in event_ids:
+        signals.participant_joined.send(app, event_id=event_id, user_id=user.id)
+    return jsonify({'message': 'Guest spots claimed', 'claimed_event_ids': event_ids}), 200
+
+
+@bp.post("/auth/logout")
+def logout():
+    print(f"[DEBUG] /auth/logout called", flush=True)
+    print(f"[DEBUG] g.current_user before logout: {g.current_user}", flush=True)
+    # End the refresh session and revoke the presented access token, so
+    # copies of either stop working too.
+    auth_header = request.headers.get('Authorization', '')
+    access_token = auth_header.split(' ', 1)[1].strip() if auth_header.startswith('Bearer ') else None
+    refresh_token = request.cookies.get('refresh_token')
+    ended = [
+        revoke_token(access_token) if access_token else False,
+        end_refresh_session(refresh_token) if refresh_token else False,
+    ]
+    if any(ended):
+        db.session.commit()
+    response = make_response(jsonify({'message': 'Logged out'}))
+    # Delete refresh_token cookie by setting max_age=0
+    response.set_cookie(
+        'refresh_token',
+        '',
+        max_age=0,
+        httponly=True,
+        secure=current_app.config['SESSION_COOKIE_SECURE'],
+        samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+    )
+    print(f"[DEBUG] Deleted refresh_token cookie", flush=True)
+    return response
+
+
+@bp.delete("/auth/delete-account")
+def delete_account():
+    """Delete the authenticated user's account and all associated data."""
+    if not g.current_user:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    user_id = g.current_user.id
+    user_email = g.current_user.email
+    
+    try:
+        print(f"[HOPON] Starting account deletion for {user_email} (ID: {user_id})", flush=True)
+        counts = accounts.delete_user_data(user_id, chunk_size=current_app.config['DELETE_CHUNK_SIZE'], app=current_app._get_current_object())
+        print(f"[HOPON] User account deleted successfully: {user_email} (ID: {user_id}). Counts: {counts}", flush=True)
+        
+        # Clear cookies and return success response
+        response = make_response(jsonify({'message': 'Account deleted successfully'}), 200)
+        response.set_cookie(
+            'refresh_token',
+            '',
+            max_age=0,
+            httponly=True,
+            secure=current_app.config['SESSION_COOKIE_SECURE'],
+            samesite=current_app.config['SESSION_COOKIE_SAMESITE'],
+        )
+        response.delete_cookie('user_id')
+        return response
+        
+    except Exception as e:
+        db.session.rollback()
+        error_msg = f"[HOPON] Error deleting account for {user_email}: {str(e)}"
+        print(error_msg, flush=True)
+        import traceback
+        print(traceback.format_exc(), flush=True)
+        return jsonify({'error': 'Failed to delete account', 'details': str(e)}), 500
+
+
+@bp.get("/auth/session")
+def session_info():
+    print(f"[DEBUG] /auth/session called", flush=True)
+    print(f"[DEBUG] g.current_user: {g.current_user}", flush=True)
+    if g.current_user:
+        print(f"[DEBUG] Returning authenticated user: {g.current_user.username}", flush=True)
+        return jsonify({'authenticated': True, 'user': g.current_user.to_dict()}), 200
+    # Session endpoint only checks Authorization header (access token)
+    # Don't use refresh_token cookie here - that's for explicit refresh endpoint
+    print(f"[DEBUG] Session check failed - not authenticated (no valid access token)", flush=True)
+    return jsonify({'authenticated': False}), 200
+
+
+@bp.get("/auth/username-available")
+@limit('60/minute', burst=20)
+def check_username_available():
+    """Check if a username is available (not taken)."""
+    username = (request.args.get('username') or '').strip()
+    
+    if not username:
+        return jsonify({'error': 'Username parameter is required'}), 400
+    
+    if len(username) < 3:
+        return jsonify({'available': False, 'message': 'Username must be at least 3 characters'}), 200
+    
+    if len(username) > 50:
+        return jsonify({'available': False, 'message': 'Username must be at most 50 characters'}), 200
+    
+    # Check if username already exists (case-insensitive)
+    existing = User.query.filter(User.username.ilike(username)).first()
+    
+    print(f"[HOPON] Checking username availability: '{username}' - Found: {existing is not None}", flush=True)
+    
+    if existing:
+        return jsonify({'available': False, 'message': 'Username already taken'}), 200
+    
+    return jsonify({'available': True, 'message': 'Username is available'}), 200
+
+
+@bp.patch("/auth/profile")
+def update_profile():
+    """Update user profile information. Requires authentication."""
+    if not g.current_user:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    user = g.current_user
+    
+    # Update bio if provided
+    if 'bio' in data:
+        user.bio = data.get('bio') or None
+    
+    # Update location if provided
+    if 'location' in data:
+        user.location = data.get('location') or None
+    
+    # Update latitude/longitude if provided
+    if 'latitude' in data:
+        user.latitude = data.get('latitude')
+    if 'longitude' in data:
+        user.longitude = data.get('longitude')
+    
+    # Update sports if provided
+    if 'sports' in data:
+        sports_data = data.get('sports')
+        if sports_data:
+            # Handle both array and string formats
+            if isinstance(sports_data, list):
+                user.sports = ', '.join(sports_data)
+            else:
+                user.sports = sports_data
+        else:
+            user.sports = None
+    
+    # Update username if provided (with uniqueness check)
+    if 'username' in data:
+        new_username = (data.get('username') or '').strip()
+        
+        if not new_username:
+            return jsonify({'error': 'Username cannot be empty'}), 400
+        
+        if len(new_username) < 3:
+            return jsonify({'error': 'Username must be at least 3 characters'}), 400
+        
+        if len(new_username) > 50:
+            return jsonify({'error': 'Username must be at most 50 characters'}), 400
+        
+        # Check if new username is different from current
+        if new_username != user.username:
+            # Check if username already exists
+            existing = User.query.filter_by(username=new_username).first()
+            if existing:
+                return jsonify({'error': 'Username already taken'}), 409
+            
+            user.username = new_username
+    
+    try:
+        db.session.commit()
+        signals.user_updated.send(current_app._get_current_object(), user_id=user.id)
+        return jsonify({
+            'message': 'Profile updated successfully',
+            'user': user.to_dict()
+        }), 200
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update profile'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update profile'}), 500
+
+
+@bp.post("/auth/setup-account")
+def setup_account():
+    """Complete account setup after initial signup. Requires authentication."""
+    if not g.current_user:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    user = g.current_user
+    
+    # Validate required fields
+    username = (data.get('username') or '').strip()
+    if not username:
+        return jsonify({'error': 'Username is required'}), 400
+    
+    if len(username) < 3:
+        return jsonify({'error': 'Username must be at least 3 characters'}), 400
+    
+    if len(username) > 50:
+        return jsonify({'error': 'Username must be at most 50 characters'}), 400
+    
+    # Check if username is available (or is same as current)
+    if username != user.username:
+        existing = User.query.filter_by(username=username).first()
+        if existing:
+            return jsonify({'error': 'Username already taken'}), 409
+    
+    user.username = username
+    
+    # Update bio (optional)
+    if 'bio' in data:
+        user.bio = data.get('bio') or None
+    
+    # Update location (optional)
+    if 'location' in data:
+        user.location = data.get('location') or None
+    
+    # Update latitude/longitude (optional)
+    if 'latitude' in data:
+        user.latitude = data.get('latitude')
+    if 'longitude' in data:
+        user.longitude = data.get('longitude')
+    
+    # Update sports (optional)
+    if 'sports' in data:
+        sports_data = data.get('sports')
+        if sports_data:
+            if isinstance(sports_data, list):
+                user.sports = ', '.join(sports_data)
+            else:
+                user.sports = sports_data
+        else:
+            user.sports = None
+    
+    try:
+        db.session.commit()
+        signals.user_updated.send(current_app._get_current_object(), user_id=user.id)
+        print(f"[HOPON] Account setup completed for user: {user.username} (ID: {user.id})", flush=True)
+        return jsonify({
+            'message': 'Account setup completed successfully',
+            'user': user.to_dict()
+        }), 200
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to setup account'}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"[HOPON] Error setting up account: {str(e)}", flush=True)
+        return jsonify({'error': 'Failed to setup account'}), 500
@@ -0,0 +1,556 @@
+"""Event routes: listing, discovery, CRUD, joining, leaving and waitlists."""
+from datetime import datetime
+from typing import Optional
+
+from flask import Blueprint, abort, current_app, g, jsonify, request
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+import archive
+import guests
+import outbox
+import roster
+import signals
+import tiles
+import waitlist
+from cache import cached
+from geo import distances_km, non_finite
+from models import db, Event, EventParticipant, User, WaitlistEntry
+from ratelimit import limit
+from replicas import read_only
+from serializers import EVENTS, PARTICIPANTS
+
+bp = Blueprint('events', __name__)
+
+# Upper bound for `limit` on /events/nearby.
+MAX_NEARBY_RESULTS = 500
+
+# Fields PATCH /events/<id> accepts.
+EVENT_UPDATE_FIELDS = ('name', 'sport', 'location', 'notes', 'max_players', 'event_date', 'skill_level')
+
+
+def ensure_host_participant(event: Event) -> None:
+    """Ensure the event host is registered as a participant."""
+    if not event.host_user_id:
+        return
+    host = User.query.get(event.host_user_id)
+    if not host:
+        return
+    existing = EventParticipant.query.filter_by(
+        event_id=event.id,
+        user_id=event.host_user_id,
+    ).first()
+    if existing:
+        return
+    db.session.add(
+        EventParticipant(
+            event_id=event.id,
+            user_id=event.host_user_id,
+            player_name=host.username,
+            team="host",
+        )
+    )
+
+
+@bp.post("/events")
+def create_event():
+    """Create a new event"""
+    data = request.get_json() or {}
+
+    if not all(k in data for k in ['name', 'sport', 'location', 'max_players']):
+        return jsonify({'error': 'Missing required fields: name, sport, location, max_players'}), 400
+    
+    try:
+        host_user_id = g.current_user.id if g.current_user else data.get('host_user_id')
+        event = Event(
+            name=data['name'],
+            sport=data['sport'],
+            location=data['location'],
+            notes=data.get('notes'),
+            max_players=data['max_players'],
+            event_date=datetime.fromisoformat(data['event_date']) if data.get('event_date') else None,
+            latitude=data.get('latitude'),
+            longitude=data.get('longitude'),
+            skill_level=data.get('skill_level'),
+            host_user_id=host_user_id,
+        )
+        
+        db.session.add(event)
+        db.session.flush()
+        if host_user_id:
+            ensure_host_participant(event)
+        outbox.record('event.created', {'event_id': event.id, 'host_user_id': host_user_id})
+        db.session.commit()
+        signals.event_created.send(current_app._get_current_object(), event_id=event.id, host_user_id=host_user_id)
+        
+        return jsonify({
+            'message': 'Event created successfully',
+            'event': event.to_dict()
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to create event'}), 500
+
+
+@bp.get("/events")
+@cached('events')
+@read_only
+def get_events():
+    """Get all available events/games"""
+    events = EVENTS.all(EVENTS.select().where(archive.live_events_filter()).order_by(Event.created_at.desc()))
+    return jsonify(events), 200
+
+
+@bp.get("/events/history")
+@read_only
+def event_history():
+    """Archived (past) events a user hosted or joined, newest first."""
+    user_id = g.current_user.id if g.current_user else request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify({'error': 'user_id is required'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    events = archive.event_history(user_id=user_id, limit=limit, offset=offset)
+    return jsonify({
+        'events': events,
+        'limit': limit,
+        'offset': offset,
+    }), 200
+
+
+@bp.get("/events/nearby")
+@cached('events', quantize=('lat', 'lng'))
+@read_only
+def nearby_events():
+    """Return events with optional haversine distance sorting.
+
+    With lat/lng plus `radius_km` and/or `limit`, only the events within
+    the radius (at most `limit`, nearest first) are returned, answered from
+    the in-memory location index.
+    """
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    radius_km = request.args.get('radius_km', type=float)
+    limit = request.args.get('limit', type=int)
+    invalid = non_finite(lat=lat, lng=lng, radius_km=radius_km)
+    if invalid:
+        return jsonify({'error': f'{invalid} must be a finite number'}), 400
+    if lat is not None and lng is not None and (radius_km is not None or limit is not None):
+        hits = current_app.extensions['nearby'].nearby(
+            'events', lat, lng,
+            load=lambda ids: EVENTS.all(EVENTS.select().where(Event.id.in_(ids), archive.live_events_filter())),
+            radius_km=radius_km,
+            limit=min(max(limit, 1), MAX_NEARBY_RESULTS) if limit is not None else None,
+        )
+        out = []
+        for item, d in hits:
+            item['distance_km'] = d
+            out.append(item)
+        return jsonify(out), 200
+
+    out = EVENTS.all(EVENTS.select().where(archive.live_events_filter()))
+    if lat is not None and lng is not None:
+        for item, d in zip(out, distances_km(lat, lng, ((e['latitude'], e['longitude']) for e in out))):
+            item['distance_km'] = d
+        # Sort by distance; events without a location go last
+        out.sort(key=lambda x: x['distance_km'] if x['distance_km'] is not None else 1e9)
+    else:
+        for item in out:
+            item['distance_km'] = None
+    return jsonify(out), 200
+
+
+@bp.get("/events/tiles/<int:z>/<int:x>/<int:y>")
+@cached('events', public=True)
+@read_only
+def event_tile(z: int, x: int, y: int):
+    """Clustered event counts for one Web Mercator map tile."""
+    if not tiles.is_valid_tile(z, x, y):
+        return jsonify({'error': f'Invalid tile; zoom must be 0-{tiles.MAX_ZOOM} and x, y within 0..2^zoom-1'}), 400
+    response = jsonify(tiles.tile_clusters(z, x, y))
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['TILE_MAX_AGE']}"
+    return response, 200
+
+
+@bp.get("/events/recommended")
+def recommended_events():
+    """Rank upcoming events for the caller by sport, skill and location affinity."""
+    if not g.current_user:
+        return jsonify({'error': 'Authentication required'}), 401
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    items = current_app.extensions['recommendations'].recommend(
+        g.current_user,
+        lat=request.args.get('lat', type=float),
+        lng=request.args.get('lng', type=float),
+        radius_km=request.args.get('radius_km', type=float),
+        limit=limit,
+        skill_level=request.args.get('skill_level'),
+    )
+    return jsonify(items), 200
+
+
+@bp.get("/events/<int:event_id>")
+@read_only
+def get_event(event_id):
+    """Get a specific event by ID"""
+    event = EVENTS.first(EVENTS.select().where(Event.id == event_id))
+    if event is None:
+        abort(404)
+    return jsonify(event), 200
+
+
+@bp.patch("/events/<int:event_id>")
+def update_event(event_id):
+    """Update an event (host only)"""
+    event = Event.query.get_or_404(event_id)
+    
+    # Check if current user is the host
+    if g.current_user and g.current_user.id != event.host_user_id:
+        return jsonify({'error': 'Only the host can update this event'}), 403
+    if not g.current_user:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    data = request.get_json() or {}
+    promoted = []
+
+    try:
+        # Update allowed fields
+        if 'name' in data:
+            event.name = data['name']
+        if 'sport' in data:
+            event.sport = data['sport']
+        if 'location' in data:
+            event.location = data['location']
+        if 'notes' in data:
+            event.notes = data['notes']
+        if 'max_players' in data:
+            event.max_players = data['max_players']
+        if 'event_date' in data:
+            event.event_date = datetime.fromisoformat(data['event_date']) if data['event_date'] else None
+        if 'skill_level' in data:
+            event.skill_level = data['skill_level']
+        # Note: latitude and longitude should be updated via create event, not patch
+        if 'max_players' in data:
+            # More spots may have opened; fill them from the waitlist in this transaction.
+            db.session.flush()
+            waitlist.lock_event(event.id)
+            promoted = waitlist.promote(event.id)
+        outbox.record('event.updated', {
+            'event_id': event.id,
+            'fields': sorted(k for k in data if k in EVENT_UPDATE_FIELDS),
+        })
+
+        db.session.commit()
+        app = current_app._get_current_object()
+        signals.event_updated.send(app, event_id=event.id)
+        for user_id in promoted:
+            signals.participant_joined.send(app, event_id=event.id, user_id=user_id)
+        return jsonify({
+            'message': 'Event updated successfully',
+            'event': event.to_dict()
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to update event: {e}", flush=True)
+        return jsonify({'error': 'Failed to update event'}), 500
+
+
+@bp.delete("/events/<int:event_id>")
+def delete_event(event_id):
+    """Delete an event (host only)"""
+    event = Event.query.get_or_404(event_id)
+    
+    # Check if current user is the host
+    if g.current_user and g.current_user.id != event.host_user_id:
+        return jsonify({'error': 'Only the host can delete this event'}), 403
+    if not g.current_user:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    try:
+        # Delete all participants
+        EventParticipant.query.filter_by(event_id=event_id).delete()
+        WaitlistEntry.query.filter_by(event_id=event_id).delete()
+        # Delete the event
+        db.session.delete(event)
+        outbox.record('event.deleted', {'event_id': event_id})
+        db.session.commit()
+        signals.event_deleted.send(current_app._get_current_object(), event_id=event_id)
+        return jsonify({'message': 'Event deleted successfully'}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to delete event: {e}", flush=True)
+        return jsonify({'error': 'Failed to delete event'}), 500
+
+
+@bp.post("/events/<int:event_id>/join")
+@limit('30/minute')
+def join_event(event_id):
+    """Join a specific event/game, or its waitlist when full and the body has "waitlist": true"""
+    data = request.get_json() or {}
+    # Held until commit, so the capacity check below cannot race other joins.
+    if not waitlist.lock_event(event_id):
+        abort(404)
+    event = Event.query.get_or_404(event_id)
+
+    user = g.current_user
+    team = data.get('team', 'team_a')
+    guest_token = guests.request_token(data)
+    hashed_guest_token: Optional[str] = None
+
+    if user:
+        player_name = data.get('player_name') or user.username
+        existing = EventParticipant.query.filter_by(event_id=event_id, user_id=user.id).first()
+        if existing:
+            return jsonify({'message': 'Already joined', 'event': event.to_dict()}), 200
+        user_id = user.id
+        guest_name = None
+    else:
+        player_name = data.get('player_name')
+        if not player_name:
+            return jsonify({'error': 'Player name is required'}), 400
+        guest_name = player_name
+        if guest_token:
+            hashed_guest_token = guests.hash_token(guest_token)
+            if guests.find_participant(event_id, hashed_guest_token):
+                return jsonify({'message': 'Already joined', 'event': event.to_dict()}), 200
+        else:
+            guest_token = guests.new_token()
+            hashed_guest_token = guests.hash_token(guest_token)
+        user_id = None
+
+    if event.participants.count() >= event.max_players:
+        entry = waitlist.find_entry(event_id, user_id=user_id, guest_token=hashed_guest_token)
+        if entry is not None:
+            return jsonify({
+                'message': 'Already on waitlist',
+                'waitlist_position': waitlist.place(entry),
+                'event': event.to_dict()
+            }), 200
+        if not data.get('waitlist'):
+            return jsonify({'error': 'Event is full'}), 409
+        try:
+            entry = waitlist.add(event_id, user_id, player_name, team, guest_name, hashed_guest_token)
+            position = waitlist.place(entry)
+            outbox.record('waitlist.joined', {'event_id': event_id, 'user_id': user_id, 'position': position})
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'Failed to join waitlist'}), 409
+        response_payload = {
+            'message': 'Added to waitlist',
+            'waitlist_position': position,
+            'event': event.to_dict()
+        }
+        if not user and guest_token:
+            response_payload['guest_token'] = guest_token
+        return jsonify(response_payload), 202
+
+    try:
+        participant = EventParticipant(
+            event_id=event_id,
+            user_id=user_id,
+            player_name=player_name,
+            team=team,
+            guest_name=guest_name,
+            guest_token=hashed_guest_token,
+        )
+        
+        db.session.add(participant)
+        outbox.record('participant.joined', {'event_id': event_id, 'user_id': user_id})
+        db.session.commit()
+        signals.participant_joined.send(current_app._get_current_object(), event_id=event_id, user_id=user_id)
+
+        response_payload = {
+            'message': 'Successfully joined event',
+            'event': event.to_dict()
+        }
+        if not user and guest_token:
+            response_payload['guest_token'] = guest_token
+        return jsonify(response_payload), 200
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to join event'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to join event'}), 500
+
+
+@bp.post("/events/<int:event_id>/leave")
+def leave_event(event_id: int):
+    """Leave an event (or its waitlist); the freed spot goes to the head of the waitlist."""
+    data = request.get_json() or {}
+    user = g.current_user
+    hashed_guest_token: Optional[str] = None
+    if not user:
+        guest_token = guests.request_token(data)
+        if not guest_token:
+            return jsonify({'error': 'guest_token is required for guest users'}), 400
+        hashed_guest_token = guests.hash_token(guest_token)
+    waitlist.lock_event(event_id)
+    if user:
+        participant = EventParticipant.query.filter_by(event_id=event_id, user_id=user.id).first()
+    else:
+        participant = guests.find_participant(event_id, hashed_guest_token)
+    if not participant:
+        entry = waitlist.find_entry(event_id, user_id=user.id if user else None, guest_token=hashed_guest_token)
+        if entry is None:
+            return jsonify({'message': 'Not a participant'}), 200
+        db.session.delete(entry)
+        outbox.record('waitlist.left', {'event_id': event_id, 'user_id': entry.user_id})
+        db.session.commit()
+        return jsonify({'message': 'Left waitlist'}), 200
+    left_user_id = participant.user_id
+    db.session.delete(participant)
+    db.session.flush()
+    outbox.record('participant.left', {'event_id': event_id, 'user_id': left_user_id})
+    promoted = waitlist.promote(event_id)
+    db.session.commit()
+    app = current_app._get_current_object()
+    signals.participant_left.send(app, event_id=event_id, user_id=left_user_id)
+    for user_id in promoted:
+        signals.participant_joined.send(app, event_id=event_id, user_id=user_id)
+    return jsonify({'message': 'Left event'}), 200
+
+
+@bp.post("/events/<int:event_id>/roster")
+@limit('10/minute')
+def update_roster(event_id: int):
+    """Apply a batch of joins and leaves (registered users and guests) in one transaction.
+
+    Body: {"entries": [{"action": "join"|"leave", "user_id"?, "player_name"?,
+    "guest_token"?, "team"?}, ...]}. An entry with neither user_id nor
+    guest fields is the caller. Returns one result per entry (with the
+    guest token for guest joins) and the updated event.
+    """
+    data = request.get_json() or {}
+    entries = data.get('entries')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'entries must be a non-empty list'}), 400
+    if len(entries) > roster.MAX_ENTRIES:
+        return jsonify({'error': f'At most {roster.MAX_ENTRIES} entries per request'}), 400
+    # Lock the event row so concurrent roster changes see each other's counts.
+    if not waitlist.lock_event(event_id):
+        abort(404)
+    event = db.session.get(Event, event_id)
+
+    try:
+        outcome = roster.apply_roster(event, entries, g.current_user)
+        for user_id in outcome.joined_user_ids:
+            outbox.record('participant.joined', {'event_id': event_id, 'user_id': user_id})
+        for user_id in outcome.left_user_ids:
+            outbox.record('participant.left', {'event_id': event_id, 'user_id': user_id})
+        promoted = waitlist.promote(event_id)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Roster changed concurrently, please retry'}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to update roster for event {event_id}: {e}", flush=True)
+        return jsonify({'error': 'Failed to update roster'}), 500
+
+    app = current_app._get_current_object()
+    for user_id in outcome.joined_user_ids + promoted:
+        signals.participant_joined.send(app, event_id=event_id, user_id=user_id)
+    for user_id in outcome.left_user_ids:
+        signals.participant_left.send(app, event_id=event_id, user_id=user_id)
+    return jsonify({
+        'results': outcome.results,
+        'event': EVENTS.first(EVENTS.select().where(Event.id == event_id)),
+    }), 200
+
+
+@bp.get("/guest/events")
+@read_only
+def guest_events():
+    """Events a guest holds a spot in (guest_token query parameter or X-Guest-Token header)."""
+    guest_token = guests.request_token(request.args)
+    if not guest_token:
+        return jsonify({'error': 'guest_token is required for guest users'}), 400
+    spots = guests.participations(guests.hash_token(guest_token))
+    events = {event['id']: event for event in EVENTS.all(
+        EVENTS.select().where(Event.id.in_([spot['event_id'] for spot in spots]))
+    )} if spots else {}
+    return jsonify({
+        'events': [dict(events[spot['event_id']], guest=spot) for spot in spots if spot['event_id'] in events],
+    }), 200
+
+
+@bp.get("/events/<int:event_id>/waitlist")
+@read_only
+def get_event_waitlist(event_id: int):
+    """List an event's waitlist in promotion order (guest tokens are not exposed)."""
+    if db.session.execute(select(Event.id).where(Event.id == event_id)).scalar() is None:
+        abort(404)
+    rows = db.session.execute(
+        select(WaitlistEntry.user_id, WaitlistEntry.player_name, WaitlistEntry.team, WaitlistEntry.created_at)
+        .where(WaitlistEntry.event_id == event_id)
+        .order_by(WaitlistEntry.position)
+    ).all()
+    return jsonify({
+        'event_id': event_id,
+        'waitlist': [
+            {
+                'position': place,
+                'user_id': row.user_id,
+                'player_name': row.player_name,
+                'team': row.team,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+            }
+            for place, row in enumerate(rows, start=1)
+        ],
+    }), 200
+
+
+@bp.get("/events/<int:event_id>/participants")
+@read_only
+def get_event_participants(event_id: int):
+    """An event's roster, registered players and guests, in joining order.
+
+    Query parameters: `team` (only that team), `group_by=team` (orders by
+    team and adds `teams` with each team's size and its players on this
+    page), `limit` (default 200, max 1000) and `offset`.
+    """
+    group_by = request.args.get('group_by')
+    if group_by not in (None, 'team'):
+        return jsonify({'error': "group_by must be 'team'"}), 400
+    limit = min(max(request.args.get('limit', 200, type=int), 1), 1000)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    in_roster = [EventParticipant.event_id == event_id]
+    if request.args.get('team'):
+        in_roster.append(EventParticipant.team == request.args['team'])
+
+    header = db.session.execute(
+        select(Event.id, select(func.count(EventParticipant.id)).where(*in_roster).scalar_subquery())
+        .where(Event.id == event_id)
+    ).first()
+    if header is None:
+        abort(404)
+    order = [EventParticipant.joined_at, EventParticipant.id]
+    if group_by:
+        # Players without a team last, on every database.
+        order[:0] = [EventParticipant.team.is_(None), EventParticipant.team]
+    participants = PARTICIPANTS.all(
+        PARTICIPANTS.select().where(*in_roster).order_by(*order).limit(limit).offset(offset)
+    )
+    body = {
+        'event_id': event_id,
+        'participants': participants,
+        'total': header[1],
+        'limit': limit,
+        'offset': offset,
+    }
+    if group_by:
+        sizes = db.session.execute(
+            select(EventParticipant.team, func.count(EventParticipant.id))
+            .where(*in_roster)
+            .group_by(EventParticipant.team)
+        ).all()
+        members = {}
+        for participant in participants:
+            members.setdefault(participant['team'], []).append(participant)
+        body['teams'] = [
+            {'team': team, 'count': count, 'participants': members.get(team, [])}
+            for team, count in sorted(sizes, key=lambda row: (row[0] is None, row[0] or ''))
+        ]
+    return jsonify(body), 200
@@ -0,0 +1,164 @@
+"""User routes: profiles, discovery, follows, the friends' feed and "my events"."""
+from flask import Blueprint, abort, current_app, g, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import signals
+from geo import distances_km, non_finite
+from models import db, Event, EventParticipant, Follow, User, UserSport, parse_sports
+from replicas import read_only
+from routes.events import MAX_NEARBY_RESULTS
+from serializers import DISCOVERY_USERS, EVENTS, USERS
+
+bp = Blueprint('users', __name__)
+
+
+@bp.post("/users")
+def create_user():
+    data = request.get_json()
+    if not data or not all(k in data for k in ["username", "email"]):
+        return jsonify({"error": "Missing required fields: username, email"}), 400
+    try:
+        user = User(
+            username=data["username"],
+            email=data["email"],
+            bio=data.get("bio"),
+            gender=data.get("gender")
+        )
+        db.session.add(user)
+        db.session.commit()
+        return jsonify({"message": "User created successfully", "user": user.to_dict()}), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Username or email already exists"}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Failed to create user"}), 500
+
+
+@bp.get("/users/<int:user_id>")
+@read_only
+def get_user(user_id):
+    user = USERS.first(USERS.select().where(User.id == user_id))
+    if user is None:
+        abort(404)
+    return jsonify(user), 200
+
+
+@bp.get("/users/nearby")
+@read_only
+def users_nearby():
+    """Simple nearby users endpoint. For now returns all users with discovery fields.
+
+    Optional `sport` (comma-separated) keeps only users who play any of
+    those sports, resolved through the indexed user_sports table.
+
+    With `lat`/`lng`, users are sorted by distance (users without a
+    location last) and carry `distance_km`. Adding `radius_km` and/or
+    `limit` returns only the users within the radius (at most `limit`,
+    nearest first), answered from the in-memory location index.
+    """
+    query = DISCOVERY_USERS.select()
+    sports = parse_sports(request.args.get('sport'))
+    if sports:
+        query = query.where(User.id.in_(
+            select(UserSport.user_id).where(UserSport.sport.in_(sports))
+        ))
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    radius_km = request.args.get('radius_km', type=float)
+    limit = request.args.get('limit', type=int)
+    invalid = non_finite(lat=lat, lng=lng, radius_km=radius_km)
+    if invalid:
+        return jsonify({'error': f'{invalid} must be a finite number'}), 400
+    if lat is not None and lng is not None and (radius_km is not None or limit is not None):
+        hits = current_app.extensions['nearby'].nearby(
+            'users', lat, lng,
+            load=lambda ids: DISCOVERY_USERS.all(query.where(User.id.in_(ids))),
+            radius_km=radius_km,
+            limit=min(max(limit, 1), MAX_NEARBY_RESULTS) if limit is not None else None,
+        )
+        out = []
+        for payload, d in hits:
+            payload['distance_km'] = d
+            out.append(payload)
+    else:
+        out = DISCOVERY_USERS.all(query)
+        if lat is not None and lng is not None:
+            for payload, d in zip(out, distances_km(lat, lng, ((u['latitude'], u['longitude']) for u in out))):
+                payload['distance_km'] = d
+            out.sort(key=lambda x: x['distance_km'] if x['distance_km'] is not None else 1e9)
+    following_lookup = set()
+    if g.current_user:
+        following_lookup = set(db.session.execute(
+            select(Follow.followee_id).where(Follow.follower_id == g.current_user.id)
+        ).scalars())
+    for payload in out:
+        payload['is_following'] = payload['id'] in following_lookup
+    return jsonify(out), 200
+
+
+@bp.post("/users/<int:user_id>/follow")
+def follow_user(user_id: int):
+    data = request.get_json() or {}
+    follower_id = g.current_user.id if g.current_user else data.get('follower_id')
+    if follower_id is None:
+        return jsonify({'error': 'follower_id is required'}), 400
+    if follower_id == user_id:
+        return jsonify({'error': 'cannot follow self'}), 400
+    exists = Follow.query.filter_by(follower_id=follower_id, followee_id=user_id).first()
+    if exists:
+        return jsonify({'message': 'Already following'}), 200
+    db.session.add(Follow(follower_id=follower_id, followee_id=user_id))
+    db.session.commit()
+    signals.user_followed.send(current_app._get_current_object(), follower_id=follower_id, followee_id=user_id)
+    return jsonify({'message': 'Followed'}), 200
+
+
+@bp.delete("/users/<int:user_id>/follow")
+def unfollow_user(user_id: int):
+    follower_id = g.current_user.id if g.current_user else request.args.get('follower_id', type=int)
+    if follower_id is None:
+        data = request.get_json(silent=True) or {}
+        follower_id = data.get('follower_id')
+    if follower_id is None:
+        return jsonify({'error': 'follower_id is required'}), 400
+    f = Follow.query.filter_by(follower_id=follower_id, followee_id=user_id).first()
+    if not f:
+        return jsonify({'message': 'Not following'}), 200
+    db.session.delete(f)
+    db.session.commit()
+    signals.user_unfollowed.send(current_app._get_current_object(), follower_id=follower_id, followee_id=user_id)
+    return jsonify({'message': 'Unfollowed'}), 200
+
+
+@bp.get("/feed")
+def friends_feed():
+    """Upcoming events hosted or joined by people the caller follows.
+
+    Ranked by how recently a followee acted on the event and by distance
+    from `lat`/`lng` (or the caller's saved location when omitted).
+    """
+    if not g.current_user:
+        return jsonify({'error': 'Authentication required'}), 401
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None:
+        lat, lng = g.current_user.latitude, g.current_user.longitude
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    feed = current_app.extensions['feed']
+    items = feed.get_feed(g.current_user.id, lat=lat, lng=lng, limit=limit)
+    return jsonify({'events': items, 'strategy': feed.strategy}), 200
+
+
+@bp.get("/me/events")
+def my_events():
+    """Return joined and hosted events for a user."""
+    user_id = g.current_user.id if g.current_user else request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify({'error': 'user_id is required'}), 400
+    joined_ids = select(EventParticipant.event_id).where(EventParticipant.user_id == user_id)
+    return jsonify({
+        'joined': EVENTS.all(EVENTS.select().where(Event.id.in_(joined_ids)).order_by(Event.id)),
+        'hosted': EVENTS.all(EVENTS.select().where(Event.host_user_id == user_id).order_by(Event.id)),
+    }), 200
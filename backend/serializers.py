@@ -0,0 +1,206 @@
+"""Row-to-dict serialization for list and lookup endpoints.
+
+``Event.to_dict`` and ``User.to_dict`` read ORM attributes one at a time,
+and each event runs two more queries, one for its player count and one for
+its host. List and lookup routes use a ``RowMapper`` instead. The mapper
+selects the same fields as plain column tuples with one Core statement:
+counts come from correlated subqueries and the host from an outer join. It
+then turns each row into the dict ``to_dict`` would have returned:
+
+- output keys are fixed once per mapper, so each row becomes a dict with a
+  single ``dict(zip(keys, row))``;
+- only the fields that need converting are touched afterwards;
+- datetime strings are memoized per row id. A hit is checked against the
+  raw value, so a row whose date changed is re-rendered.
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+
+from models import db, ArchivedEvent, Event, EventParticipant, User
+
+
+class IsoMemo:
+    """Bounded row id -> (datetime, isoformat string) memo."""
+
+    def __init__(self, max_rows: int = 100_000):
+        self.max_rows = max_rows
+        self._items: Dict[object, Tuple] = {}
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def __call__(self, row_id, value):
+        if value is None:
+            return None
+        hit = self._items.get(row_id)
+        if hit is not None and hit[0] == value:
+            return hit[1]
+        text = value.isoformat()
+        if len(self._items) >= self.max_rows:
+            # Cheaper than LRU bookkeeping on every hit; a full memo is rare.
+            self._items.clear()
+        self._items[row_id] = (value, text)
+        return text
+
+
+class RowMapper:
+    """Precompiled mapping from selected column tuples to output dicts.
+
+    The first field must be the row's primary key, which keys the datetime
+    memos. `join` adds the FROM clause the columns need, and `finish`
+    reshapes a mapped dict in place (e.g. nesting the host).
+    """
+
+    def __init__(self, fields: Sequence[Tuple[str, object]], datetimes: Sequence[str] = (),
+                 converters: Optional[Dict[str, Callable]] = None,
+                 join: Optional[Callable] = None, finish: Optional[Callable[[Dict], None]] = None):
+        self.keys = tuple(key for key, _ in fields)
+        self.columns = [column for _, column in fields]
+        self._dates = [(key, IsoMemo()) for key in datetimes]
+        self._converters = list((converters or {}).items())
+        self._join = join
+        self._finish = finish
+
+    def select(self):
+        statement = select(*self.columns)
+        return self._join(statement) if self._join else statement
+
+    def clear_memos(self) -> None:
+        for _, memo in self._dates:
+            memo.clear()
+
+    def __call__(self, row) -> Dict:
+        out = dict(zip(self.keys, row))
+        row_id = row[0]
+        for key, memo in self._dates:
+            out[key] = memo(row_id, out[key])
+        for key, convert in self._converters:
+            out[key] = convert(out[key])
+        if self._finish:
+            self._finish(out)
+        return out
+
+    def all(self, statement) -> List[Dict]:
+        return [self(row) for row in db.session.execute(statement)]
+
+    def first(self, statement) -> Optional[Dict]:
+        row = db.session.execute(statement).first()
+        return self(row) if row is not None else None
+
+
+def split_sports(value: Optional[str]) -> Optional[List[str]]:
+    return [s.strip() for s in value.split(',')] if value else None
+
+
+def _nest_host(out: Dict) -> None:
+    username = out['host']
+    out['host'] = {'id': out['host_user_id'], 'username': username} if username is not None else None
+
+
+# Same fields as Event.to_dict().
+EVENTS = RowMapper(
+    [
+        ('id', Event.id),
+        ('name', Event.name),
+        ('sport', Event.sport),
+        ('location', Event.location),
+        ('notes', Event.notes),
+        ('max_players', Event.max_players),
+        ('current_players', select(func.count(EventParticipant.id))
+            .where(EventParticipant.event_id == Event.id).scalar_subquery()),
+        ('created_at', Event.created_at),
+        ('event_date', Event.event_date),
+        ('latitude', Event.latitude),
+        ('longitude', Event.longitude),
+        ('skill_level', Event.skill_level),
+        ('host_user_id', Event.host_user_id),
+        ('host', User.username),
+    ],
+    datetimes=('created_at', 'event_date'),
+    join=lambda statement: statement.select_from(Event).outerjoin(User, User.id == Event.host_user_id),
+    finish=_nest_host,
+)
+
+# Same fields as ArchivedEvent.to_dict(); the player count was frozen at archival.
+ARCHIVED_EVENTS = RowMapper(
+    [
+        ('id', ArchivedEvent.id),
+        ('name', ArchivedEvent.name),
+        ('sport', ArchivedEvent.sport),
+        ('location', ArchivedEvent.location),
+        ('notes', ArchivedEvent.notes),
+        ('max_players', ArchivedEvent.max_players),
+        ('current_players', ArchivedEvent.participant_count),
+        ('created_at', ArchivedEvent.created_at),
+        ('event_date', ArchivedEvent.event_date),
+        ('latitude', ArchivedEvent.latitude),
+        ('longitude', ArchivedEvent.longitude),
+        ('skill_level', ArchivedEvent.skill_level),
+        ('host_user_id', ArchivedEvent.host_user_id),
+        ('archived_at', ArchivedEvent.archived_at),
+    ],
+    datetimes=('created_at', 'event_date', 'archived_at'),
+)
+
+USER_FIELDS = [
+    ('id', User.id),
+    ('username', User.username),
+    ('email', User.email),
+    ('bio', User.bio),
+    ('gender', User.gender),
+    ('created_at', User.created_at),
+    ('rating', User.rating),
+    ('location', User.location),
+    ('latitude', User.latitude),
+    ('longitude', User.longitude),
+    ('sports', User.sports),
+    ('avatar_url', User.avatar_url),
+]
+
+
+def _copy_events_count(out: Dict) -> None:
+    # compatibility camelCase
+    out['eventsCount'] = out['events_count']
+
+
+# Same fields as User.to_dict().
+USERS = RowMapper(USER_FIELDS, datetimes=('created_at',), converters={'sports': split_sports})
+
+# User.to_dict() plus the participation count shown on discovery cards.
+DISCOVERY_USERS = RowMapper(
+    USER_FIELDS + [(
+        'events_count',
+        select(func.count(EventParticipant.id)).where(EventParticipant.user_id == User.id).scalar_subquery(),
+    )],
+    datetimes=('created_at',),
+    converters={'sports': split_sports},
+    finish=_copy_events_count,
+)
+
+
+def _mark_guest(out: Dict) -> None:
+    out['guest'] = out['id'] is None
+
+
+# One roster entry per spot. Registered players carry their public profile
+# fields (no email); guests have `id` None and keep their `guest_name`.
+PARTICIPANTS = RowMapper(
+    [
+        ('participant_id', EventParticipant.id),
+        ('team', EventParticipant.team),
+        ('joined_at', EventParticipant.joined_at),
+        ('player_name', EventParticipant.player_name),
+        ('guest_name', EventParticipant.guest_name),
+        ('id', User.id),
+        ('username', User.username),
+        ('avatar_url', User.avatar_url),
+        ('rating', User.rating),
+        ('sports', User.sports),
+    ],
+    datetimes=('joined_at',),
+    converters={'sports': split_sports},
+    join=lambda statement: statement.select_from(EventParticipant)
+    .outerjoin(User, User.id == EventParticipant.user_id),
+    finish=_mark_guest,
+)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Production entry point: runs the Flask app under gunicorn.
+
+    python serve.py            # or: hopon-serve
+    gunicorn -c serve.py app:app
+
+`app.run()` in app.py is the single-threaded development server; one slow
+client or outbound call (e.g. the Google token exchange in
+/auth/google/callback) holds it for everyone. Here each worker process
+handles requests on a pool of threads (``gthread``), so a handler blocked
+on I/O only occupies its own thread, and gunicorn buffers slow clients'
+keep-alive connections without tying up the app.
+
+Settings come from the environment:
+
+- ``PORT`` (8000), ``WEB_CONCURRENCY`` worker processes (2 x CPUs + 1, max 8)
+- ``SERVE_THREADS`` threads per worker (8); workers x threads is the number
+  of requests handled at once, so keep it within the DB pool size
+- ``SERVE_WORKER_CLASS``: ``gthread`` (default), ``gevent`` (pip install
+  hopon-backend[gevent]; patches blocking I/O to cooperative greenlets and
+  suits thousands of mostly idle connections, though psycopg2 queries still
+  block without psycogreen) or ``sync``
+- ``SERVE_WORKER_CONNECTIONS`` (1000, gevent only), ``SERVE_TIMEOUT`` (30),
+  ``SERVE_GRACEFUL_TIMEOUT`` (30), ``SERVE_KEEPALIVE`` (5),
+  ``SERVE_MAX_REQUESTS`` (0 = never recycle workers)
+"""
+import multiprocessing
+import os
+
+WORKER_CLASSES = ('gthread', 'gevent', 'sync')
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, str(default)))
+
+
+worker_class = os.environ.get('SERVE_WORKER_CLASS', 'gthread').lower()
+if worker_class not in WORKER_CLASSES:
+    raise RuntimeError(f"SERVE_WORKER_CLASS must be one of {WORKER_CLASSES}, got '{worker_class}'")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = _env_int('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8))
+threads = _env_int('SERVE_THREADS', 8)
+worker_connections = _env_int('SERVE_WORKER_CONNECTIONS', 1000)
+timeout = _env_int('SERVE_TIMEOUT', 30)
+graceful_timeout = _env_int('SERVE_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('SERVE_KEEPALIVE', 5)
+max_requests = _env_int('SERVE_MAX_REQUESTS', 0)
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+# Import the app once in the master so startup migrations and seeding run a
+# single time. gevent workers must patch sockets before the app is imported,
+# so they load it themselves.
+preload_app = worker_class != 'gevent'
+
+
+def post_fork(server, worker):
+    """Drop DB connections inherited from the master; each worker opens its own.
+
+    The password hashing pool is forked here too, before the worker starts
+    its request threads.
+    """
+    if not preload_app:
+        return
+    from app import app
+    from models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    app.extensions['password_hasher'].start()
+
+
+def options() -> dict:
+    """The gunicorn settings defined above, for programmatic use."""
+    return {
+        'bind': bind,
+        'workers': workers,
+        'worker_class': worker_class,
+        'threads': threads,
+        'worker_connections': worker_connections,
+        'timeout': timeout,
+        'graceful_timeout': graceful_timeout,
+        'keepalive': keepalive,
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests_jitter,
+        'accesslog': accesslog,
+        'errorlog': errorlog,
+        'preload_app': preload_app,
+        'post_fork': post_fork,
+    }
+
+
+def main() -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class HopOnServer(BaseApplication):
+        def load_config(self):
+            for key, value in options().items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    print(f"[HOPON] Serving on {bind} with {workers} {worker_class} workers"
+          f"{f' x {threads} threads' if worker_class == 'gthread' else ''}", flush=True)
+    HopOnServer().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""Application signals fired by route handlers after a mutation commits.
+
+Subsystems that keep derived state (caches, feeds, indexes) subscribe to
+these instead of being called directly from every handler. Handlers send
+with the Flask app as the sender so receivers can scope themselves to one
+app instance.
+"""
+from blinker import Namespace
+
+_signals = Namespace()
+
+# kwargs: event_id, host_user_id
+event_created = _signals.signal('event-created')
+# kwargs: event_id
+event_updated = _signals.signal('event-updated')
+# kwargs: event_id
+event_deleted = _signals.signal('event-deleted')
+# kwargs: event_id, user_id (None for guests)
+participant_joined = _signals.signal('participant-joined')
+# kwargs: event_id, user_id (None for guests)
+participant_left = _signals.signal('participant-left')
+# kwargs: user_id
+user_updated = _signals.signal('user-updated')
+# kwargs: user_id
+user_deleted = _signals.signal('user-deleted')
+# kwargs: follower_id, followee_id
+user_followed = _signals.signal('user-followed')
+# kwargs: follower_id, followee_id
+user_unfollowed = _signals.signal('user-unfollowed')
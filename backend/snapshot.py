@@ -0,0 +1,489 @@
+"""Snapshot export/import: copy the app's data between databases.
+
+    hopon snapshot export ./snap --workers 4
+    hopon snapshot import ./snap --replace
+
+A snapshot is a directory: ``manifest.json`` plus, per table, numbered
+gzip NDJSON chunks (``user_model/000000.ndjson.gz``), one JSON array of
+column values per line in the manifest's column order.
+
+- Export reads each table once, in primary-key order, through a
+  server-side cursor (``stream_results``), so memory stays at one chunk
+  per table whatever the table size. Tables are exported in parallel, one
+  connection each; on Postgres every connection reads the same exported
+  transaction snapshot, so the tables agree with each other.
+- A chunk file is renamed into place and recorded in the manifest with its
+  last key only once it is complete, so ``--resume`` continues an
+  interrupted export after the last recorded key (in a new snapshot).
+- Import inserts each chunk with one executemany INSERT in its own
+  transaction, in foreign-key order, and records finished chunks in
+  ``import-state.json``. ``--replace`` first empties the imported tables
+  and everything that references them (sessions, for users); it refuses
+  when that would empty a snapshot table left out with ``--table``.
+  Inserts skip rows whose key already exists, so a resumed import may
+  safely repeat a chunk. Postgres sequences are moved past the imported
+  ids and the map tile buckets are rebuilt at the end.
+
+Only the data tables are copied. Jobs, outbox messages, refresh sessions
+and revocations belong to the source environment and are left out.
+"""
+import functools
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import DateTime, delete, func, select, text, tuple_
+
+import tiles
+from models import db
+
+FORMAT = 'hopon-snapshot'
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+IMPORT_STATE = 'import-state.json'
+
+# Foreign-key order: import front to back, clear back to front.
+TABLES = (
+    'user_model',
+    'user_sports',
+    'follows',
+    'events',
+    'event_participants',
+    'event_waitlist',
+    'events_archive',
+    'event_participants_archive',
+)
+
+_SNAPSHOT_ID = re.compile(r'^[0-9A-Fa-f-]+$')
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _write_json(path: str, data: Dict) -> None:
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(data, fh, indent=2)
+    os.replace(tmp, path)
+
+
+class Progress:
+    """Thread-safe per-table progress lines."""
+
+    def __init__(self, echo: Callable[[str], None]):
+        self.echo = echo
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def report(self, verb: str, table: str, done: int, total: Optional[int], chunk: int) -> None:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        of = f'/{total}' if total is not None else ''
+        with self._lock:
+            self.echo(f"[SNAPSHOT] {verb} {table}: chunk {chunk}, {done}{of} rows "
+                      f"({done / elapsed:,.0f} rows/s)")
+
+
+class Manifest:
+    """``manifest.json``, saved after every chunk so an export can resume."""
+
+    def __init__(self, directory: str, data: Dict):
+        self.directory = directory
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: str) -> 'Manifest':
+        path = os.path.join(directory, MANIFEST)
+        with open(path) as fh:
+            data = json.load(fh)
+        if data.get('format') != FORMAT or data.get('version') != FORMAT_VERSION:
+            raise click.ClickException(f'{path} is not a {FORMAT} v{FORMAT_VERSION} manifest')
+        return cls(directory, data)
+
+    @classmethod
+    def create(cls, directory: str, dialect: str, chunk_rows: int, tables: Sequence[str]) -> 'Manifest':
+        data = {
+            'format': FORMAT,
+            'version': FORMAT_VERSION,
+            'created_at': datetime.utcnow().isoformat(),
+            'source_dialect': dialect,
+            'chunk_rows': chunk_rows,
+            'tables': {},
+        }
+        for name in tables:
+            table = db.metadata.tables[name]
+            data['tables'][name] = {
+                'columns': [column.name for column in table.columns],
+                'primary_key': [column.name for column in table.primary_key.columns],
+                'rows': 0,
+                'complete': False,
+                'chunks': [],
+            }
+        manifest = cls(directory, data)
+        manifest.save()
+        return manifest
+
+    @property
+    def tables(self) -> Dict[str, Dict]:
+        return self.data['tables']
+
+    def add_chunk(self, name: str, file: str, rows: int, last_key: List) -> None:
+        with self._lock:
+            entry = self.tables[name]
+            entry['chunks'].append({'file': file, 'rows': rows, 'last_key': last_key})
+            entry['rows'] += rows
+            self.save()
+
+    def finish(self, name: str) -> None:
+        with self._lock:
+            self.tables[name]['complete'] = True
+            self.save()
+
+    def save(self) -> None:
+        _write_json(os.path.join(self.directory, MANIFEST), self.data)
+
+
+# Export
+
+def _begin_snapshot(connection, snapshot_id: Optional[str]) -> None:
+    """Make `connection` read the coordinator's exported Postgres snapshot."""
+    if snapshot_id is None:
+        return
+    if not _SNAPSHOT_ID.match(snapshot_id):
+        raise ValueError(f'Unexpected snapshot id {snapshot_id!r}')
+    connection.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+
+
+def _estimated_rows(connection, name: str) -> Optional[int]:
+    """Row count for progress lines: the planner estimate on Postgres, exact elsewhere."""
+    if connection.dialect.name == 'postgresql':
+        estimate = connection.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:name AS regclass)'),
+            {'name': name},
+        ).scalar()
+        return estimate if estimate and estimate > 0 else None
+    return connection.execute(select(func.count()).select_from(db.metadata.tables[name])).scalar()
+
+
+def _write_chunk(path: str, rows, compresslevel: int) -> None:
+    tmp = f'{path}.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=compresslevel) as fh:
+        for row in rows:
+            fh.write(json.dumps(tuple(row), default=_encode, separators=(',', ':')))
+            fh.write('\n')
+    os.replace(tmp, path)
+
+
+def _export_table(engine, manifest: Manifest, name: str, snapshot_id: Optional[str],
+                  compresslevel: int, progress: Progress) -> int:
+    entry = manifest.tables[name]
+    if entry['complete']:
+        return 0
+    table = db.metadata.tables[name]
+    columns = [table.c[column] for column in entry['columns']]
+    key = [table.c[column] for column in entry['primary_key']]
+    key_positions = [entry['columns'].index(column) for column in entry['primary_key']]
+    query = select(*columns).order_by(*key)
+    if entry['chunks']:
+        last_key = entry['chunks'][-1]['last_key']
+        query = query.where(key[0] > last_key[0] if len(key) == 1 else tuple_(*key) > tuple_(*last_key))
+    os.makedirs(os.path.join(manifest.directory, name), exist_ok=True)
+
+    exported = 0
+    isolation = 'REPEATABLE READ' if snapshot_id else 'AUTOCOMMIT'
+    with engine.connect().execution_options(isolation_level=isolation) as connection:
+        if snapshot_id:
+            connection.begin()
+            _begin_snapshot(connection, snapshot_id)
+        total = _estimated_rows(connection, name)
+        result = connection.execution_options(
+            stream_results=True, yield_per=manifest.data['chunk_rows']
+        ).execute(query)
+        for rows in result.partitions():
+            index = len(entry['chunks'])
+            file = f'{name}/{index:06d}.ndjson.gz'
+            _write_chunk(os.path.join(manifest.directory, file), rows, compresslevel)
+            manifest.add_chunk(name, file, len(rows), [rows[-1][i] for i in key_positions])
+            exported += len(rows)
+            progress.report('exported', name, entry['rows'], total, index)
+        if snapshot_id:
+            connection.rollback()
+    manifest.finish(name)
+    return exported
+
+
+def export_snapshot(directory: str, tables: Sequence[str] = TABLES, workers: int = 4,
+                    chunk_rows: int = 50_000, compresslevel: int = 1, resume: bool = False,
+                    echo: Callable[[str], None] = click.echo) -> Dict[str, int]:
+    """Write `tables` to a snapshot in `directory`. Returns rows written per table."""
+    engine = db.engine
+    if os.path.exists(os.path.join(directory, MANIFEST)):
+        if not resume:
+            raise click.ClickException(f'{directory} already holds a snapshot; '
+                                       'pass --resume to continue it or choose another directory')
+        manifest = Manifest.load(directory)
+        missing = [name for name in tables if name not in manifest.tables]
+        if missing:
+            raise click.ClickException(f'Cannot resume: the snapshot does not include {", ".join(missing)}')
+    else:
+        os.makedirs(directory, exist_ok=True)
+        manifest = Manifest.create(directory, engine.dialect.name, chunk_rows, tables)
+
+    progress = Progress(echo)
+    coordinator = None
+    snapshot_id = None
+    if engine.dialect.name == 'postgresql':
+        # Hold a transaction open and share its snapshot with every worker,
+        # so parallel tables come from one point in time (as pg_dump -j does).
+        coordinator = engine.connect().execution_options(isolation_level='REPEATABLE READ')
+        coordinator.begin()
+        snapshot_id = coordinator.execute(text('SELECT pg_export_snapshot()')).scalar()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                name: pool.submit(_export_table, engine, manifest, name, snapshot_id, compresslevel, progress)
+                for name in tables
+            }
+            written = {name: future.result() for name, future in futures.items()}
+    finally:
+        if coordinator is not None:
+            coordinator.rollback()
+            coordinator.close()
+    return written
+
+
+# Import
+
+def _decoders(table, columns: Sequence[str]) -> List[Optional[Callable[[str], Any]]]:
+    return [
+        datetime.fromisoformat if isinstance(table.c[column].type, DateTime) else None
+        for column in columns
+    ]
+
+
+def _read_chunk(path: str, columns: Sequence[str], positions: Sequence[int], decoders) -> List[Dict]:
+    """Rows of one chunk as dicts of `columns`, taken from the line values at `positions`."""
+    rows = []
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        for line in fh:
+            values = json.loads(line)
+            row = {}
+            for column, position, decode in zip(columns, positions, decoders):
+                value = values[position]
+                row[column] = decode(value) if decode and value is not None else value
+            rows.append(row)
+    return rows
+
+
+def _insert_skipping_existing(table, dialect: str):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return table.insert()
+    return insert(table).on_conflict_do_nothing()
+
+
+class ImportState:
+    """``import-state.json``: the chunks already committed to the target."""
+
+    def __init__(self, path: str, done: Dict[str, List[int]]):
+        self.path = path
+        self.done = {name: set(indexes) for name, indexes in done.items()}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, directory: str, resume: bool) -> 'ImportState':
+        path = os.path.join(directory, IMPORT_STATE)
+        done = {}
+        if resume and os.path.exists(path):
+            with open(path) as fh:
+                done = json.load(fh)['done']
+        state = cls(path, done)
+        state.save()
+        return state
+
+    def is_done(self, name: str, index: int) -> bool:
+        return index in self.done.get(name, ())
+
+    def mark(self, name: str, index: int) -> None:
+        with self._lock:
+            self.done.setdefault(name, set()).add(index)
+            self.save()
+
+    def save(self) -> None:
+        _write_json(self.path, {'done': {name: sorted(indexes) for name, indexes in self.done.items()}})
+
+
+def _target_rows(tables: Sequence[str]) -> Dict[str, int]:
+    counts = {}
+    for name in tables:
+        count = db.session.execute(select(func.count()).select_from(db.metadata.tables[name])).scalar()
+        if count:
+            counts[name] = count
+    return counts
+
+
+def _dependents(tables: Sequence[str]) -> List[str]:
+    """Other tables whose foreign keys lead to `tables`, in foreign-key order."""
+    found = set(tables)
+    for table in db.metadata.sorted_tables:
+        if any(key.column.table.name in found for key in table.foreign_keys):
+            found.add(table.name)
+    return [table.name for table in db.metadata.sorted_tables if table.name in found - set(tables)]
+
+
+def _clear(tables: Sequence[str]) -> None:
+    """Delete the target's rows in `tables` and in the tables that reference them, dependants first."""
+    names = set(tables) | set(_dependents(tables))
+    for table in reversed(db.metadata.sorted_tables):
+        if table.name in names:
+            db.session.execute(delete(table))
+    db.session.commit()
+
+
+def _reset_sequences(tables: Sequence[str]) -> None:
+    """Move Postgres id sequences past the imported ids."""
+    for name in tables:
+        table = db.metadata.tables[name]
+        if 'id' not in table.c or not table.c.id.autoincrement:
+            continue
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence(:name, 'id'), MAX(id)) FROM {table.name} HAVING MAX(id) IS NOT NULL"
+        ), {'name': name})
+    db.session.commit()
+
+
+def _import_chunk(engine, manifest: Manifest, state: ImportState, name: str, statement,
+                  columns: Sequence[str], positions: Sequence[int], decoders, index: int) -> int:
+    chunk = manifest.tables[name]['chunks'][index]
+    rows = _read_chunk(os.path.join(manifest.directory, chunk['file']), columns, positions, decoders)
+    if rows:
+        with engine.begin() as connection:
+            connection.execute(statement, rows)
+    state.mark(name, index)
+    return len(rows)
+
+
+def import_snapshot(directory: str, tables: Optional[Sequence[str]] = None, workers: int = 4,
+                    replace: bool = False, resume: bool = False,
+                    echo: Callable[[str], None] = click.echo) -> Dict[str, int]:
+    """Load a snapshot into the app's database. Returns rows read per table."""
+    manifest = Manifest.load(directory)
+    tables = [name for name in TABLES if name in manifest.tables and (tables is None or name in tables)]
+    unfinished = [name for name in tables if not manifest.tables[name]['complete']]
+    if unfinished:
+        raise click.ClickException(f'The export of {", ".join(unfinished)} did not finish; '
+                                   'run export with --resume first')
+
+    engine = db.engine
+    if not resume:
+        existing = _target_rows(tables)
+        if existing and not replace:
+            found = ', '.join(f'{name} ({count})' for name, count in existing.items())
+            raise click.ClickException(f'The target already has rows in {found}; pass --replace to clear them')
+        if existing:
+            # Clearing a table also clears the tables that reference it. For
+            # snapshot tables that would lose data the import does not bring
+            # back, so they must be imported too.
+            left_out = _target_rows([name for name in _dependents(tables) if name in TABLES])
+            if left_out:
+                found = ', '.join(f'{name} ({count})' for name, count in left_out.items())
+                raise click.ClickException(f'--replace would delete rows in {found}, which reference the '
+                                           'imported tables; import those tables too')
+            _clear(tables)
+    state = ImportState.open(directory, resume)
+    # SQLite allows one writer at a time, so parallel chunks would only queue.
+    workers = 1 if engine.dialect.name == 'sqlite' else max(1, workers)
+
+    progress = Progress(echo)
+    imported = {}
+    for name in tables:
+        entry = manifest.tables[name]
+        table = db.metadata.tables[name]
+        columns = [column for column in entry['columns'] if column in table.c]
+        dropped = sorted(set(entry['columns']) - set(columns))
+        if dropped:
+            echo(f"[SNAPSHOT] {name}: skipping columns missing from the target: {', '.join(dropped)}")
+        positions = [entry['columns'].index(column) for column in columns]
+        decoders = _decoders(table, columns)
+        statement = _insert_skipping_existing(table, engine.dialect.name)
+        pending = [index for index in range(len(entry['chunks'])) if not state.is_done(name, index)]
+        load = functools.partial(_import_chunk, engine, manifest, state, name, statement,
+                                 columns, positions, decoders)
+
+        imported[name] = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for index, count in zip(pending, pool.map(load, pending)):
+                imported[name] += count
+                progress.report('imported', name, imported[name], entry['rows'], index)
+
+    if engine.dialect.name == 'postgresql':
+        _reset_sequences(tables)
+    if 'events' in tables:
+        counted = tiles.rebuild()
+        echo(f"[SNAPSHOT] Rebuilt map tile buckets for {counted} events")
+    return imported
+
+
+def _table_names(values: Sequence[str]) -> Sequence[str]:
+    unknown = [name for name in values if name not in TABLES]
+    if unknown:
+        raise click.BadParameter(f"Unknown table(s) {', '.join(unknown)}; choose from {', '.join(TABLES)}",
+                                 param_hint='--table')
+    return [name for name in TABLES if name in values] if values else TABLES
+
+
+@click.group('snapshot')
+def snapshot_cli():
+    """Export and import data snapshots."""
+
+
+@snapshot_cli.command('export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--table', 'table_names', multiple=True, help='Export only this table (repeatable).')
+@click.option('--workers', default=4, show_default=True, help='Tables exported in parallel.')
+@click.option('--chunk-rows', default=50_000, show_default=True, help='Rows per chunk file.')
+@click.option('--compress-level', default=1, show_default=True, type=click.IntRange(1, 9), help='gzip level.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted export in DIRECTORY.')
+@with_appcontext
+def export_command(directory, table_names, workers, chunk_rows, compress_level, resume):
+    """Write the data tables to a snapshot directory."""
+    started = time.monotonic()
+    written = export_snapshot(directory, _table_names(table_names), workers=workers, chunk_rows=chunk_rows,
+                              compresslevel=compress_level, resume=resume)
+    click.echo(f"[SNAPSHOT] Exported {sum(written.values())} rows from {len(written)} tables "
+               f"to {directory} in {time.monotonic() - started:.1f}s")
+
+
+@snapshot_cli.command('import')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--table', 'table_names', multiple=True, help='Import only this table (repeatable).')
+@click.option('--workers', default=4, show_default=True, help='Chunks inserted in parallel (1 on SQLite).')
+@click.option('--replace', is_flag=True,
+              help="Delete the target's rows in these tables, and in tables referencing them, first.")
+@click.option('--resume', is_flag=True, help='Skip chunks an interrupted import already committed.')
+@with_appcontext
+def import_command(directory, table_names, workers, replace, resume):
+    """Load a snapshot directory into the database."""
+    started = time.monotonic()
+    imported = import_snapshot(directory, _table_names(table_names) if table_names else None,
+                               workers=workers, replace=replace, resume=resume)
+    click.echo(f"[SNAPSHOT] Imported {sum(imported.values())} rows into {len(imported)} tables "
+               f"from {directory} in {time.monotonic() - started:.1f}s")
+
+
+def init_app(app) -> None:
+    app.cli.add_command(snapshot_cli)
@@ -0,0 +1,67 @@
+"""Shared fixtures: a fresh app on a temporary SQLite file per test."""
+import pytest
+from sqlalchemy import event as sa_event
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'hopon.db'}")
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'false')
+    monkeypatch.setenv('SEED_DATA', 'false')
+    import app as app_module
+    return app_module.create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_users(app):
+    """Insert `count` users and return their ids."""
+    from models import db, User
+
+    def make(count, prefix='player'):
+        with app.app_context():
+            users = [User(username=f'{prefix} {i}', email=f'{prefix}{i}@example.com') for i in range(count)]
+            db.session.add_all(users)
+            db.session.commit()
+            return [user.id for user in users]
+    return make
+
+
+@pytest.fixture
+def auth(app):
+    """Authorization headers for a user id."""
+    def headers(user_id):
+        token = app.extensions['tokens'].generate(user_id, 'access', expires_in=3600)
+        return {'Authorization': f'Bearer {token}'}
+    return headers
+
+
+class StatementCounter:
+    """Counts the SQL statements sent to `engine` inside a with block."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        sa_event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        sa_event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+@pytest.fixture
+def statements(app):
+    from models import db
+
+    with app.app_context():
+        return StatementCounter(db.engine)
@@ -0,0 +1,45 @@
+"""Account deletion (see accounts.py)."""
+from sqlalchemy import func, insert, select
+
+
+def create_event(client, headers, capacity=5):
+    return client.post('/events', headers=headers, json={
+        'name': 'Deletion test', 'sport': 'Soccer', 'location': 'Test field', 'max_players': capacity,
+    }).get_json()['event']['id']
+
+
+def test_chunked_deletion_leaves_no_rows_in_deleted_events(app, client, make_users, auth, monkeypatch):
+    import accounts
+    from models import db, Event, EventParticipant, WaitlistEntry
+
+    host, *players = make_users(6)
+    event_ids = [create_event(client, auth(host)) for _ in range(3)]
+    for user_id in players[:4]:
+        client.post(f'/events/{event_ids[0]}/join', headers=auth(user_id), json={})
+    late_joiner = players[4]
+
+    # Another player joins a hosted event between two slices of the events step.
+    commit = accounts._Deletion.commit
+    joined = []
+
+    def commit_then_join(self):
+        commit(self)
+        if not joined and db.session.get(Event, event_ids[0]) is None:
+            db.session.execute(insert(EventParticipant), {
+                'event_id': event_ids[1], 'user_id': late_joiner, 'player_name': 'Late', 'team': 'team_a',
+            })
+            db.session.commit()
+            joined.append(True)
+
+    monkeypatch.setattr(accounts._Deletion, 'commit', commit_then_join)
+    with app.app_context():
+        counts = accounts.delete_user_data(host, chunk_size=1)
+
+        assert joined
+        assert counts['events'] == 3
+        assert counts['hosted_event_participants'] == 4 + 1
+        for model in (EventParticipant, WaitlistEntry):
+            assert db.session.execute(
+                select(func.count()).select_from(model).where(model.event_id.in_(event_ids))
+            ).scalar() == 0
+        assert db.session.execute(select(func.count(Event.id))).scalar() == 0
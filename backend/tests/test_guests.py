@@ -0,0 +1,29 @@
+"""Guest spots claimed by a registered user (see guests.py)."""
+from sqlalchemy import select
+
+
+def test_claiming_a_spot_drops_the_users_own_waitlist_entry(app, client, make_users, auth):
+    from models import db, EventParticipant, WaitlistEntry
+
+    host, user, other = make_users(3)
+    event_id = client.post('/events', headers=auth(host), json={
+        'name': 'Claim test', 'sport': 'Soccer', 'location': 'Test field', 'max_players': 2,
+    }).get_json()['event']['id']
+    guest = client.post(f'/events/{event_id}/join', json={'player_name': 'Guest'}).get_json()['guest_token']
+    assert client.post(f'/events/{event_id}/join', headers=auth(user), json={'waitlist': True}).status_code == 202
+    assert client.post(f'/events/{event_id}/join', headers=auth(other), json={'waitlist': True}).status_code == 202
+
+    response = client.post('/auth/claim-guest', headers=auth(user), json={'guest_token': guest})
+    # A spot opening afterwards goes to the next player, not to the user again.
+    client.post(f'/events/{event_id}/leave', headers=auth(host), json={})
+
+    assert response.get_json()['claimed_event_ids'] == [event_id]
+    with app.app_context():
+        participants = db.session.execute(
+            select(EventParticipant.user_id).where(EventParticipant.event_id == event_id)
+        ).scalars().all()
+        waiting = db.session.execute(
+            select(WaitlistEntry.user_id).where(WaitlistEntry.event_id == event_id)
+        ).scalars().all()
+    assert sorted(participants) == sorted([user, other])
+    assert waiting == []
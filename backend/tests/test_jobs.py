@@ -0,0 +1,31 @@
+"""Retention of finished jobs (see jobs.prune)."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+
+def test_prune_jobs_keeps_recent_and_unfinished_jobs(app):
+    import jobs
+    from models import db, Job
+
+    now = datetime.utcnow()
+    ages = {
+        'old done': ('done', timedelta(days=2)),
+        'recent done': ('done', timedelta(hours=1)),
+        'old failed': ('failed', timedelta(days=8)),
+        'recent failed': ('failed', timedelta(days=2)),
+        'queued': ('queued', None),
+    }
+    with app.app_context():
+        db.session.add_all([
+            Job(name=name, status=status, finished_at=now - age if age else None)
+            for name, (status, age) in ages.items()
+        ])
+        db.session.commit()
+
+        jobs.prune_jobs_job({})
+        db.session.commit()
+
+        remaining = set(db.session.execute(select(Job.name)).scalars())
+    assert remaining == {'recent done', 'recent failed', 'queued'}
+    assert 'prune_jobs' in app.extensions['job_schedule']
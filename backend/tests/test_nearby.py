@@ -0,0 +1,21 @@
+"""Nearby search parameters (see geo.py)."""
+import pytest
+
+
+@pytest.mark.parametrize('path', ['/events/nearby', '/users/nearby'])
+@pytest.mark.parametrize('query', [
+    'lat=40&lng=-74&radius_km=nan',
+    'lat=nan&lng=-74&radius_km=5',
+    'lat=40&lng=inf&limit=5',
+    'lat=nan&lng=-74',
+])
+def test_non_finite_coordinates_are_rejected(client, path, query):
+    response = client.get(f'{path}?{query}')
+
+    assert response.status_code == 400
+    assert 'must be a finite number' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('path', ['/events/nearby', '/users/nearby'])
+def test_finite_radius_query_succeeds(client, path):
+    assert client.get(f'{path}?lat=40&lng=-74&radius_km=5').status_code == 200
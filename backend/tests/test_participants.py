@@ -0,0 +1,69 @@
+"""GET /events/<id>/participants: one joined query whatever the roster size."""
+import pytest
+from sqlalchemy import insert
+
+# A count plus the joined roster, and the team sizes with group_by=team.
+EXPECTED_STATEMENTS = {'': 2, '&group_by=team': 3}
+
+
+def build_event(app, user_ids, size):
+    """An event with `size` participants, every fourth one a guest, split over two teams."""
+    from models import db, Event, EventParticipant
+
+    with app.app_context():
+        event = Event(name=f'Run club {size}', sport='Running', location='Park', max_players=size,
+                      host_user_id=user_ids[0])
+        db.session.add(event)
+        db.session.flush()
+        db.session.execute(insert(EventParticipant), [
+            {
+                'event_id': event.id,
+                'user_id': None if i % 4 == 3 else user_ids[i % len(user_ids)],
+                'player_name': f'guest {i}' if i % 4 == 3 else f'player {i}',
+                'guest_name': f'guest {i}' if i % 4 == 3 else None,
+                'team': 'team_a' if i % 2 else 'team_b',
+            }
+            for i in range(size)
+        ])
+        db.session.commit()
+        return event.id
+
+
+@pytest.mark.parametrize('query', list(EXPECTED_STATEMENTS))
+@pytest.mark.parametrize('size', [4, 40, 200])
+def test_statement_count_does_not_grow_with_the_roster(app, client, make_users, statements, query, size):
+    event_id = build_event(app, make_users(size), size)
+
+    with statements:
+        response = client.get(f'/events/{event_id}/participants?limit=1000{query}')
+
+    assert response.status_code == 200
+    assert statements.count == EXPECTED_STATEMENTS[query]
+    body = response.get_json()
+    assert body['total'] == size
+    assert len(body['participants']) == size
+
+
+def test_guests_are_listed_with_registered_players(app, client, make_users):
+    user_ids = make_users(3)
+    event_id = build_event(app, user_ids, 8)
+
+    participants = client.get(f'/events/{event_id}/participants').get_json()['participants']
+
+    guests = [participant for participant in participants if participant['id'] is None]
+    assert [participant['guest_name'] for participant in guests] == ['guest 3', 'guest 7']
+    assert {participant['id'] for participant in participants} - {None} == set(user_ids)
+
+
+def test_group_by_team_reports_full_team_sizes_past_the_page(app, client, make_users):
+    event_id = build_event(app, make_users(10), 10)
+
+    body = client.get(f'/events/{event_id}/participants?group_by=team&limit=4').get_json()
+
+    assert [(team['team'], team['count']) for team in body['teams']] == [('team_a', 5), ('team_b', 5)]
+    assert sum(len(team['participants']) for team in body['teams']) == 4
+    assert [participant['team'] for participant in body['participants']] == ['team_a'] * 4
+
+
+def test_unknown_event_is_404(client):
+    assert client.get('/events/999/participants').status_code == 404
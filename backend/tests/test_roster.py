@@ -0,0 +1,109 @@
+"""POST /events/<id>/roster: batch joins and leaves (see roster.py)."""
+import pytest
+from sqlalchemy import select
+
+
+def create_event(client, headers, capacity):
+    response = client.post('/events', headers=headers, json={
+        'name': 'Roster test', 'sport': 'Soccer', 'location': 'Test field', 'max_players': capacity,
+    })
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.get_json()['event']['id']
+
+
+def post_roster(client, event_id, entries, headers=None):
+    response = client.post(f'/events/{event_id}/roster', headers=headers or {}, json={'entries': entries})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()['results']
+
+
+def players(app, event_id):
+    """(user id, guest name) of each participant of an event, in joining order."""
+    from models import db, EventParticipant
+
+    with app.app_context():
+        return db.session.execute(
+            select(EventParticipant.user_id, EventParticipant.guest_name)
+            .where(EventParticipant.event_id == event_id)
+            .order_by(EventParticipant.id)
+        ).all()
+
+
+@pytest.fixture
+def event(client, make_users, auth):
+    host, *others = make_users(4)
+    # The host takes the first spot, leaving one.
+    return create_event(client, auth(host), capacity=2), host, others
+
+
+def test_leave_frees_a_spot_for_a_later_join_in_the_batch(app, client, auth, event):
+    event_id, host, (a, b, c) = event
+    post_roster(client, event_id, [{'action': 'join', 'user_id': a}], auth(host))
+
+    results = post_roster(client, event_id, [
+        {'action': 'join', 'user_id': b},
+        {'action': 'leave', 'user_id': a},
+        {'action': 'join', 'user_id': b},
+        {'action': 'join', 'user_id': c},
+    ], auth(host))
+
+    assert [result['status'] for result in results] == ['full', 'left', 'joined', 'full']
+    assert [user_id for user_id, _ in players(app, event_id)] == [host, b]
+
+
+def test_duplicate_entries_are_reported_not_inserted(app, client, auth, event):
+    event_id, host, (a, _, _) = event
+
+    results = post_roster(client, event_id, [
+        {'action': 'join', 'user_id': a},
+        {'action': 'join', 'user_id': a},
+        {'action': 'join', 'user_id': host},
+    ], auth(host))
+
+    assert [result['status'] for result in results] == ['joined', 'already_joined', 'already_joined']
+    assert [user_id for user_id, _ in players(app, event_id)] == [host, a]
+
+
+def test_guest_token_from_a_join_removes_that_guest(app, client, event):
+    event_id, host, _ = event
+
+    joined, = post_roster(client, event_id, [{'action': 'join', 'player_name': 'Sam'}])
+    assert joined['status'] == 'joined'
+    assert players(app, event_id) == [(host, None), (None, 'Sam')]
+
+    wrong, = post_roster(client, event_id, [{'action': 'leave', 'guest_token': 'not-the-token'}])
+    left, = post_roster(client, event_id, [{'action': 'leave', 'guest_token': joined['guest_token']}])
+
+    assert wrong['status'] == 'not_participant'
+    assert left['status'] == 'left'
+    assert players(app, event_id) == [(host, None)]
+
+
+def test_only_the_host_can_change_another_players_spot(app, client, auth, event):
+    event_id, host, (a, b, _) = event
+
+    results = post_roster(client, event_id, [
+        {'action': 'join', 'user_id': b},
+        {'action': 'leave', 'user_id': host},
+        {'action': 'join'},
+    ], auth(a))
+
+    assert [result['status'] for result in results] == ['error', 'error', 'joined']
+    assert results[0]['error'] == "Only the host can change another player's spot"
+    assert [user_id for user_id, _ in players(app, event_id)] == [host, a]
+
+    results = post_roster(client, event_id, [{'action': 'leave', 'user_id': a}], auth(host))
+    assert [result['status'] for result in results] == ['left']
+
+
+def test_registered_entries_need_authentication(client, event):
+    event_id, _, (a, _, _) = event
+
+    results = post_roster(client, event_id, [{'action': 'join', 'user_id': a}, {'action': 'join'}])
+
+    assert [result.get('error') for result in results] == ['Authentication required'] * 2
+
+
+def test_unknown_event_is_404(client):
+    response = client.post('/events/999/roster', json={'entries': [{'action': 'join', 'player_name': 'Sam'}]})
+    assert response.status_code == 404
@@ -0,0 +1,208 @@
+"""Waitlist promotion: spots are never lost or given twice (see waitlist.py)."""
+import json
+import random
+import threading
+from collections import Counter
+
+import pytest
+from sqlalchemy import func, select
+
+
+def create_event(client, headers, capacity):
+    response = client.post('/events', headers=headers, json={
+        'name': 'Waitlist test', 'sport': 'Soccer', 'location': 'Test field', 'max_players': capacity,
+    })
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.get_json()['event']['id']
+
+
+def roster(app, event_id):
+    """(participant user ids, waitlisted user ids in order, max_players) of an event."""
+    from models import db, Event, EventParticipant, WaitlistEntry
+
+    with app.app_context():
+        participants = db.session.execute(
+            select(EventParticipant.user_id).where(EventParticipant.event_id == event_id)
+        ).scalars().all()
+        waiting = db.session.execute(
+            select(WaitlistEntry.user_id).where(WaitlistEntry.event_id == event_id).order_by(WaitlistEntry.position)
+        ).scalars().all()
+        return participants, waiting, db.session.get(Event, event_id).max_players
+
+
+def notifications(app):
+    from models import db, Job
+
+    with app.app_context():
+        return db.session.execute(
+            select(Job.payload).where(Job.name == 'notify_waitlist_promotion').order_by(Job.id)
+        ).scalars().all()
+
+
+def assert_consistent(participants, waiting, max_players):
+    assert len(participants) <= max_players
+    held = Counter(participants + waiting)
+    assert [user_id for user_id, n in held.items() if n > 1] == []
+    # A waiting player means there is no free spot.
+    assert not waiting or len(participants) == max_players
+
+
+@pytest.fixture
+def event(app, client, make_users, auth):
+    host, *players = make_users(4)
+    # The host takes the first spot, leaving two for three players.
+    event_id = create_event(client, auth(host), capacity=3)
+    return event_id, host, players
+
+
+def test_full_event_queues_players_in_order(app, client, auth, event):
+    event_id, host, players = event
+    statuses = [client.post(f'/events/{event_id}/join', headers=auth(user_id), json={'waitlist': True}).status_code
+                for user_id in players]
+
+    participants, waiting, _ = roster(app, event_id)
+    assert statuses == [200, 200, 202]
+    assert sorted(participants) == sorted([host] + players[:2])
+    assert waiting == players[2:]
+
+
+def test_full_event_without_waitlist_flag_is_refused(app, client, auth, event):
+    event_id, _, players = event
+    for user_id in players[:2]:
+        client.post(f'/events/{event_id}/join', headers=auth(user_id), json={})
+
+    response = client.post(f'/events/{event_id}/join', headers=auth(players[2]), json={})
+
+    assert response.status_code == 409
+    assert roster(app, event_id)[1] == []
+
+
+def test_leaving_promotes_the_head_of_the_waitlist(app, client, auth, event):
+    event_id, host, players = event
+    for user_id in players:
+        client.post(f'/events/{event_id}/join', headers=auth(user_id), json={'waitlist': True})
+
+    response = client.post(f'/events/{event_id}/leave', headers=auth(players[0]), json={})
+
+    participants, waiting, _ = roster(app, event_id)
+    assert response.status_code == 200
+    assert sorted(participants) == sorted([host] + players[1:])
+    assert waiting == []
+    assert len(notifications(app)) == 1
+
+
+def test_raising_capacity_promotes_waiting_players(app, client, auth, event):
+    event_id, host, players = event
+    for user_id in players:
+        client.post(f'/events/{event_id}/join', headers=auth(user_id), json={'waitlist': True})
+
+    response = client.patch(f'/events/{event_id}', headers=auth(host), json={'max_players': 5})
+
+    participants, waiting, _ = roster(app, event_id)
+    assert response.status_code == 200
+    assert sorted(participants) == sorted([host] + players)
+    assert waiting == []
+    assert len(notifications(app)) == 1
+
+
+@pytest.fixture
+def full_event(app, client, make_users, auth):
+    """Two spots (the host and A) with B on the waitlist; D is not involved yet."""
+    host, a, b, d = make_users(4)
+    event_id = create_event(client, auth(host), capacity=2)
+    client.post(f'/events/{event_id}/join', headers=auth(a), json={})
+    assert client.post(f'/events/{event_id}/join', headers=auth(b), json={'waitlist': True}).status_code == 202
+    return event_id, host, a, b, d
+
+
+def test_roster_join_does_not_jump_the_waitlist(app, client, auth, full_event):
+    event_id, host, a, b, d = full_event
+
+    response = client.post(f'/events/{event_id}/roster', headers=auth(host), json={'entries': [
+        {'action': 'leave', 'user_id': a}, {'action': 'join', 'user_id': d},
+    ]})
+
+    participants, waiting, _ = roster(app, event_id)
+    assert [result['status'] for result in response.get_json()['results']] == ['left', 'full']
+    assert sorted(participants) == sorted([host, b])
+    assert waiting == []
+
+
+def test_roster_join_takes_a_waitlisted_player_off_the_waitlist(app, client, auth, full_event):
+    event_id, host, a, b, d = full_event
+
+    response = client.post(f'/events/{event_id}/roster', headers=auth(host), json={'entries': [
+        {'action': 'leave', 'user_id': a}, {'action': 'join', 'user_id': b},
+    ]})
+
+    assert [result['status'] for result in response.get_json()['results']] == ['left', 'joined']
+    assert roster(app, event_id)[:2] == ([host, b], [])
+    # Nothing is left on the waitlist to promote B a second time.
+    client.post(f'/events/{event_id}/leave', headers=auth(host), json={})
+    participants, waiting, max_players = roster(app, event_id)
+    assert participants == [b]
+    assert_consistent(participants, waiting, max_players)
+
+
+def test_concurrent_joins_and_leaves_keep_the_invariants(app, make_users, auth):
+    """A smaller run of benchmarks/stress_waitlist.py: players race while the host raises capacity."""
+    import jobs
+    from models import db, Job, OutboxMessage
+
+    host, *players = make_users(25)
+    event_ids = [create_event(app.test_client(), auth(host), capacity=3) for _ in range(2)]
+    last_state, lock = {}, threading.Lock()
+
+    def player_worker(chunk, seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        for _ in range(30):
+            user_id, event_id = rng.choice(chunk), rng.choice(event_ids)
+            if rng.random() < 0.6:
+                response = client.post(f'/events/{event_id}/join', headers=auth(user_id), json={'waitlist': True})
+                state = 'in' if response.status_code in (200, 202) else None
+            else:
+                response = client.post(f'/events/{event_id}/leave', headers=auth(user_id), json={})
+                state = 'out' if response.status_code == 200 else None
+            if state is not None:
+                with lock:
+                    last_state[(event_id, user_id)] = state
+
+    def host_worker():
+        client = app.test_client()
+        for i in range(6):
+            event_id = event_ids[i % len(event_ids)]
+            current = client.get(f'/events/{event_id}').get_json()['max_players']
+            client.patch(f'/events/{event_id}', headers=auth(host), json={'max_players': current + 1})
+
+    # Each player belongs to one thread, so a player's own requests stay in order.
+    threads = [threading.Thread(target=player_worker, args=(players[i::4], i)) for i in range(4)]
+    threads.append(threading.Thread(target=host_worker))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for event_id in event_ids:
+        participants, waiting, max_players = roster(app, event_id)
+        assert_consistent(participants, waiting, max_players)
+        present = set(participants) | set(waiting)
+        for (e_id, user_id), state in last_state.items():
+            if e_id == event_id:
+                assert (user_id in present) == (state == 'in'), (event_id, user_id, state)
+
+    with app.app_context():
+        jobs.Worker(app, concurrency=1, poll_interval=0.05).run(burst=True)
+        promotions = [
+            message for message in db.session.execute(
+                select(OutboxMessage.payload).where(OutboxMessage.topic == 'participant.joined')
+            ).scalars()
+            if json.loads(message).get('promoted')
+        ]
+        statuses = dict(db.session.execute(
+            select(Job.status, func.count(Job.id)).where(Job.name == 'notify_waitlist_promotion').group_by(Job.status)
+        ).all())
+    # One notification per committed promotion, all delivered.
+    assert promotions
+    assert sum(statuses.values()) == len(promotions)
+    assert set(statuses) <= {'done'}
@@ -0,0 +1,273 @@
+"""Clustered event aggregates for map tiles.
+
+Map tiles use the standard Web Mercator ``z/x/y`` scheme. Every tile at
+zoom ``z`` (0..``MAX_ZOOM``) is split into a ``2**CLUSTER_BITS`` square grid
+of cells, and ``event_tile_buckets`` keeps, per zoom, cell and sport, the
+number of events and the sums of their coordinates. Serving a tile is then
+one primary-key range scan; each non-empty cell becomes a cluster with a
+count, a centroid and a sport breakdown.
+
+Buckets are maintained incrementally in the same transaction as the change:
+
+- ORM inserts, updates (of location or sport) and deletes of ``Event`` go
+  through mapper listeners registered below;
+- set-based deletes (archival, account deletion) call ``remove_matching``
+  before deleting the rows.
+
+``rebuild()`` recomputes everything from ``events``; it runs on boot when
+the table is empty and can be run with ``flask --app app tiles rebuild``.
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, bindparam, delete, event as orm_event, inspect, select, update
+
+from models import db, Event, EventTileBucket
+
+MAX_ZOOM = 16
+CLUSTER_BITS = 3  # 8x8 cells per tile
+MAX_LATITUDE = 85.05112878
+
+BucketKey = Tuple[int, int, int, str]  # zoom, cell_x, cell_y, sport
+Deltas = Dict[BucketKey, List[float]]  # [count, latitude_sum, longitude_sum]
+
+
+def cell_for(lat: float, lng: float, zoom: int) -> Tuple[int, int]:
+    """Grid cell containing lat/lng among the cells of tiles at `zoom`."""
+    n = 1 << (zoom + CLUSTER_BITS)
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Dict[str, float]:
+    n = 1 << z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return {
+        'north': lat(y),
+        'south': lat(y + 1),
+        'west': x / n * 360.0 - 180.0,
+        'east': (x + 1) / n * 360.0 - 180.0,
+    }
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+# Maintenance
+
+def _contributions(rows: Iterable, sign: int, deltas: Optional[Deltas] = None) -> Deltas:
+    """Add (or with sign=-1 subtract) each (lat, lng, sport) row to every zoom level."""
+    deltas = {} if deltas is None else deltas
+    for lat, lng, sport in rows:
+        if lat is None or lng is None:
+            continue
+        for zoom in range(MAX_ZOOM + 1):
+            cell_x, cell_y = cell_for(lat, lng, zoom)
+            delta = deltas.setdefault((zoom, cell_x, cell_y, sport or ''), [0, 0.0, 0.0])
+            delta[0] += sign
+            delta[1] += sign * lat
+            delta[2] += sign * lng
+    return deltas
+
+
+def _upsert(connection, rows: List[Dict]):
+    table = EventTileBucket.__table__
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['zoom', 'cell_x', 'cell_y', 'sport'],
+            set_={
+                'event_count': table.c.event_count + stmt.excluded.event_count,
+                'latitude_sum': table.c.latitude_sum + stmt.excluded.latitude_sum,
+                'longitude_sum': table.c.longitude_sum + stmt.excluded.longitude_sum,
+            },
+        ), rows)
+        return
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(_key_condition(row))
+            .values(
+                event_count=table.c.event_count + row['event_count'],
+                latitude_sum=table.c.latitude_sum + row['latitude_sum'],
+                longitude_sum=table.c.longitude_sum + row['longitude_sum'],
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+def _key_condition(row: Dict):
+    table = EventTileBucket.__table__
+    return and_(
+        table.c.zoom == row['zoom'],
+        table.c.cell_x == row['cell_x'],
+        table.c.cell_y == row['cell_y'],
+        table.c.sport == row['sport'],
+    )
+
+
+def apply_deltas(connection, deltas: Deltas) -> None:
+    rows = [
+        {'zoom': z, 'cell_x': cx, 'cell_y': cy, 'sport': sport,
+         'event_count': int(d[0]), 'latitude_sum': d[1], 'longitude_sum': d[2]}
+        for (z, cx, cy, sport), d in deltas.items() if d[0] or d[1] or d[2]
+    ]
+    if not rows:
+        return
+    _upsert(connection, rows)
+    emptied = [row for row in rows if row['event_count'] < 0]
+    if emptied:
+        table = EventTileBucket.__table__
+        connection.execute(
+            delete(table).where(
+                table.c.zoom == bindparam('b_zoom'),
+                table.c.cell_x == bindparam('b_cell_x'),
+                table.c.cell_y == bindparam('b_cell_y'),
+                table.c.sport == bindparam('b_sport'),
+                table.c.event_count <= 0,
+            ),
+            [{'b_zoom': r['zoom'], 'b_cell_x': r['cell_x'], 'b_cell_y': r['cell_y'], 'b_sport': r['sport']}
+             for r in emptied],
+        )
+
+
+def _event_rows(connection, condition):
+    return connection.execute(
+        select(Event.latitude, Event.longitude, Event.sport)
+        .where(condition)
+        .where(Event.latitude.isnot(None), Event.longitude.isnot(None))
+    ).all()
+
+
+def remove_matching(condition) -> None:
+    """Subtract the events matching `condition` before a set-based delete (no commit)."""
+    connection = db.session.connection()
+    apply_deltas(connection, _contributions(_event_rows(connection, condition), -1))
+
+
+@orm_event.listens_for(Event, 'after_insert')
+def _event_inserted(mapper, connection, target):
+    apply_deltas(connection, _contributions([(target.latitude, target.longitude, target.sport)], +1))
+
+
+@orm_event.listens_for(Event, 'before_update')
+def _event_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in ('latitude', 'longitude', 'sport')):
+        return
+    # Read the stored values rather than trusting attribute history, which
+    # is empty for attributes that were expired before being changed.
+    deltas = _contributions(_event_rows(connection, Event.id == target.id), -1)
+    _contributions([(target.latitude, target.longitude, target.sport)], +1, deltas)
+    apply_deltas(connection, deltas)
+
+
+@orm_event.listens_for(Event, 'before_delete')
+def _event_deleted(mapper, connection, target):
+    apply_deltas(connection, _contributions(_event_rows(connection, Event.id == target.id), -1))
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Recompute every bucket from the events table. Commits; returns events counted."""
+    db.session.execute(delete(EventTileBucket))
+    deltas: Deltas = {}
+    counted = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Event.id, Event.latitude, Event.longitude, Event.sport)
+            .where(Event.id > last_id, Event.latitude.isnot(None), Event.longitude.isnot(None))
+            .order_by(Event.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        _contributions([(lat, lng, sport) for _, lat, lng, sport in rows], +1, deltas)
+        counted += len(rows)
+        last_id = rows[-1][0]
+    apply_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    return counted
+
+
+def backfill_if_empty() -> None:
+    """Build buckets on first boot after the table is introduced."""
+    if db.session.execute(select(EventTileBucket.zoom).limit(1)).first() is not None:
+        return
+    if db.session.execute(select(Event.id).where(Event.latitude.isnot(None)).limit(1)).first() is None:
+        return
+    counted = rebuild()
+    print(f"[MIGRATION] Built map tile buckets for {counted} events", flush=True)
+
+
+# Reading
+
+def tile_clusters(z: int, x: int, y: int) -> Dict:
+    """Clusters (count, centroid, sport breakdown) for one tile, largest first."""
+    size = 1 << CLUSTER_BITS
+    rows = db.session.execute(
+        select(EventTileBucket.cell_x, EventTileBucket.cell_y, EventTileBucket.sport,
+               EventTileBucket.event_count, EventTileBucket.latitude_sum, EventTileBucket.longitude_sum)
+        .where(
+            EventTileBucket.zoom == z,
+            EventTileBucket.cell_x.between(x * size, (x + 1) * size - 1),
+            EventTileBucket.cell_y.between(y * size, (y + 1) * size - 1),
+            EventTileBucket.event_count > 0,
+        )
+    ).all()
+    cells: Dict[Tuple[int, int], Dict] = {}
+    for cell_x, cell_y, sport, count, lat_sum, lng_sum in rows:
+        cell = cells.setdefault((cell_x, cell_y), {'count': 0, 'lat_sum': 0.0, 'lng_sum': 0.0, 'sports': {}})
+        cell['count'] += count
+        cell['lat_sum'] += lat_sum
+        cell['lng_sum'] += lng_sum
+        cell['sports'][sport] = cell['sports'].get(sport, 0) + count
+    clusters = [
+        {
+            'count': cell['count'],
+            'latitude': cell['lat_sum'] / cell['count'],
+            'longitude': cell['lng_sum'] / cell['count'],
+            'sports': cell['sports'],
+        }
+        for cell in cells.values()
+    ]
+    clusters.sort(key=lambda c: -c['count'])
+    return {
+        'z': z,
+        'x': x,
+        'y': y,
+        'bounds': tile_bounds(z, x, y),
+        'total': sum(c['count'] for c in clusters),
+        'clusters': clusters,
+    }
+
+
+@click.group('tiles')
+def tiles_cli():
+    """Map tile bucket commands."""
+
+
+@tiles_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recompute all map tile buckets from the events table."""
+    counted = rebuild()
+    click.echo(f"[TILES] Rebuilt buckets for {counted} events")
+
+
+def init_app(app) -> None:
+    app.cli.add_command(tiles_cli)
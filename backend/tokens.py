@@ -0,0 +1,468 @@
+"""JWT access and refresh tokens.
+
+Tokens are HS256-signed and carry the user id (``sub``), their ``type``
+('access' or 'refresh') and a random ``jti``. Lifetimes come from
+``JWT_ACCESS_EXPIRES`` / ``JWT_REFRESH_EXPIRES`` of the current app.
+
+Signing and verification go through the app's ``TokenService``
+(``app.extensions['tokens']``):
+
+- ``JWT_KEYS`` lists ``kid:secret`` pairs. The first key signs new tokens
+  and its kid goes in the token header; every listed key verifies. To rotate
+  a secret, put a new key first and drop the old one once its tokens have
+  expired. Tokens without a kid (all tokens when ``JWT_KEYS`` is unset)
+  are signed and verified with ``JWT_SECRET``. Once ``JWT_KEYS`` is set,
+  they are only accepted while ``JWT_SECRET`` is set explicitly and before
+  ``JWT_LEGACY_UNTIL``; unset it to retire the old secret.
+- Verified claims are kept in a bounded LRU keyed by the SHA-256 digest of
+  the token, so a client polling with the same access token is not fully
+  re-decoded on every request. A cached token still expires at its ``exp``.
+- ``revoke`` and ``revoke_user`` write to ``revoked_tokens``. Each process
+  mirrors the unexpired rows in two dicts (jti -> expiry, user id -> cutoff)
+  and picks up new rows every ``JWT_REVOCATION_SYNC_SECONDS``. A revocation
+  therefore takes effect at once in the process that made it, and within
+  one sync interval everywhere else. The check itself is two dict lookups.
+
+Refresh tokens are only valid with a row in ``refresh_sessions``, which
+holds the SHA-256 hash of the current refresh token's jti. Every token of a
+session carries the session's ``family_id`` as its ``sid`` claim.
+``/auth/refresh`` rotates the token with one conditional UPDATE that swaps
+in the new hash, keeps the old one in ``rotated_from`` and records
+``rotated_at``. A validly signed token of a live session that is not the
+current one has been used before, however many rotations ago, so the session
+is ended (reuse detection). The one exception is the token replaced in the
+last ``REFRESH_REUSE_GRACE_SECONDS``: parallel refreshes from one client are
+answered with an access token and no new refresh token. Logout ends the
+session, and expired rows are deleted in batches by the periodic
+``sweep_refresh_sessions`` job.
+"""
+import calendar
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from uuid import uuid4
+
+import jwt
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+
+import jobs
+from models import db, RefreshSession, RevokedToken
+
+ALGORITHM = 'HS256'
+
+# Each sync re-reads revocations this far behind the previous one, so a row
+# whose transaction committed a little after its created_at is not missed.
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def _timestamp(value: datetime) -> int:
+    """Naive UTC datetime -> unix time, the way PyJWT encodes iat and exp."""
+    return calendar.timegm(value.utctimetuple())
+
+
+def hash_token_id(jti: str) -> str:
+    return hashlib.sha256(jti.encode()).hexdigest()
+
+
+def parse_keys(value: str) -> Dict[str, str]:
+    """Parse "kid:secret,kid:secret" into an ordered {kid: secret}."""
+    keys: Dict[str, str] = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        kid, _, secret = item.partition(':')
+        if not kid or not secret:
+            raise ValueError(f"Invalid JWT_KEYS entry '{kid}': expected kid:secret")
+        keys[kid] = secret
+    return keys
+
+
+class TokenService:
+    """Signs tokens, verifies them through an LRU, and tracks revocations."""
+
+    def __init__(self, keys: Optional[Dict[str, str]] = None, legacy_secret: Optional[str] = None,
+                 access_expires: int = 86400, refresh_expires: int = 604800,
+                 cache_size: int = 10_000, sync_interval: float = 5.0, sweep_batch_size: int = 1000,
+                 reuse_grace: float = 10.0, legacy_until: Optional[datetime] = None):
+        self.keys = dict(keys or {})
+        self.legacy_secret = legacy_secret
+        if not self.keys and not legacy_secret:
+            raise ValueError('JWT_KEYS or JWT_SECRET must be set')
+        # With JWT_KEYS set, kid-less tokens stop verifying after this time.
+        self.legacy_until = _timestamp(legacy_until) if legacy_until and self.keys else None
+        self.signing_kid = next(iter(self.keys), None)
+        self.access_expires = access_expires
+        self.refresh_expires = refresh_expires
+        self.cache_size = cache_size
+        self.sync_interval = sync_interval
+        self.sweep_batch_size = sweep_batch_size
+        self.reuse_grace = timedelta(seconds=reuse_grace)
+        self._verified: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._revoked_jtis: Dict[str, float] = {}  # jti -> exp (unix time)
+        self._revoked_users: Dict[int, float] = {}  # user id -> tokens issued at or before this are revoked
+        self._synced_from: Optional[datetime] = None
+        self._next_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    @classmethod
+    def from_config(cls, config) -> 'TokenService':
+        return cls(
+            keys=parse_keys(config['JWT_KEYS']),
+            legacy_secret=config['JWT_SECRET'],
+            access_expires=config['JWT_ACCESS_EXPIRES'],
+            refresh_expires=config['JWT_REFRESH_EXPIRES'],
+            cache_size=config['JWT_VERIFY_CACHE_SIZE'],
+            sync_interval=config['JWT_REVOCATION_SYNC_SECONDS'],
+            sweep_batch_size=config['REFRESH_SWEEP_BATCH_SIZE'],
+            reuse_grace=config['REFRESH_REUSE_GRACE_SECONDS'],
+            legacy_until=datetime.fromisoformat(config['JWT_LEGACY_UNTIL']) if config['JWT_LEGACY_UNTIL'] else None,
+        )
+
+    def init_app(self, app) -> None:
+        app.extensions['tokens'] = self
+        jobs.schedule(app, 'prune_revoked_tokens', every=3600)
+        jobs.schedule(app, 'sweep_refresh_sessions', every=3600)
+
+    # Signing
+
+    def generate(self, user_id: int, token_type: str, expires_in: Optional[int] = None,
+                 jti: Optional[str] = None, session_id: Optional[str] = None) -> str:
+        if expires_in is None:
+            expires_in = self.refresh_expires if token_type == 'refresh' else self.access_expires
+        now = datetime.utcnow()
+        payload = {
+            'sub': user_id,
+            'type': token_type,
+            'jti': jti or uuid4().hex,
+            'iat': now,
+            'exp': now + timedelta(seconds=expires_in),
+        }
+        if session_id is not None:
+            payload['sid'] = session_id
+        if self.signing_kid is None:
+            return jwt.encode(payload, self.legacy_secret, algorithm=ALGORITHM)
+        return jwt.encode(payload, self.keys[self.signing_kid], algorithm=ALGORITHM,
+                          headers={'kid': self.signing_kid})
+
+    # Verification
+
+    def verify(self, token: str, expected_type: Optional[str] = None) -> Optional[dict]:
+        """Claims of a valid, unexpired, unrevoked token, or None."""
+        digest = hashlib.sha256(token.encode()).digest()
+        self._sync_if_due()
+        claims = self._cached(digest)
+        if claims is None:
+            claims = self._decode(token)
+            if claims is None:
+                return None
+            self._remember(digest, claims)
+        elif claims['exp'] <= time.time():
+            print("[DEBUG] JWT token EXPIRED (cached)", flush=True)
+            return None
+        if expected_type and claims.get('type') != expected_type:
+            print(f"[DEBUG] Token type mismatch. Expected: {expected_type}, Got: {claims.get('type')}", flush=True)
+            return None
+        if self._is_revoked(claims, digest):
+            self._counts['revoked'] += 1
+            return None
+        return dict(claims)
+
+    def _cached(self, digest: bytes) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            claims = self._verified.get(digest)
+            if claims is None:
+                self._counts['misses'] += 1
+                return None
+            self._verified.move_to_end(digest)
+            self._counts['hits'] += 1
+            return claims
+
+    def _remember(self, digest: bytes, claims: Dict[str, Any]) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._verified[digest] = claims
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+
+    def _decode(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+            if kid is None:
+                secret = self._legacy_secret()
+                if secret is None:
+                    print("[DEBUG] JWT without a key id rejected (legacy secret retired)", flush=True)
+                    return None
+            else:
+                secret = self.keys.get(kid)
+                if secret is None:
+                    print(f"[DEBUG] JWT signed with unknown key id {kid!r}", flush=True)
+                    return None
+            return jwt.decode(token, secret, algorithms=[ALGORITHM], options={'require': ['exp', 'iat']})
+        except jwt.ExpiredSignatureError as e:
+            print(f"[DEBUG] JWT token EXPIRED: {e}", flush=True)
+        except jwt.PyJWTError as e:
+            print(f"[DEBUG] JWT decode failed ({type(e).__name__}): {e}", flush=True)
+        return None
+
+    def _legacy_secret(self) -> Optional[str]:
+        """JWT_SECRET if kid-less tokens are still accepted, else None."""
+        if self.legacy_until is not None and time.time() >= self.legacy_until:
+            return None
+        return self.legacy_secret
+
+    # Revocation
+
+    @staticmethod
+    def _token_id(claims: Dict[str, Any], digest: bytes) -> str:
+        # Tokens minted before jti existed are revoked by digest.
+        return claims.get('jti') or digest.hex()
+
+    def _is_revoked(self, claims: Dict[str, Any], digest: bytes) -> bool:
+        if self._token_id(claims, digest) in self._revoked_jtis:
+            return True
+        cutoff = self._revoked_users.get(claims.get('sub'))
+        return cutoff is not None and claims['iat'] <= cutoff
+
+    def revoke(self, token: str) -> bool:
+        """Revoke one token until it expires (no commit). False if it is not a valid token."""
+        claims = self.verify(token)
+        if claims is None:
+            return False
+        digest = hashlib.sha256(token.encode()).digest()
+        jti = self._token_id(claims, digest)
+        expires_at = datetime.utcfromtimestamp(claims['exp'])
+        db.session.execute(
+            jobs.insert_ignoring_duplicates(RevokedToken.__table__, 'jti'),
+            {'jti': jti, 'expires_at': expires_at, 'created_at': datetime.utcnow()},
+        )
+        self._revoked_jtis[jti] = claims['exp']
+        with self._lock:
+            self._verified.pop(digest, None)
+        return True
+
+    def revoke_user(self, user_id: int) -> None:
+        """Revoke every token issued to the user so far (no commit)."""
+        now = datetime.utcnow()
+        longest = max(self.access_expires, self.refresh_expires)
+        db.session.execute(insert(RevokedToken), {
+            'user_id': user_id,
+            'expires_at': now + timedelta(seconds=longest),
+            'created_at': now,
+        })
+        self._revoke_user_locally(user_id, now)
+
+    def _revoke_user_locally(self, user_id: int, revoked_at: datetime) -> None:
+        # iat has whole-second precision, so the cutoff is too.
+        cutoff = float(_timestamp(revoked_at))
+        if cutoff > self._revoked_users.get(user_id, float('-inf')):
+            self._revoked_users[user_id] = cutoff
+
+    def _sync_if_due(self) -> None:
+        if time.monotonic() < self._next_sync or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.sync()
+        finally:
+            self._sync_lock.release()
+
+    def sync(self) -> int:
+        """Load revocations written since the last sync (by any process). Returns rows read."""
+        started = datetime.utcnow()
+        query = select(RevokedToken.jti, RevokedToken.user_id, RevokedToken.expires_at, RevokedToken.created_at)
+        if self._synced_from is None:
+            query = query.where(RevokedToken.expires_at > started)
+        else:
+            query = query.where(RevokedToken.created_at >= self._synced_from - SYNC_OVERLAP)
+        rows = db.session.execute(query).all()
+        for row in rows:
+            if row.jti is not None:
+                self._revoked_jtis[row.jti] = _timestamp(row.expires_at)
+            if row.user_id is not None:
+                self._revoke_user_locally(row.user_id, row.created_at)
+        now = time.time()
+        for jti, exp in list(self._revoked_jtis.items()):
+            if exp <= now:
+                self._revoked_jtis.pop(jti, None)
+        user_cutoff = now - max(self.access_expires, self.refresh_expires)
+        for user_id, cutoff in list(self._revoked_users.items()):
+            if cutoff < user_cutoff:
+                self._revoked_users.pop(user_id, None)
+        self._synced_from = started
+        self._next_sync = time.monotonic() + self.sync_interval
+        return len(rows)
+
+    def prune(self) -> int:
+        """Delete revocations of tokens that have expired anyway (no commit)."""
+        return db.session.execute(
+            delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow())
+        ).rowcount
+
+    # Refresh sessions
+
+    def start_session(self, user_id: int) -> str:
+        """Open a refresh session and return its first refresh token (no commit)."""
+        jti, family_id = uuid4().hex, uuid4().hex
+        db.session.execute(insert(RefreshSession), {
+            'token_hash': hash_token_id(jti),
+            'user_id': user_id,
+            'family_id': family_id,
+            'expires_at': datetime.utcnow() + timedelta(seconds=self.refresh_expires),
+        })
+        return self.generate(user_id, 'refresh', jti=jti, session_id=family_id)
+
+    def rotate(self, token: str) -> Tuple[Optional[int], Optional[str]]:
+        """Exchange a refresh token for the next one in its session (no commit).
+
+        Returns (user id, new refresh token), or (None, None) when the token
+        is invalid, its session is gone, or it was already rotated. In that
+        last case the session is ended: the token has been used twice. The
+        token rotated away within the reuse grace period gives (user id,
+        None): the caller is valid but keeps the refresh token it was just
+        sent.
+        """
+        claims = self.verify(token, 'refresh')
+        if claims is None:
+            return None, None
+        user_id = claims['sub']
+        if claims.get('jti') is None:
+            return self._adopt(token, user_id)
+        old_hash = hash_token_id(claims['jti'])
+        # Sessions opened before families existed get one on their next rotation.
+        family_id = claims.get('sid') or uuid4().hex
+        jti = uuid4().hex
+        now = datetime.utcnow()
+        rotated = db.session.execute(
+            update(RefreshSession)
+            .where(RefreshSession.token_hash == old_hash, RefreshSession.user_id == user_id)
+            .values(token_hash=hash_token_id(jti), rotated_from=old_hash, rotated_at=now,
+                    family_id=func.coalesce(RefreshSession.family_id, family_id),
+                    expires_at=now + timedelta(seconds=self.refresh_expires))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if rotated == 1:
+            self._counts['refresh_rotated'] += 1
+            return user_id, self.generate(user_id, 'refresh', jti=jti, session_id=family_id)
+        # Only reached for unknown or replayed tokens, so the happy path
+        # stays one indexed UPDATE. A token without a sid predates families
+        # and can only be matched as the previous token.
+        if claims.get('sid') is not None:
+            match = RefreshSession.family_id == claims['sid']
+        else:
+            match = RefreshSession.rotated_from == old_hash
+        session = db.session.execute(
+            select(RefreshSession.id, RefreshSession.rotated_from, RefreshSession.rotated_at)
+            .where(match, RefreshSession.user_id == user_id)
+        ).first()
+        if session is None:
+            return None, None
+        if (session.rotated_from == old_hash and session.rotated_at is not None
+                and now - session.rotated_at <= self.reuse_grace):
+            self._counts['refresh_concurrent'] += 1
+            return user_id, None
+        db.session.execute(delete(RefreshSession).where(RefreshSession.id == session.id))
+        self._counts['refresh_reuse'] += 1
+        print(f"[AUTH] Refresh token reuse detected for user {user_id}; session ended", flush=True)
+        return None, None
+
+    def _adopt(self, token: str, user_id: int) -> Tuple[Optional[int], Optional[str]]:
+        # A refresh token from before sessions existed is exchanged once for
+        # a session; revoking it stops it from being exchanged again.
+        if not self.revoke(token):
+            return None, None
+        return user_id, self.start_session(user_id)
+
+    def end_session(self, token: str) -> bool:
+        """End the session a refresh token belongs to (no commit)."""
+        claims = self.verify(token, 'refresh')
+        if claims is None or claims.get('jti') is None:
+            return False
+        return db.session.execute(
+            delete(RefreshSession).where(RefreshSession.token_hash == hash_token_id(claims['jti']))
+        ).rowcount == 1
+
+    def sweep(self, batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> int:
+        """Delete expired refresh sessions in batches, committing after each. Returns rows deleted."""
+        batch_size = batch_size or self.sweep_batch_size
+        deleted = batches = 0
+        while max_batches is None or batches < max_batches:
+            ids = db.session.execute(
+                select(RefreshSession.id)
+                .where(RefreshSession.expires_at < datetime.utcnow())
+                .order_by(RefreshSession.expires_at)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            deleted += db.session.execute(delete(RefreshSession).where(RefreshSession.id.in_(ids))).rowcount
+            db.session.commit()
+            batches += 1
+        return deleted
+
+    # Metrics
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = len(self._verified)
+            counts = dict(self._counts)
+        lookups = counts.get('hits', 0) + counts.get('misses', 0)
+        return {
+            'signing_kid': self.signing_kid,
+            'kids': list(self.keys),
+            'cache_size': cached,
+            'cache_hits': counts.get('hits', 0),
+            'cache_misses': counts.get('misses', 0),
+            'cache_hit_rate': round(counts.get('hits', 0) / lookups, 4) if lookups else None,
+            'revoked_rejections': counts.get('revoked', 0),
+            'revoked_tokens': len(self._revoked_jtis),
+            'revoked_users': len(self._revoked_users),
+            'refresh_rotated': counts.get('refresh_rotated', 0),
+            'refresh_concurrent': counts.get('refresh_concurrent', 0),
+            'refresh_reuse_detected': counts.get('refresh_reuse', 0),
+        }
+
+
+def generate_token(user_id: int, token_type: str, expires_in: Optional[int] = None) -> str:
+    return current_app.extensions['tokens'].generate(user_id, token_type, expires_in)
+
+
+def decode_token(token: str, expected_type: Optional[str] = None) -> Optional[dict]:
+    return current_app.extensions['tokens'].verify(token, expected_type)
+
+
+def start_refresh_session(user_id: int) -> str:
+    return current_app.extensions['tokens'].start_session(user_id)
+
+
+def rotate_refresh_token(token: str) -> Tuple[Optional[int], Optional[str]]:
+    return current_app.extensions['tokens'].rotate(token)
+
+
+def end_refresh_session(token: str) -> bool:
+    return current_app.extensions['tokens'].end_session(token)
+
+
+def revoke_token(token: str) -> bool:
+    return current_app.extensions['tokens'].revoke(token)
+
+
+def revoke_user_tokens(user_id: int) -> None:
+    current_app.extensions['tokens'].revoke_user(user_id)
+
+
+@jobs.job('prune_revoked_tokens', max_attempts=3)
+def prune_revoked_tokens_job(payload):
+    pruned = current_app.extensions['tokens'].prune()
+    if pruned:
+        print(f"[TOKENS] Pruned {pruned} expired revocations", flush=True)
+
+
+@jobs.job('sweep_refresh_sessions', max_attempts=3)
+def sweep_refresh_sessions_job(payload):
+    swept = current_app.extensions['tokens'].sweep(batch_size=payload.get('batch_size'))
+    if swept:
+        print(f"[TOKENS] Swept {swept} expired refresh sessions", flush=True)
@@ -0,0 +1,133 @@
+"""Waitlists for full events, with promotion when spots open.
+
+When an event is full, ``POST /events/<id>/join`` with ``"waitlist": true``
+queues the player in ``event_waitlist`` instead of answering 409. Entries
+are ordered by ``position``, which only grows per event.
+
+Every change to an event's roster or capacity starts with ``lock_event``,
+a no-op UPDATE of the event row. It takes the row lock on Postgres and the
+database write lock on SQLite (where ``SELECT ... FOR UPDATE`` does
+nothing), so counts read afterwards stay true until the commit. Within that
+transaction ``promote`` moves the lowest positions into the free spots with
+one bulk INSERT and one bulk DELETE, records a ``participant.joined``
+outbox message per promotion and enqueues a ``notify_waitlist_promotion``
+job per promoted user. Both are written in the same transaction, so a
+notification exists exactly when its promotion committed.
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, exists, func, insert, select, update
+
+import jobs
+import outbox
+from models import db, Event, EventParticipant, WaitlistEntry
+
+ENTRY_COLUMNS = ['event_id', 'user_id', 'player_name', 'team', 'guest_name', 'guest_token']
+
+
+def lock_event(event_id: int) -> bool:
+    """Lock the event row until the end of the transaction. False if it does not exist."""
+    result = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id)
+        .values(max_players=Event.max_players)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def find_entry(event_id: int, user_id: Optional[int] = None,
+               guest_token: Optional[str] = None) -> Optional[WaitlistEntry]:
+    """The waitlist entry for a user id or a hashed guest token."""
+    if user_id is not None:
+        condition = WaitlistEntry.user_id == user_id
+    elif guest_token is not None:
+        condition = WaitlistEntry.guest_token == guest_token
+    else:
+        return None
+    return db.session.execute(
+        select(WaitlistEntry).where(WaitlistEntry.event_id == event_id, condition)
+    ).scalar_one_or_none()
+
+
+def place(entry: WaitlistEntry) -> int:
+    """1-based place in line; positions can have gaps, so this is a count."""
+    return db.session.execute(
+        select(func.count(WaitlistEntry.id)).where(
+            WaitlistEntry.event_id == entry.event_id,
+            WaitlistEntry.position <= entry.position,
+        )
+    ).scalar()
+
+
+def add(event_id: int, user_id: Optional[int], player_name: str, team: str,
+        guest_name: Optional[str] = None, guest_token: Optional[str] = None) -> WaitlistEntry:
+    """Append a player to the event's waitlist (no commit). The event must be locked."""
+    last = db.session.execute(
+        select(func.max(WaitlistEntry.position)).where(WaitlistEntry.event_id == event_id)
+    ).scalar()
+    entry = WaitlistEntry(
+        event_id=event_id,
+        user_id=user_id,
+        player_name=player_name,
+        team=team,
+        guest_name=guest_name,
+        guest_token=guest_token,
+        position=(last or 0) + 1,
+    )
+    db.session.add(entry)
+    db.session.flush()
+    return entry
+
+
+def promote(event_id: int) -> List[Optional[int]]:
+    """Fill the event's free spots from the head of its waitlist (no commit).
+
+    The event must be locked. Returns the promoted user ids (None for guests).
+    """
+    # One round trip decides whether there is anything to do.
+    max_players, count, waiting = db.session.execute(
+        select(
+            Event.max_players,
+            select(func.count(EventParticipant.id))
+            .where(EventParticipant.event_id == Event.id).scalar_subquery(),
+            exists().where(WaitlistEntry.event_id == Event.id),
+        ).where(Event.id == event_id)
+    ).one()
+    free = (max_players or 0) - count
+    if free <= 0 or not waiting:
+        return []
+    rows = db.session.execute(
+        select(WaitlistEntry.id, *[getattr(WaitlistEntry, column) for column in ENTRY_COLUMNS])
+        .where(WaitlistEntry.event_id == event_id)
+        .order_by(WaitlistEntry.position)
+        .limit(free)
+    ).all()
+    if not rows:
+        return []
+    db.session.execute(delete(WaitlistEntry).where(WaitlistEntry.id.in_([row.id for row in rows])))
+    db.session.execute(insert(EventParticipant), [
+        {column: getattr(row, column) for column in ENTRY_COLUMNS} for row in rows
+    ])
+    # No idempotency key: the job commits or rolls back with the promotion
+    # itself, and entry ids and positions can be reused after deletes.
+    for row in rows:
+        outbox.record('participant.joined', {'event_id': event_id, 'user_id': row.user_id, 'promoted': True})
+        if row.user_id is not None:
+            jobs.enqueue('notify_waitlist_promotion', {'event_id': event_id, 'user_id': row.user_id})
+    return [row.user_id for row in rows]
+
+
+def promote_many(event_ids) -> Dict[int, List[Optional[int]]]:
+    """Lock and promote each event in id order (a fixed order avoids deadlocks)."""
+    promoted = {}
+    for event_id in sorted(set(event_ids)):
+        if lock_event(event_id):
+            promoted[event_id] = promote(event_id)
+    return promoted
+
+
+@jobs.job('notify_waitlist_promotion')
+def notify_waitlist_promotion(payload):
+    # Delivery (push/email) hooks in here; for now the promotion is logged.
+    print(f"[WAITLIST] User {payload['user_id']} promoted into event {payload['event_id']}", flush=True)
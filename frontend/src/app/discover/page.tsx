@@ -6,7 +6,7 @@ import { UserCard } from "@/components/user-card";
 import { EventCard } from "@/components/event-card";
 import { EventDetailsModal } from "@/components/event-details-modal";
 import { Search } from "lucide-react";
-import { Api, type HopOnEvent, type HopOnUser } from "@/lib/api";
+import { Api, type EventParticipant, type HopOnEvent, type HopOnUser } from "@/lib/api";
 import { FALLBACK_EVENTS, FALLBACK_PLAYERS } from "@/lib/fallback-data";
 import * as React from "react";
 import { useAuth } from "@/context/auth-context";
@@ -56,7 +56,7 @@ export default function DiscoverPage() {
   const [playerOverrides, setPlayerOverrides] = React.useState<Record<string, boolean>>({});
   const [selectedEventId, setSelectedEventId] = React.useState<number | undefined>();
   const [selectedEventForModal, setSelectedEventForModal] = React.useState<HopOnEvent | null>(null);
-  const [eventParticipants, setEventParticipants] = React.useState<HopOnUser[]>([]);
+  const [eventParticipants, setEventParticipants] = React.useState<EventParticipant[]>([]);
   const [joinedSet, setJoinedSet] = React.useState<Set<number>>(new Set());
   const [pendingAction, setPendingAction] = React.useState<{ id: number; type: "join" | "leave" } | null>(null);
   const { user } = useAuth();
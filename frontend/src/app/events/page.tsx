@@ -4,7 +4,7 @@ import WebLayout from "@/components/web-layout";
 import { EventCard } from "@/components/event-card";
 import { EventDetailsModal } from "@/components/event-details-modal";
 import * as React from "react";
-import { Api, type HopOnEvent, type HopOnUser } from "@/lib/api";
+import { Api, type HopOnEvent, type EventParticipant } from "@/lib/api";
 import { useAuth } from "@/context/auth-context";
 import { useRouter } from "next/navigation";
 
@@ -24,7 +24,7 @@ export default function EventsPage() {
   const [hosted, setHosted] = React.useState<HopOnEvent[]>([]);
   const [actionEventId, setActionEventId] = React.useState<number | null>(null);
   const [selectedEventForModal, setSelectedEventForModal] = React.useState<HopOnEvent | null>(null);
-  const [eventParticipants, setEventParticipants] = React.useState<HopOnUser[]>([]);
+  const [eventParticipants, setEventParticipants] = React.useState<EventParticipant[]>([]);
 
   const loadMyEvents = React.useCallback(async () => {
     try {
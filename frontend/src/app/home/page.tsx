@@ -4,7 +4,7 @@ import WebLayout from "@/components/web-layout";
 import MapDisplay from "@/components/map-display";
 import { EventCard } from "@/components/event-card";
 import { EventDetailsModal } from "@/components/event-details-modal";
-import { Api, type HopOnEvent, type HopOnUser } from "@/lib/api";
+import { Api, type HopOnEvent, type EventParticipant } from "@/lib/api";
 import Image from "next/image";
 import * as React from "react";
 import { FALLBACK_EVENTS } from "@/lib/fallback-data";
@@ -29,7 +29,7 @@ export default function HomePage() {
   const [hostedEvents, setHostedEvents] = React.useState<HopOnEvent[]>([]);
   const [selectedEventIdOnMap, setSelectedEventIdOnMap] = React.useState<number | undefined>();
   const [selectedEventForModal, setSelectedEventForModal] = React.useState<HopOnEvent | null>(null);
-  const [eventParticipants, setEventParticipants] = React.useState<HopOnUser[]>([]);
+  const [eventParticipants, setEventParticipants] = React.useState<EventParticipant[]>([]);
   const { status, user } = useAuth();
   
   // Get user's real-time location, fallback to profile location
@@ -2,7 +2,7 @@
 
 import React, { useState, useEffect } from "react";
 import { X, MapPin, Users, Edit2, Trash2 } from "lucide-react";
-import { HopOnEvent, HopOnUser, Api } from "@/lib/api";
+import { EventParticipant, HopOnEvent, HopOnUser, Api } from "@/lib/api";
 import { getSportEmoji } from "@/lib/sports-emoji";
 import { AVAILABLE_SPORTS } from "@/lib/sports";
 import LocationPicker from "./location-picker";
@@ -14,7 +14,7 @@ interface EventDetailsModalProps {
   currentUser?: HopOnUser | null;
   onEventDeleted?: () => void;
   onEventUpdated?: () => void;
-  participants: HopOnUser[];
+  participants: EventParticipant[];
 }
 
 export function EventDetailsModal({
@@ -36,7 +36,7 @@ export function EventDetailsModal({
   useEffect(() => {
     console.log("[EventDetailsModal] Participants updated:", participants);
     participants.forEach((p) => {
-      console.log("[EventDetailsModal] Participant:", { id: p.id, username: p.username, email: p.email });
+      console.log("[EventDetailsModal] Participant:", { id: p.id, username: p.username, guest: p.guest });
     });
   }, [participants]);
   
@@ -355,17 +355,17 @@ export function EventDetailsModal({
                 <div className="grid grid-cols-2 sm:grid-cols-3 gap-3 max-h-96 overflow-y-auto">
                   {participants.map((participant) => (
                     <div
-                      key={participant.id}
+                      key={participant.participant_id}
                       className="relative rounded-lg border border-neutral-700 bg-neutral-800/40 hover:bg-neutral-800/60 backdrop-blur p-3 transition group"
                     >
                       {/* Avatar */}
                       <div className="flex h-12 w-12 items-center justify-center rounded-lg bg-gradient-to-br from-red-500 to-red-600 text-lg font-bold uppercase text-white mx-auto mb-2">
-                        {(participant.username || "?").slice(0, 1)}
+                        {(participant.username || participant.guest_name || participant.player_name || "?").slice(0, 1)}
                       </div>
                       
                       {/* Username */}
                       <p className="text-sm font-medium text-white text-center truncate">
-                        {participant.username || "Unknown"}
+                        {participant.username || participant.guest_name || participant.player_name || "Unknown"}
                       </p>
                       
                       {/* Rating */}
@@ -376,7 +376,7 @@ export function EventDetailsModal({
                       )}
                       
                       {/* Host Badge */}
-                      {participant.id === event.host_user_id && (
+                      {participant.id !== null && participant.id === event.host_user_id && (
                         <div className="absolute top-2 right-2">
                           <span className="text-xs font-semibold text-red-400 bg-red-500/20 border border-red-500/40 px-2 py-0.5 rounded-full">
                             Host
@@ -18,6 +18,48 @@ export type HopOnEvent = {
   host?: { id: number; username: string; avatar_url?: string | null } | null;
 };
 
+export type EventTileCluster = {
+  count: number;
+  latitude: number;
+  longitude: number;
+  sports: Record<string, number>;
+};
+
+export type EventTile = {
+  z: number;
+  x: number;
+  y: number;
+  bounds: { north: number; south: number; west: number; east: number };
+  total: number;
+  clusters: EventTileCluster[];
+};
+
+export type RosterEntry = {
+  action: "join" | "leave";
+  user_id?: number;
+  player_name?: string;
+  guest_token?: string;
+  team?: string;
+};
+
+export type RosterResult = {
+  index: number;
+  action: string;
+  status: "joined" | "already_joined" | "full" | "left" | "not_participant" | "error";
+  user_id?: number;
+  player_name?: string;
+  guest_token?: string;
+  error?: string;
+};
+
+export type WaitlistEntry = {
+  position: number;
+  user_id: number | null;
+  player_name: string;
+  team: string | null;
+  created_at: string | null;
+};
+
 export type HopOnUser = {
   id: number;
   username: string;
@@ -38,12 +80,31 @@ export type HopOnUser = {
   created_at?: string | null;
 };
 
+// One spot in an event's roster: a registered player's public fields, or a
+// guest (id null, guest_name set).
+export type EventParticipant = {
+  participant_id: number;
+  team: string | null;
+  joined_at: string | null;
+  player_name: string;
+  guest: boolean;
+  guest_name: string | null;
+  id: number | null;
+  username: string | null;
+  avatar_url: string | null;
+  rating: number | null;
+  sports: string[] | null;
+};
+
 type UnauthorizedHandler = () => Promise<boolean>;
 
 const STORAGE_KEY = "hopon_access_token";
 
 let accessToken: string | null = null;
 let unauthorizedHandler: UnauthorizedHandler | null = null;
+// Requests that fail with 401 together share one refresh: the server rotates
+// the refresh cookie on every refresh.
+let refreshInFlight: Promise<boolean> | null = null;
 
 // Load access token from localStorage on module load
 if (typeof window !== "undefined") {
@@ -104,7 +165,12 @@ async function http<T>(path: string, init?: RequestInit, retry = true): Promise<
 
   const res = await fetch(`${API_BASE_URL}${path}`, options);
   if (res.status === 401 && unauthorizedHandler && retry) {
-    const refreshed = await unauthorizedHandler();
+    if (!refreshInFlight) {
+      refreshInFlight = unauthorizedHandler().finally(() => {
+        refreshInFlight = null;
+      });
+    }
+    const refreshed = await refreshInFlight;
     if (refreshed) {
       return http<T>(path, init, false);
     }
@@ -162,9 +228,10 @@ export const Api = {
     return http<{ message: string }>("/auth/delete-account", { method: "DELETE" });
   },
   async refreshAccessToken() {
+    // No retry: a 401 here must not trigger another refresh.
     return http<{ access_token: string; user: HopOnUser }>("/auth/refresh", {
       method: "POST",
-    });
+    }, false);
   },
   // Development helper: sign in without Google for local testing
   async demoLogin(payload?: { username?: string; email?: string }) {
@@ -173,8 +240,8 @@ export const Api = {
       body: JSON.stringify(payload || {}),
     });
   },
-  async signup(payload: { email: string; password: string; username: string }) {
-    return http<{ message: string; access_token: string; user: HopOnUser; needs_username_setup?: boolean }>(`/auth/signup`, {
+  async signup(payload: { email: string; password: string; username: string; guest_token?: string }) {
+    return http<{ message: string; access_token: string; user: HopOnUser; needs_username_setup?: boolean; claimed_event_ids?: number[] }>(`/auth/signup`, {
       method: "POST",
       body: JSON.stringify(payload),
     });
@@ -203,6 +270,9 @@ export const Api = {
     const query = params?.lat && params?.lng ? `?lat=${params.lat}&lng=${params.lng}` : "";
     return http<HopOnEvent[]>(`/events/nearby${query}`);
   },
+  async eventTile(z: number, x: number, y: number) {
+    return http<EventTile>(`/events/tiles/${z}/${x}/${y}`);
+  },
   async createEvent(payload: Partial<HopOnEvent>) {
     return http<{ message: string; event: HopOnEvent }>(`/events`, {
       method: "POST",
@@ -231,8 +301,8 @@ export const Api = {
       : { method: "DELETE" };
     return http<{ message: string }>(`/users/${userId}/follow`, options);
   },
-  async joinEvent(eventId: number, payload: { player_name?: string; team?: string; guest_token?: string }) {
-    return http<{ message: string; event: HopOnEvent; guest_token?: string }>(`/events/${eventId}/join`, {
+  async joinEvent(eventId: number, payload: { player_name?: string; team?: string; guest_token?: string; waitlist?: boolean }) {
+    return http<{ message: string; event: HopOnEvent; guest_token?: string; waitlist_position?: number }>(`/events/${eventId}/join`, {
       method: "POST",
       body: JSON.stringify(payload),
     });
@@ -243,6 +313,29 @@ export const Api = {
       body: JSON.stringify(payload),
     });
   },
+  async updateRoster(eventId: number, entries: RosterEntry[]) {
+    return http<{ results: RosterResult[]; event: HopOnEvent }>(`/events/${eventId}/roster`, {
+      method: "POST",
+      body: JSON.stringify({ entries }),
+    });
+  },
+  async guestEvents(guestToken: string) {
+    return http<{ events: (HopOnEvent & { guest: { player_name: string; team: string; joined_at: string | null } })[] }>(`/guest/events`, {
+      method: "GET",
+      headers: { "X-Guest-Token": guestToken },
+    });
+  },
+  async claimGuest(guestToken: string) {
+    return http<{ message: string; claimed_event_ids: number[] }>(`/auth/claim-guest`, {
+      method: "POST",
+      body: JSON.stringify({ guest_token: guestToken }),
+    });
+  },
+  async getWaitlist(eventId: number) {
+    return http<{ event_id: number; waitlist: WaitlistEntry[] }>(`/events/${eventId}/waitlist`, {
+      method: "GET",
+    });
+  },
   async updateEvent(eventId: number, payload: {
     name?: string;
     sport?: string;
@@ -262,8 +355,21 @@ export const Api = {
       method: "DELETE",
     });
   },
-  async getEventParticipants(eventId: number) {
-    return http<{ participants: HopOnUser[] }>(`/events/${eventId}/participants`, {
+  async getEventParticipants(eventId: number, params?: { team?: string; groupByTeam?: boolean; limit?: number; offset?: number }) {
+    const query = new URLSearchParams();
+    if (params?.team) query.set("team", params.team);
+    if (params?.groupByTeam) query.set("group_by", "team");
+    if (params?.limit !== undefined) query.set("limit", String(params.limit));
+    if (params?.offset !== undefined) query.set("offset", String(params.offset));
+    const suffix = query.toString() ? `?${query.toString()}` : "";
+    return http<{
+      event_id: number;
+      participants: EventParticipant[];
+      total: number;
+      limit: number;
+      offset: number;
+      teams?: { team: string | null; count: number; participants: EventParticipant[] }[];
+    }>(`/events/${eventId}/participants${suffix}`, {
       method: "GET",
     });
   },